@@ -0,0 +1,289 @@
+"""
+Batch executor for prompt actions in Thousand Year Old Vampire
+This module applies all the resolved actions of a prompt as one unit of work, in a fixed number of queries.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from .events import record_sheet_change, save_event
+from .models import Memory, Skill, Resource, Character, Mark
+
+
+class ActionBatch:
+    """Applies a list of resolved prompt actions to a vampire's sheet.
+
+    Each action is a dict with a 'type' and optional 'choices' and
+    'input_data', as passed to PromptProcessor.execute_action(). Every row the
+    actions refer to is loaded up front with one in_bulk() per model, the
+    actions are applied in order to those objects and to unsaved new ones, and
+    the result is written with bulk_create(), queryset update() and
+    bulk_update(). The cost depends on which models are touched, not on how
+    many rows or actions there are.
+    """
+
+    ACTION_TYPES = (
+        'kill_mortal', 'create_mortal', 'create_immortal', 'convert_mortal',
+        'add_skill', 'create_skill', 'check_skills', 'lose_skill',
+        'create_resource', 'lose_resources', 'lose_stationary_resources',
+        'create_mark', 'remove_mark', 'lose_memory', 'age_mortals',
+    )
+
+    def __init__(self, character, actions):
+        self.character = character
+        self.actions = [
+            (action['type'], action.get('choices') or {}, action.get('input_data') or {})
+            for action in actions
+        ]
+        self.rows = {}
+        self.created = []
+        self.flags = {}  # (model, field, value) -> ids to update() with that value
+        self.edits = {}  # model -> ({id: instance}, {edited fields}) for bulk_update()
+        self.actions_taken = []
+
+    def execute(self):
+        """Apply every action in one transaction and return the descriptions of what was done."""
+        with transaction.atomic():
+            self._load()
+            for action_type, choices, input_data in self.actions:
+                if action_type in self.ACTION_TYPES:
+                    getattr(self, f'_{action_type}')(choices, input_data)
+            self._flush()
+        return self.actions_taken
+
+    # Loading
+
+    def _load(self):
+        ids = {model: set() for model in (Character, Skill, Resource, Mark, Memory)}
+        skill_names = set()
+        all_mortals = all_stationary = False
+
+        for action_type, choices, input_data in self.actions:
+            if action_type in ('kill_mortal', 'convert_mortal') and choices.get('character_id'):
+                ids[Character].add(int(choices['character_id']))
+            elif action_type == 'age_mortals':
+                all_mortals = True
+            elif action_type == 'add_skill':
+                skill_names.add(input_data.get('skill_name') or choices.get('skill_name'))
+            elif action_type == 'check_skills':
+                ids[Skill].update(int(skill_id) for skill_id in choices.get('skill_ids', []))
+            elif action_type == 'lose_skill' and choices.get('skill_id'):
+                ids[Skill].add(int(choices['skill_id']))
+            elif action_type == 'lose_resources':
+                ids[Resource].update(int(resource_id) for resource_id in choices.get('resource_ids', []))
+            elif action_type == 'lose_stationary_resources':
+                all_stationary = True
+            elif action_type == 'remove_mark' and choices.get('mark_id'):
+                ids[Mark].add(int(choices['mark_id']))
+            elif action_type == 'lose_memory' and choices.get('memory_id'):
+                ids[Memory].add(int(choices['memory_id']))
+
+        # One query per model, covering the rows picked by id and those matched as a group
+        scopes = {model: Q(id__in=model_ids) for model, model_ids in ids.items() if model_ids}
+        if all_mortals:
+            scopes[Character] = scopes.get(Character, Q()) | Q(character_type='mortal', is_dead=False)
+        if skill_names - {None}:
+            # add_skill skips names the vampire already has, lost or not
+            scopes[Skill] = scopes.get(Skill, Q()) | Q(name__in=skill_names - {None})
+        if all_stationary:
+            scopes[Resource] = scopes.get(Resource, Q()) | Q(is_stationary=True, is_lost=False)
+
+        for model in ids:
+            owner = 'vampire' if model is Character else 'character'
+            scope = scopes.get(model)
+            self.rows[model] = (
+                model.objects.filter(scope, **{owner: self.character}).order_by('pk').in_bulk() if scope else {}
+            )
+
+    def _get(self, model, pk):
+        """Return a preloaded row, raising DoesNotExist like get() when it is not the vampire's."""
+        try:
+            return self.rows[model][int(pk)]
+        except KeyError:
+            raise model.DoesNotExist(f"{model.__name__} matching query does not exist.")
+
+    # Recording changes
+
+    def _create(self, instance):
+        self.created.append(instance)
+        return instance
+
+    def _set_flag(self, instance, field, value):
+        setattr(instance, field, value)
+        if instance.pk is not None:
+            self.flags.setdefault((type(instance), field, value), set()).add(instance.pk)
+
+    def _edit(self, instance, **values):
+        for field, value in values.items():
+            setattr(instance, field, value)
+        if instance.pk is not None:
+            instances, fields = self.edits.setdefault(type(instance), ({}, set()))
+            instances[instance.pk] = instance
+            fields.update(values)
+
+    def _pending(self, model):
+        return [instance for instance in self.created if isinstance(instance, model)]
+
+    def _flush(self):
+        for model in (Character, Skill, Resource, Mark):
+            instances = self._pending(model)
+            if instances:
+                model.objects.bulk_create(instances)
+        for (model, field, value), pks in self.flags.items():
+            model.objects.filter(pk__in=pks).update(**{field: value})
+        for model, (instances, fields) in self.edits.items():
+            model.objects.bulk_update(instances.values(), sorted(fields))
+        record_sheet_change(self.character, self._events())
+
+    def _events(self):
+        """Return the event log entries for everything _flush() wrote."""
+        owner = self.character.pk
+        events = [save_event(instance, owner) for instance in self.created]
+        for (model, field, value), pks in self.flags.items():
+            events.extend(save_event(self.rows[model][pk], owner, [field]) for pk in sorted(pks))
+        for model, (instances, fields) in self.edits.items():
+            events.extend(save_event(instance, owner, fields) for instance in instances.values())
+        return events
+
+    # Actions
+
+    def _kill_mortal(self, choices, input_data):
+        if choices.get('character_id'):
+            char = self._get(Character, choices['character_id'])
+            self._set_flag(char, 'is_dead', True)
+            self.actions_taken.append(f"Killed mortal character: {char.name}")
+        elif choices.get('create_new'):
+            # Create a new character to kill
+            new_char = self._create(Character(
+                vampire=self.character,
+                name=choices.get('name', 'Close Friend'),
+                description=choices.get('description', 'Someone you cared about, now lost to your hunger.'),
+                character_type='mortal',
+                relationship='friend',
+                is_dead=True
+            ))
+            self.actions_taken.append(f"Created and killed mortal character: {new_char.name}")
+
+    def _create_mortal(self, choices, input_data):
+        char = self._create(Character(
+            vampire=self.character,
+            name=input_data.get('name', 'New Mortal'),
+            description=input_data.get('description', 'A mortal who has entered your story.'),
+            character_type='mortal',
+            relationship=input_data.get('relationship', 'neutral')
+        ))
+        self.actions_taken.append(f"Created mortal character: {char.name}")
+
+    def _create_immortal(self, choices, input_data):
+        char = self._create(Character(
+            vampire=self.character,
+            name=input_data.get('name', 'Ancient Being'),
+            description=input_data.get('description', 'An immortal creature whose path has crossed yours.'),
+            character_type='immortal',
+            relationship=input_data.get('relationship', 'neutral')
+        ))
+        self.actions_taken.append(f"Created immortal character: {char.name}")
+
+    def _convert_mortal(self, choices, input_data):
+        if choices.get('character_id'):
+            char = self._get(Character, choices['character_id'])
+            self._edit(
+                char,
+                character_type='immortal',
+                relationship='enemy',  # Usually becomes an enemy
+                description=char.description + " - Turned into a monster like yourself."
+            )
+            self.actions_taken.append(f"Converted {char.name} from mortal to immortal")
+
+    def _add_skill(self, choices, input_data):
+        skill_name = input_data.get('skill_name') or choices.get('skill_name')
+        if not skill_name:
+            return
+        existing = [s.name for s in self.rows[Skill].values()] + [s.name for s in self._pending(Skill)]
+        if skill_name not in existing:
+            self._create(Skill(
+                character=self.character,
+                name=skill_name,
+                description=input_data.get('description', 'Gained from prompt actions.')
+            ))
+            self.actions_taken.append(f"Gained skill: {skill_name}")
+
+    def _create_skill(self, choices, input_data):
+        if input_data.get('name'):
+            skill = self._create(Skill(
+                character=self.character,
+                name=input_data['name'],
+                description=input_data.get('description', 'A skill gained from your experiences.')
+            ))
+            self.actions_taken.append(f"Created skill: {skill.name}")
+
+    def _check_skills(self, choices, input_data):
+        for skill_id in choices.get('skill_ids', []):
+            skill = self._get(Skill, skill_id)
+            if not skill.is_checked:
+                self._set_flag(skill, 'is_checked', True)
+                self.actions_taken.append(f"Checked skill: {skill.name}")
+
+    def _lose_skill(self, choices, input_data):
+        if choices.get('skill_id'):
+            skill = self._get(Skill, choices['skill_id'])
+            self._set_flag(skill, 'is_lost', True)
+            self.actions_taken.append(f"Lost skill: {skill.name}")
+
+    def _create_resource(self, choices, input_data):
+        resource = self._create(Resource(
+            character=self.character,
+            name=input_data.get('name', 'New Resource'),
+            description=input_data.get('description', 'Gained from prompt actions.'),
+            is_stationary=input_data.get('is_stationary', False)
+        ))
+        resource_type = "stationary resource" if resource.is_stationary else "resource"
+        self.actions_taken.append(f"Gained {resource_type}: {resource.name}")
+
+    def _lose_resources(self, choices, input_data):
+        for resource_id in choices.get('resource_ids', []):
+            resource = self._get(Resource, resource_id)
+            self._set_flag(resource, 'is_lost', True)
+            self.actions_taken.append(f"Lost resource: {resource.name}")
+
+    def _lose_stationary_resources(self, choices, input_data):
+        resources = list(self.rows[Resource].values()) + self._pending(Resource)
+        for resource in resources:
+            if resource.is_stationary and not resource.is_lost:
+                self._set_flag(resource, 'is_lost', True)
+                self.actions_taken.append(f"Lost stationary resource: {resource.name}")
+
+    def _create_mark(self, choices, input_data):
+        self._create(Mark(
+            character=self.character,
+            description=input_data.get('description', 'A new mark has appeared on your vampiric form.'),
+            how_concealed=input_data.get('how_concealed', 'You must find a way to hide this mark from mortals.')
+        ))
+        self.actions_taken.append("Gained a new Mark")
+
+    def _remove_mark(self, choices, input_data):
+        if choices.get('mark_id'):
+            mark = self._get(Mark, choices['mark_id'])
+            self._set_flag(mark, 'is_removed', True)
+            self.actions_taken.append(f"Removed mark: {mark.description[:50]}")
+
+    def _lose_memory(self, choices, input_data):
+        if choices.get('memory_id'):
+            memory = self._get(Memory, choices['memory_id'])
+            self._set_flag(memory, 'is_lost', True)
+            self.actions_taken.append(f"Lost memory: {memory.title or 'Untitled memory'}")
+
+    def _age_mortals(self, choices, input_data):
+        characters = list(self.rows[Character].values()) + self._pending(Character)
+        for char in characters:
+            if char.character_type == 'mortal' and not char.is_dead:
+                self._set_flag(char, 'is_dead', True)
+                self.actions_taken.append(f"Mortal character {char.name} died of old age")
+
+
+def execute_actions(character, actions):
+    """Apply a prompt's resolved actions to a vampire as one unit of work.
+
+    Returns the list of descriptions of what was done. If any action refers to
+    a row that is not the vampire's, DoesNotExist is raised and nothing is written.
+    """
+    return ActionBatch(character, actions).execute()
@@ -1,27 +1,71 @@
 from django.contrib import admin
+from .events import delete_event, record_sheet_change, save_event
 from .models import (
     VampireCharacter, Memory, Experience, Skill, Resource,
-    Character, Mark, Diary, GameSession, Prompt
+    Character, Mark, Diary, GameSession, Prompt, PromptSource
 )
 
 
+def owner_id(row):
+    """Return the id of the vampire a sheet row belongs to."""
+    if isinstance(row, VampireCharacter):
+        return row.pk
+    if isinstance(row, Experience):
+        return row.memory.character_id
+    if isinstance(row, Character):
+        return row.vampire_id
+    return row.character_id
+
+
+class SheetAdmin(admin.ModelAdmin):
+    """Admin for a model of the character sheet.
+
+    Edits made here bypass the game's units of work, so each one is recorded
+    in its vampire's event log and moves its state version in the same way.
+    """
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        vampire = obj if isinstance(obj, VampireCharacter) else VampireCharacter.objects.get(pk=owner_id(obj))
+        record_sheet_change(vampire, [save_event(obj, vampire.pk)])
+
+
+class SheetRowAdmin(SheetAdmin):
+    """Admin for a model of rows on a vampire's sheet, logging deletions as well."""
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, self.model.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset.select_related('memory') if self.model is Experience else queryset)
+        if self.model is Memory:
+            # A memory's experiences are deleted with it
+            rows += Experience.objects.filter(memory__in=rows).select_related('memory')
+        events = {}
+        for row in rows:
+            events.setdefault(owner_id(row), []).append(delete_event(row, owner_id(row)))
+        super().delete_queryset(request, queryset)
+        for vampire in VampireCharacter.objects.filter(pk__in=events):
+            record_sheet_change(vampire, events[vampire.pk])
+
+
 @admin.register(VampireCharacter)
-class VampireCharacterAdmin(admin.ModelAdmin):
-    list_display = ['name', 'user', 'current_prompt', 'prompt_entry', 'game_ended', 'created_at']
-    list_filter = ['game_ended', 'created_at', 'user']
+class VampireCharacterAdmin(SheetAdmin):
+    list_display = ['name', 'user', 'current_prompt', 'prompt_entry', 'setup_complete', 'game_ended', 'created_at']
+    list_filter = ['setup_complete', 'game_ended', 'created_at', 'user']
     search_fields = ['name', 'user__username']
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(Memory)
-class MemoryAdmin(admin.ModelAdmin):
+class MemoryAdmin(SheetRowAdmin):
     list_display = ['character', 'order', 'title', 'is_in_diary', 'is_lost']
     list_filter = ['is_in_diary', 'is_lost', 'character']
     ordering = ['character', 'order']
 
 
 @admin.register(Experience)
-class ExperienceAdmin(admin.ModelAdmin):
+class ExperienceAdmin(SheetRowAdmin):
     list_display = ['memory', 'order', 'text_preview', 'created_at']
     list_filter = ['created_at', 'memory__character']
     search_fields = ['text']
@@ -32,28 +76,28 @@ class ExperienceAdmin(admin.ModelAdmin):
 
 
 @admin.register(Skill)
-class SkillAdmin(admin.ModelAdmin):
+class SkillAdmin(SheetRowAdmin):
     list_display = ['character', 'name', 'is_checked', 'is_lost', 'created_at']
     list_filter = ['is_checked', 'is_lost', 'created_at']
     search_fields = ['name', 'character__name']
 
 
 @admin.register(Resource)
-class ResourceAdmin(admin.ModelAdmin):
+class ResourceAdmin(SheetRowAdmin):
     list_display = ['character', 'name', 'is_stationary', 'is_lost', 'created_at']
     list_filter = ['is_stationary', 'is_lost', 'created_at']
     search_fields = ['name', 'character__name']
 
 
 @admin.register(Character)
-class CharacterAdmin(admin.ModelAdmin):
+class CharacterAdmin(SheetRowAdmin):
     list_display = ['vampire', 'name', 'character_type', 'relationship', 'is_dead', 'created_at']
     list_filter = ['character_type', 'relationship', 'is_dead', 'created_at']
     search_fields = ['name', 'vampire__name']
 
 
 @admin.register(Mark)
-class MarkAdmin(admin.ModelAdmin):
+class MarkAdmin(SheetRowAdmin):
     list_display = ['character', 'description_preview', 'is_removed', 'created_at']
     list_filter = ['is_removed', 'created_at']
     search_fields = ['description', 'character__name']
@@ -64,7 +108,7 @@ class MarkAdmin(admin.ModelAdmin):
 
 
 @admin.register(Diary)
-class DiaryAdmin(admin.ModelAdmin):
+class DiaryAdmin(SheetRowAdmin):
     list_display = ['character', 'description', 'is_lost', 'created_at']
     list_filter = ['is_lost', 'created_at']
     search_fields = ['description', 'character__name']
@@ -90,7 +134,7 @@ class PromptAdmin(admin.ModelAdmin):
     list_filter = ['number', 'entry']
     ordering = ['number', 'entry']
     search_fields = ['text', 'number']
-    readonly_fields = ['prompt_id', 'action_preview']
+    readonly_fields = ['prompt_id', 'action_preview', 'inferred_actions']
     
     def prompt_id(self, obj):
         return f"{obj.number}{obj.entry}"
@@ -131,7 +175,7 @@ class PromptAdmin(admin.ModelAdmin):
             'fields': ('number', 'entry', 'text')
         }),
         ('Actions', {
-            'fields': ('actions', 'action_preview'),
+            'fields': ('actions', 'action_preview', 'inferred_actions'),
             'description': 'JSON array of mechanical actions required for this prompt. '
                           'Use the format: [{"type": "action_type", "description": "description", ...}]'
         })
@@ -142,3 +186,9 @@ class PromptAdmin(admin.ModelAdmin):
             'all': ('admin/css/prompt_admin.css',)
         }
         js = ('admin/js/prompt_admin.js',)
+
+
+@admin.register(PromptSource)
+class PromptSourceAdmin(admin.ModelAdmin):
+    list_display = ['path', 'content_hash', 'prompt_count', 'loaded_at']
+    readonly_fields = ['path', 'content_hash', 'prompt_count', 'loaded_at']
@@ -0,0 +1,183 @@
+"""
+Chronicle import for Thousand Year Old Vampire
+This module reads a chronicle exported as JSON Lines back into a new vampire, writing each model's
+rows with bulk_create() in dependency order inside one transaction.
+"""
+
+import json
+from django.db import IntegrityError, connection, transaction
+from .events import record_events, save_event
+from .export import EXPORT_FORMAT_VERSION, EXPORT_MODELS
+from .models import VampireCharacter, Memory, Experience, Character, GameSession, SheetEvent
+
+
+# Rows written per bulk_create(); the file is read in step, so memory use does not grow with it
+IMPORT_BATCH_SIZE = 500
+
+# Fields bulk_create() would overwrite with the time of the import
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+MODELS = {model._meta.model_name: model for model, order in EXPORT_MODELS}
+
+
+class ChronicleImportError(ValueError):
+    """Raised when a file is not a chronicle this version can read; nothing is written."""
+
+
+class ChronicleImport:
+    """Reads JSON Lines records, as written by export.jsonl_lines(), into a new vampire.
+
+    The export lists memories before experiences, so records of each type
+    arrive after the rows they refer to. They are gathered into batches that
+    are written when full or when the type changes.
+    """
+
+    def __init__(self, user, name=None):
+        self.user = user
+        self.name = name
+        self.vampire = None
+        self.memories = {}  # memory id in the file -> new Memory
+        self.batch_model = None
+        self.batch = []
+        self.counts = {}
+
+    def run(self, lines):
+        """Import the records in lines and return the new vampire."""
+        with transaction.atomic():
+            records = self._records(lines)
+            self._header(next(records, None))
+            self._vampire(next(records, None))
+            for number, record in records:
+                model = MODELS.get(record.pop('type', None))
+                if model is None:
+                    raise ChronicleImportError(f"Line {number}: unknown record type")
+                if model is not self.batch_model or len(self.batch) >= IMPORT_BATCH_SIZE:
+                    self._flush()
+                    self.batch_model = model
+                self.batch.append(self._row(model, record, number))
+            self._flush()
+            turn = sum(self.vampire.prompt_visits.values())
+            if turn:
+                SheetEvent.objects.create(character=self.vampire, kind='turn', turn=turn)
+        return self.vampire
+
+    def _records(self, lines):
+        """Yield (line number, record) for every non-blank line."""
+        for number, line in enumerate(lines, 1):
+            try:
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8')
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+            except ValueError as e:  # UnicodeDecodeError is a ValueError too
+                raise ChronicleImportError(f"Line {number}: {e}")
+            if not isinstance(record, dict):
+                raise ChronicleImportError(f"Line {number}: expected a JSON object")
+            yield number, record
+
+    def _header(self, item):
+        if item is None or item[1].get('type') != 'chronicle':
+            raise ChronicleImportError("Not a chronicle export: the first line must be its header")
+        version = item[1].get('version')
+        if not isinstance(version, int) or version > EXPORT_FORMAT_VERSION:
+            raise ChronicleImportError(f"Chronicle format version {version} is not supported")
+
+    def _vampire(self, item):
+        if item is None or item[1].pop('type', None) != 'vampire':
+            raise ChronicleImportError("The second line must be the vampire")
+        number, record = item
+        self.vampire = self._build(VampireCharacter, record, number, user=self.user)
+        if self.name:
+            self.vampire.name = self.name
+        self._write(VampireCharacter, [self.vampire])
+
+    def _build(self, model, record, number, **links):
+        """Make an unsaved instance from a record, converting its values with the model's fields."""
+        values = {}
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.is_relation or field.attname not in record:
+                continue
+            try:
+                values[field.attname] = field.to_python(record[field.attname])
+            except Exception as e:
+                raise ChronicleImportError(f"Line {number}: {field.name}: {e}")
+        return model(**values, **links)
+
+    def _row(self, model, record, number):
+        if model is Experience:
+            memory = self.memories.get(self._memory_id(record, 'memory_id', number))
+            if memory is None:
+                raise ChronicleImportError(f"Line {number}: experience of an unknown memory")
+            return self._build(model, record, number, memory=memory)
+        instance = self._build(model, record, number, **{
+            'vampire' if model is Character else 'character': self.vampire
+        })
+        if model is Memory:
+            self.memories[self._memory_id(record, 'id', number)] = instance
+        return instance
+
+    def _memory_id(self, record, key, number):
+        """Return the memory id a record holds under key, which must be an integer."""
+        value = record.get(key)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ChronicleImportError(f"Line {number}: {key} must be an integer")
+        return value
+
+    def _flush(self):
+        if self.batch:
+            self._write(self.batch_model, self.batch)
+        self.batch = []
+
+    def _write(self, model, instances):
+        """Insert a batch, put back its timestamps, and log the sheet rows among it."""
+        fields = [field for field in model._meta.concrete_fields if field.name in TIMESTAMP_FIELDS]
+        stamps = [[getattr(instance, field.attname) for field in fields] for instance in instances]
+        model.objects.bulk_create(instances)
+        # bulk_create() stamped auto_now(_add) fields with the time of the import
+        for instance, values in zip(instances, stamps):
+            for field, value in zip(fields, values):
+                if value is not None:
+                    setattr(instance, field.attname, value)
+        if fields:
+            self._restore_timestamps(model, fields, instances)
+        # The new sheet is logged a batch at a time
+        if model is not GameSession:
+            record_events([save_event(instance, self.vampire.pk) for instance in instances])
+        name = model._meta.model_name
+        self.counts[name] = self.counts.get(name, 0) + len(instances)
+
+    def _restore_timestamps(self, model, fields, instances):
+        """Write the batch's timestamps back with one UPDATE.
+
+        Does what bulk_update() would, but builds the CASE expression as SQL
+        directly; bulk_update() spends most of an import compiling it.
+        """
+        quote = connection.ops.quote_name
+        pk = quote(model._meta.pk.column)
+        assignments, params = [], []
+        for field in fields:
+            assignments.append(f"{quote(field.column)} = CASE {pk} {'WHEN %s THEN %s ' * len(instances)}END")
+            for instance in instances:
+                params += [instance.pk, field.get_db_prep_save(getattr(instance, field.attname), connection)]
+        params += [instance.pk for instance in instances]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote(model._meta.db_table)} SET {', '.join(assignments)} "
+                f"WHERE {pk} IN ({', '.join(['%s'] * len(instances))})",
+                params,
+            )
+
+
+def import_chronicle(lines, user, name=None):
+    """Import a JSON Lines chronicle export as a new vampire owned by user.
+
+    Returns (vampire, {model name: rows created}). Raises
+    ChronicleImportError, writing nothing, if the file cannot be read.
+    """
+    chronicle = ChronicleImport(user, name)
+    try:
+        vampire = chronicle.run(lines)
+    except IntegrityError as e:
+        raise ChronicleImportError(f"The chronicle does not fit together: {e}")
+    return vampire, chronicle.counts
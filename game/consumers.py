@@ -0,0 +1,37 @@
+"""
+WebSocket consumers for Thousand Year Old Vampire
+"""
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .live import sheet_group
+from .models import VampireCharacter
+
+
+class SheetConsumer(AsyncJsonWebsocketConsumer):
+    """Push a message to the player whenever their vampire's sheet changes.
+
+    Messages are {'version': id of the latest sheet event}; the page then asks
+    the sheet_changes view for what changed since the version it holds.
+    """
+
+    async def connect(self):
+        self.character_id = self.scope['url_route']['kwargs']['character_id']
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not await self.owns_character(user):
+            await self.close()
+            return
+        self.group = sheet_group(self.character_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group'):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def sheet_changed(self, event):
+        await self.send_json({'version': event['version']})
+
+    @database_sync_to_async
+    def owns_character(self, user):
+        return VampireCharacter.objects.filter(id=self.character_id, user=user).exists()
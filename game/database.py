@@ -0,0 +1,104 @@
+"""
+SQLite tuning for Thousand Year Old Vampire
+This module applies the configured PRAGMAs to every new SQLite connection, queues the
+write transactions of all processes on a lock file, and retries those that still find
+the database locked.
+"""
+
+import functools
+import random
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are left to busy_timeout alone
+    fcntl = None
+
+
+# Used for any PRAGMA or retry setting missing from SQLITE_PRAGMAS / SQLITE_WRITE_RETRY
+SQLITE_PRAGMA_DEFAULTS = {
+    'busy_timeout': 5000,         # milliseconds to wait for a lock before failing; set first so the others wait too
+    'journal_mode': 'wal',        # readers no longer block the writer, nor the writer them
+    'synchronous': 'normal',      # safe with WAL; only the last commits can be lost on power failure
+    'mmap_size': 128 * 1024 * 1024,
+}
+WRITE_RETRY_DEFAULTS = {
+    'attempts': 5,
+    'base_delay': 0.05,  # seconds before the first retry, doubled for every later one
+    'max_delay': 1.0,
+    'queue': True,  # wait for the lock file before taking the write lock (see write_queue)
+}
+
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def sqlite_pragmas():
+    """Return the PRAGMAs to set on each connection; a setting of None leaves SQLite's default."""
+    pragmas = {**SQLITE_PRAGMA_DEFAULTS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created receiver that tunes new SQLite connections.
+
+    The PRAGMAs go straight to the driver connection, so that query counters
+    wrapped around Django's cursors do not count them against a view.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in sqlite_pragmas().items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCK_ERRORS)
+
+
+@contextmanager
+def write_queue(enabled=True):
+    """Hold an exclusive lock on the database's lock file, shared by every process.
+
+    A writer waiting on busy_timeout polls the database with ever longer sleeps,
+    up to 100 ms, so under load a writer that has waited a while keeps losing the
+    lock to newcomers and its latency grows long tails. Waiting on the lock file
+    instead wakes the next writer as soon as the last one commits. It is only
+    taken around an outermost transaction on a file database, where the wait is
+    for other processes and not for this connection's own transaction.
+    """
+    if not enabled or fcntl is None or connection.vendor != 'sqlite' or connection.in_atomic_block \
+            or connection.is_in_memory_db():
+        yield
+        return
+    with open(f"{connection.settings_dict['NAME']}-write.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def retry_on_lock(func):
+    """Run func in its own transaction, retrying with backoff while the database is locked.
+
+    Writers wait their turn in write_queue, then on busy_timeout for any
+    writer outside the queue; this covers the writes that still time out under
+    load. Each retry waits twice as long as the last, with jitter so that
+    colliding writers spread out. Inside an outer transaction nothing can be
+    retried, so the error is raised straight away.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        options = {**WRITE_RETRY_DEFAULTS, **getattr(settings, 'SQLITE_WRITE_RETRY', {})}
+        for attempt in range(options['attempts']):
+            try:
+                with write_queue(options['queue']), transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if not is_lock_error(exc) or connection.in_atomic_block or attempt + 1 >= options['attempts']:
+                    raise
+            delay = min(options['max_delay'], options['base_delay'] * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1))
+    return wrapper
@@ -0,0 +1,200 @@
+"""
+Event log for Thousand Year Old Vampire
+Every change to a vampire's sheet is appended to its SheetEvent log, one batch per unit of
+work, and every few turns the sheet is folded into a SheetSnapshot. The state at any turn is the
+nearest snapshot before it with the short tail of events after it replayed on top.
+
+A state is {model name: {row id: {field: value}}}, holding JSON-ready values, plus the number
+of turns played under 'turn'.
+"""
+
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .live import broadcast_events
+from .models import (
+    VampireCharacter, Memory, Experience, Skill, Resource, Character, Mark, Diary,
+    SheetEvent, SheetSnapshot
+)
+
+
+# Models whose rows make up the sheet; the state holds one dict of rows for each
+SHEET_MODELS = (VampireCharacter, Memory, Experience, Skill, Resource, Character, Mark, Diary)
+
+# Bookkeeping fields that change without the sheet changing
+IGNORED_FIELDS = {'state_version', 'updated_at'}
+
+
+def row_image(instance, fields=None):
+    """Return {attname: value} for a row, limited to the named fields if given."""
+    return {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in IGNORED_FIELDS
+        and (fields is None or field.name in fields or field.attname in fields)
+    }
+
+
+def save_event(instance, character_id, fields=None):
+    """Build the event for a row of a vampire's sheet written with the given fields, or in full."""
+    return SheetEvent(
+        character_id=character_id,
+        kind='save',
+        model=instance._meta.model_name,
+        object_id=instance.pk,
+        data=row_image(instance, fields),
+    )
+
+
+def delete_event(instance, character_id):
+    return SheetEvent(
+        character_id=character_id,
+        kind='delete',
+        model=instance._meta.model_name,
+        object_id=instance.pk,
+    )
+
+
+def record_events(events):
+    """Append events to the log in one query, and push them to open pages."""
+    if events:
+        SheetEvent.objects.bulk_create(events)
+        broadcast_events(events)
+
+
+def record_sheet_change(character, events):
+    """Record one unit of work's writes to a vampire's sheet.
+
+    While setup is under way, setup_complete is refreshed first. Then the
+    state_version is bumped once and the events appended with one query,
+    however many rows were written.
+    """
+    if not events:
+        return
+    if not character.setup_complete and character.refresh_setup_complete():
+        events = [*events, save_event(character, character.pk, ['setup_complete'])]
+    VampireCharacter.bump_state_version(pk=character.pk)
+    record_events(events)
+
+
+def snapshot_interval():
+    return getattr(settings, 'SHEET_SNAPSHOT_INTERVAL', 50)
+
+
+def record_turn(character, session, events=()):
+    """Record the sheet changes of a turn together with the event marking its end.
+
+    Called inside the turn's transaction, after the character is saved. Every
+    snapshot_interval() turns a snapshot is taken as well.
+    """
+    turn = sum(character.prompt_visits.values())
+    record_sheet_change(character, [
+        *events, SheetEvent(character=character, kind='turn', turn=turn, data={'session_id': session.pk})
+    ])
+    interval = snapshot_interval()
+    if interval and turn % interval == 0:
+        take_snapshot(character.pk)
+    return turn
+
+
+def apply_events(state, events):
+    """Replay (kind, model, object_id, data, turn) events onto a state, in place."""
+    for kind, model, object_id, data, turn in events:
+        if kind == 'save':
+            state.setdefault(model, {}).setdefault(str(object_id), {}).update(data)
+        elif kind == 'delete':
+            state.get(model, {}).pop(str(object_id), None)
+        elif kind == 'turn':
+            state['turn'] = turn
+    return state
+
+
+EVENT_FIELDS = ('kind', 'model', 'object_id', 'data', 'turn')
+
+
+def rebuild(character_id, turn=None, use_snapshots=True):
+    """Rebuild a vampire's state from its log, as of the end of a turn or now.
+
+    Returns (state, id of the last event replayed). Loads at most one snapshot
+    and the events after it, so the cost follows the snapshot interval rather
+    than the length of the chronicle.
+    """
+    events = SheetEvent.objects.filter(character_id=character_id)
+    snapshots = SheetSnapshot.objects.filter(character_id=character_id)
+    if turn is not None:
+        last = events.filter(kind='turn', turn=turn).values_list('id', flat=True).first()
+        if last is None:
+            raise SheetEvent.DoesNotExist(f"Turn {turn} has not been played")
+        events = events.filter(id__lte=last)
+        snapshots = snapshots.filter(last_event_id__lte=last)
+
+    state, after = {'turn': 0}, 0
+    if use_snapshots:
+        snapshot = snapshots.order_by('-last_event').values_list('state', 'last_event_id').first()
+        if snapshot is not None:
+            state, after = snapshot
+    tail = list(events.filter(id__gt=after).order_by('id').values_list('id', *EVENT_FIELDS))
+    apply_events(state, (event[1:] for event in tail))
+    for model in [key for key, rows in state.items() if rows == {}]:
+        del state[model]  # every row of the model was deleted
+    return state, tail[-1][0] if tail else after
+
+
+def latest_event_id(character_id):
+    """Return the id of a vampire's most recent event, which versions its whole sheet; 0 if none."""
+    return SheetEvent.objects.filter(character_id=character_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def changes_since(character_id, after):
+    """Collapse the events after the given event id into the rows they changed.
+
+    Returns ({model name: {row id: fields written, or None if deleted}}, turns
+    played or None if no turn ended, id of the last event). Rows saved more
+    than once carry the union of their written fields.
+    """
+    events = SheetEvent.objects.filter(character_id=character_id, id__gt=after).order_by('id')
+    changes, turn, last = {}, None, after
+    for event_id, kind, model, object_id, data, event_turn in events.values_list('id', *EVENT_FIELDS):
+        last = event_id
+        if kind == 'turn':
+            turn = event_turn
+            continue
+        rows = changes.setdefault(model, {})
+        if kind == 'delete':
+            rows[str(object_id)] = None
+        else:
+            rows[str(object_id)] = {**(rows.get(str(object_id)) or {}), **data}
+    return changes, turn, last
+
+
+def state_at(character_id, turn=None):
+    """Return a vampire's sheet as of the end of the given turn, or as it is now."""
+    return rebuild(character_id, turn)[0]
+
+
+def take_snapshot(character_id):
+    """Fold the log so far into a new snapshot and return it."""
+    state, last_event_id = rebuild(character_id)
+    if not last_event_id:
+        return None
+    return SheetSnapshot.objects.create(
+        character_id=character_id, last_event_id=last_event_id, turn=state.get('turn', 0), state=state
+    )
+
+
+def live_state(character):
+    """Read a vampire's current sheet from its tables, in the same form as a rebuilt state."""
+    state = {'turn': sum(character.prompt_visits.values())}
+    for model in SHEET_MODELS:
+        if model is VampireCharacter:
+            rows = [character]
+        elif model is Experience:
+            rows = model.objects.filter(memory__character=character)
+        elif model is Character:
+            rows = model.objects.filter(vampire=character)
+        else:
+            rows = model.objects.filter(character=character)
+        images = {str(row.pk): row_image(row) for row in rows}
+        if images:
+            state[model._meta.model_name] = images
+    return json.loads(json.dumps(state, cls=DjangoJSONEncoder))
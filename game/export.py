@@ -0,0 +1,179 @@
+"""
+Chronicle export for Thousand Year Old Vampire
+This module streams a vampire's whole chronicle, as Markdown or JSON Lines, without holding it in
+memory: rows are read with iterator() a chunk at a time and written out as they arrive.
+"""
+
+import datetime
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .models import VampireCharacter, Memory, Experience, Skill, Resource, Character, Mark, Diary, GameSession
+
+
+# Rows fetched from the database at a time
+EXPORT_CHUNK_SIZE = 500
+
+# Bytes of output collected before they are handed to the server
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# Version of the JSON Lines format, written in its header record
+EXPORT_FORMAT_VERSION = 1
+
+# Models in the export, in the order they are written, with the order of their rows
+EXPORT_MODELS = (
+    (Memory, ('order', 'id')),
+    (Experience, ('memory__order', 'memory_id', 'order')),
+    (Skill, ('id',)),
+    (Resource, ('id',)),
+    (Character, ('id',)),
+    (Mark, ('id',)),
+    (Diary, ('id',)),
+    (GameSession, ('created_at', 'id')),
+)
+
+# Fields left out of the export: links to the vampire and bookkeeping
+EXCLUDED_FIELDS = {'user_id', 'character_id', 'vampire_id', 'state_version'}
+
+
+class ChronicleEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds DjangoJSONEncoder drops, so an import restores timestamps and their order exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.attname not in EXCLUDED_FIELDS]
+
+
+def owned_rows(model, character_id, order, fields):
+    """Iterate over the values of a vampire's rows of a model, a chunk at a time."""
+    if model is Experience:
+        rows = model.objects.filter(memory__character_id=character_id)
+    elif model is Character:
+        rows = model.objects.filter(vampire_id=character_id)
+    else:
+        rows = model.objects.filter(character_id=character_id)
+    return rows.order_by(*order).values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def jsonl_lines(character):
+    """Yield the chronicle as JSON Lines: a header, the vampire, then one record per row.
+
+    Every record has a 'type', the model name; rows keep their ids, so
+    experiences can be matched to their memory_id.
+    """
+    encode = ChronicleEncoder(ensure_ascii=False).encode
+    yield encode({'type': 'chronicle', 'version': EXPORT_FORMAT_VERSION, 'exported_at': timezone.now()}) + '\n'
+    vampire = {field: getattr(character, field) for field in export_fields(VampireCharacter)}
+    yield encode({'type': 'vampire', **vampire}) + '\n'
+    for model, order in EXPORT_MODELS:
+        kind = model._meta.model_name
+        for row in owned_rows(model, character.pk, order, export_fields(model)):
+            yield encode({'type': kind, **row}) + '\n'
+
+
+def _flags(*flags):
+    """Format the flags that are set, e.g. ' *(lost, checked)*'."""
+    names = [name for name, is_set in flags if is_set]
+    return f" *({', '.join(names)})*" if names else ''
+
+
+def markdown_lines(character):
+    """Yield the chronicle as a Markdown document, the sheet first and then every session in order."""
+    yield f'# {character.name}\n\n'
+    yield f'{character.origin_description}\n\n'
+    status = 'The story has ended.' if character.game_ended else (
+        f'Now at prompt {character.current_prompt}{character.prompt_entry}.'
+    )
+    yield f'Begun {character.created_at:%Y-%m-%d}. {status}\n\n'
+
+    yield '## Memories\n'
+    memory_id = None
+    experiences = owned_rows(
+        Experience, character.pk, ('memory__order', 'memory_id', 'order'),
+        ('memory_id', 'memory__order', 'memory__title', 'memory__is_lost', 'memory__is_in_diary', 'text'),
+    )
+    for experience in experiences:
+        if experience['memory_id'] != memory_id:
+            memory_id = experience['memory_id']
+            title = f": {experience['memory__title']}" if experience['memory__title'] else ''
+            flags = _flags(('lost', experience['memory__is_lost']), ('in the diary', experience['memory__is_in_diary']))
+            yield f"\n### Memory {experience['memory__order']}{title}{flags}\n\n"
+        yield f"- {experience['text']}\n"
+
+    diary = Diary.objects.filter(character_id=character.pk).values('description', 'is_lost').first()
+    if diary:
+        yield f"\n## Diary\n\n{diary['description']}{_flags(('lost', diary['is_lost']))}\n"
+
+    sections = (
+        ('Skills', Skill, ('name', 'description', 'is_checked', 'is_lost'),
+         lambda row: f"**{row['name']}**", lambda row: (('checked', row['is_checked']), ('lost', row['is_lost']))),
+        ('Resources', Resource, ('name', 'description', 'is_stationary', 'is_lost'),
+         lambda row: f"**{row['name']}**", lambda row: (('stationary', row['is_stationary']), ('lost', row['is_lost']))),
+        ('Characters', Character, ('name', 'description', 'character_type', 'relationship', 'is_dead'),
+         lambda row: f"**{row['name']}**, {row['character_type']} {row['relationship']}",
+         lambda row: (('dead', row['is_dead']),)),
+        ('Marks', Mark, ('description', 'how_concealed', 'is_removed'),
+         lambda row: f"**{row['description']}**", lambda row: (('removed', row['is_removed']),)),
+    )
+    for heading, model, fields, label, flags in sections:
+        yield f'\n## {heading}\n\n'
+        for row in owned_rows(model, character.pk, ('id',), fields):
+            detail = row.get('how_concealed') if model is Mark else row['description']
+            yield f"- {label(row)}{_flags(*flags(row))}{f' — {detail}' if detail else ''}\n"
+
+    yield '\n## Chronicle\n'
+    sessions = owned_rows(GameSession, character.pk, ('created_at', 'id'), export_fields(GameSession))
+    for session in sessions:
+        yield f"\n### Prompt {session['prompt_number']}{session['prompt_entry']} · {session['created_at']:%Y-%m-%d %H:%M}\n\n"
+        yield f"{session['response']}\n"
+        if session['dice_roll_d10'] is not None:
+            movement = session['dice_roll_d10'] - session['dice_roll_d6']
+            yield (
+                f"\n*Rolled {session['dice_roll_d10']} − {session['dice_roll_d6']} = {movement}"
+                f" → prompt {session['next_prompt']}*\n"
+            )
+
+
+EXPORT_FORMATS = {
+    'markdown': (markdown_lines, 'text/markdown; charset=utf-8', 'md'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+
+def buffered(pieces, size=EXPORT_BUFFER_SIZE):
+    """Join small string pieces into chunks of about size bytes of UTF-8."""
+    buffer, length = [], 0
+    for piece in pieces:
+        piece = piece.encode()
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+async def aiterate(chunks):
+    """Iterate over a sync iterator from async code, one chunk per trip to its thread.
+
+    Under ASGI a sync iterator given to StreamingHttpResponse is read to the
+    end before anything is sent, so the export is passed as this instead.
+    """
+    iterator = iter(chunks)
+    while True:
+        chunk = await sync_to_async(next)(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def export_chunks(character, export_format):
+    """Return the chronicle in a format of EXPORT_FORMATS as an iterator of byte chunks."""
+    lines = EXPORT_FORMATS[export_format][0]
+    return buffered(lines(character))
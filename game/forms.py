@@ -129,3 +129,13 @@ class DiaryForm(forms.ModelForm):
                 'placeholder': 'Describe the diary (e.g., "a sturdy, leather-bound book")'
             })
         }
+
+
+class ChronicleImportForm(forms.Form):
+    chronicle = forms.FileField(
+        help_text='A chronicle exported as JSON Lines (.jsonl)',
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.jsonl,application/x-ndjson'
+        })
+    )
@@ -0,0 +1,179 @@
+"""
+Per-view query and latency instrumentation for Thousand Year Old Vampire
+A middleware counts the SQL queries, SQL time and wall time of every request, records them
+per resolved view name in process-wide histograms, and checks them against query budgets.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised instead of logging when a view goes over its query budget and budgets are strict."""
+
+
+class Histogram:
+    """Counts of values falling into fixed buckets."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def as_dict(self):
+        labels = [f'<={bound}' for bound in self.bounds] + [f'>{self.bounds[-1]}']
+        return dict(zip(labels, self.counts))
+
+
+class ViewMetrics:
+    """Running totals and histograms for one view."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.wall_ms = 0.0
+        self.max_queries = 0
+        self.max_wall_ms = 0.0
+        self.over_budget = 0
+        self.query_histogram = Histogram(QUERY_BUCKETS)
+        self.latency_histogram = Histogram(LATENCY_BUCKETS_MS)
+
+    def record(self, queries, sql_ms, wall_ms, over_budget):
+        self.requests += 1
+        self.queries += queries
+        self.sql_ms += sql_ms
+        self.wall_ms += wall_ms
+        self.max_queries = max(self.max_queries, queries)
+        self.max_wall_ms = max(self.max_wall_ms, wall_ms)
+        self.over_budget += over_budget
+        self.query_histogram.add(queries)
+        self.latency_histogram.add(wall_ms)
+
+    def as_dict(self, budget):
+        return {
+            'requests': self.requests,
+            'budget': budget,
+            'over_budget': self.over_budget,
+            'mean_queries': self.queries / self.requests,
+            'max_queries': self.max_queries,
+            'mean_sql_ms': self.sql_ms / self.requests,
+            'mean_wall_ms': self.wall_ms / self.requests,
+            'max_wall_ms': self.max_wall_ms,
+            'queries': self.query_histogram.as_dict(),
+            'wall_ms': self.latency_histogram.as_dict(),
+        }
+
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def query_budget(view_name):
+    """Return the query budget configured for a view name, or None if it has none."""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+def record_request(view_name, queries, sql_ms, wall_ms):
+    """Record one request and enforce the view's query budget."""
+    budget = query_budget(view_name)
+    over_budget = budget is not None and queries > budget
+    with _lock:
+        _metrics.setdefault(view_name, ViewMetrics()).record(queries, sql_ms, wall_ms, over_budget)
+
+    if over_budget:
+        message = f'{view_name} ran {queries} queries, over its budget of {budget}'
+        if getattr(settings, 'QUERY_BUDGETS_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def get_view_metrics():
+    """Return a snapshot of the recorded metrics, keyed by view name."""
+    with _lock:
+        return {name: metrics.as_dict(query_budget(name)) for name, metrics in sorted(_metrics.items())}
+
+
+def reset_view_metrics():
+    with _lock:
+        _metrics.clear()
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_ms += (time.perf_counter() - start) * 1000
+
+
+class QueryInstrumentationMiddleware:
+    """Measure every request and record it under the name of the view that handled it.
+
+    Works in both sync and async chains, so it does not force async views
+    under ASGI onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        self.record(request, counter, start)
+        return response
+
+    async def __acall__(self, request):
+        # The ORM runs a request's queries on its thread-sensitive sync thread,
+        # so the counter is installed on that thread's connection
+        counter = QueryCounter()
+        start = time.perf_counter()
+        wrapper = await sync_to_async(self.install)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrapper.__exit__)(None, None, None)
+        self.record(request, counter, start)
+        return response
+
+    def install(self, counter):
+        wrapper = connection.execute_wrapper(counter)
+        wrapper.__enter__()
+        return wrapper
+
+    def record(self, request, counter, start):
+        wall_ms = (time.perf_counter() - start) * 1000
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            record_request(match.view_name, counter.queries, counter.sql_ms, wall_ms)
@@ -0,0 +1,47 @@
+"""
+Live sheet updates for Thousand Year Old Vampire
+Every change to a vampire's sheet is pushed over its channel layer group, so that open
+pages can fetch the rows that changed instead of polling. Without CHANNEL_LAYERS nothing
+is sent and pages fall back to polling.
+"""
+
+import functools
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+def sheet_group(character_id):
+    """Name of the channel layer group following one vampire's sheet."""
+    return f'sheet_{character_id}'
+
+
+def broadcast_events(events):
+    """Tell the pages following each vampire in events that its sheet moved on.
+
+    Sent once the transaction commits, so pages never fetch changes that could
+    still be rolled back. The message carries the new sheet version, the id of
+    the vampire's latest event.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    versions = {}
+    for event in events:
+        versions[event.character_id] = max(versions.get(event.character_id, 0), event.pk or 0)
+    for character_id, version in versions.items():
+        transaction.on_commit(functools.partial(_send, layer, character_id, version))
+
+
+def _send(layer, character_id, version):
+    try:
+        async_to_sync(layer.group_send)(
+            sheet_group(character_id), {'type': 'sheet.changed', 'version': version}
+        )
+    except Exception:
+        # A lost push only delays the update until the page polls again
+        logger.exception('Could not push a sheet change for vampire %s', character_id)
@@ -114,7 +114,7 @@ class Command(BaseCommand):
         
         if not dry_run:
             prompt.actions = updated_actions
-            prompt.save()
+            prompt.save()  # Prompt's post_save receiver invalidates the prompt table
             self.stdout.write(
                 self.style.SUCCESS(f"✓ Updated prompt {prompt_id} with {len(updated_actions)} actions")
             )
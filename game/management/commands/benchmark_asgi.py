@@ -0,0 +1,213 @@
+"""
+Management command to benchmark how many slow connections the read pages serve under ASGI and WSGI.
+"""
+
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from game.management.databases import scratch_database
+from game.models import VampireCharacter, Memory, Experience, Skill
+from game.simulator import percentile
+
+
+HOST = 'localhost'
+
+
+class PeakThreads:
+    """Highest number of live threads seen while a run is going."""
+
+    def __init__(self):
+        self.peak = 0
+
+    def sample(self):
+        self.peak = max(self.peak, threading.active_count())
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and latency of the read pages for many slow clients under ASGI and WSGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections',
+            type=int,
+            nargs='+',
+            default=[10, 50, 200],
+            help='Concurrent client connections to try (default: 10 50 200)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=5,
+            help='Requests each connection makes, one after the other (default: 5)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Worker threads of the WSGI deployment, as in gunicorn --threads (default: 8)',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=0.1,
+            help='Seconds a slow client takes to take in each response (default: 0.1)',
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database('reads.sqlite3', 'benchmark_asgi_'):
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, HOST]
+            cookie, paths = self.build_player()
+
+            self.stdout.write(
+                f'{"server":<8}{"conns":>7}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"errors":>8}{"threads":>9}'
+            )
+            for count in options['connections']:
+                for server in ('wsgi', 'asgi'):
+                    run = self.run_wsgi if server == 'wsgi' else self.run_asgi
+                    start = time.perf_counter()
+                    latencies, errors, threads = run(count, cookie, paths, options)
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f'{server:<8}{count:>7}{len(latencies) / elapsed:>9.1f}'
+                        f'{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}'
+                        f'{errors:>8}{threads:>9}'
+                    )
+            self.stdout.write(self.style.SUCCESS(
+                f'\nWSGI serves at most {options["threads"]} slow clients at a time; '
+                'ASGI keeps taking connections while earlier clients are still reading'
+            ))
+
+    def build_player(self):
+        """Create a logged-in player with a vampire; return the session cookie and the pages to read."""
+        user = User.objects.create_user('reader')
+        vampire = VampireCharacter.objects.create(
+            user=user, name='Reader', origin_description='I am a temple scribe.'
+        )
+        for order in range(1, 6):
+            memory = Memory.objects.create(character=vampire, order=order)
+            Experience.objects.create(memory=memory, text=f'Experience in memory {order}', order=1)
+        for i in range(5):
+            Skill.objects.create(character=vampire, name=f'Skill {i}')
+
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        paths = [
+            reverse('character_list'),
+            reverse('character_detail', args=[vampire.id]),
+            reverse('dice_roller'),
+        ]
+        connections.close_all()
+        return cookie, paths
+
+    def run_wsgi(self, count, cookie, paths, options):
+        """Serve the connections from a fixed number of worker threads, each held until its client has read the response."""
+        handler = WSGIHandler()
+        workers = threading.BoundedSemaphore(options['threads'])
+        errors = []
+        latencies = []
+
+        def request(path):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': HOST,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': HOST,
+                'HTTP_COOKIE': cookie,
+                'wsgi.input': io.BytesIO(b''),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+            }
+            status = []
+            start = time.perf_counter()
+            with workers:  # waiting here is the connection sitting in the listen queue
+                response = handler(environ, lambda line, headers: status.append(line))
+                try:
+                    b''.join(response)
+                finally:
+                    response.close()
+                time.sleep(options['client_delay'])  # the worker is stuck writing to the slow client
+            if not status[0].startswith('200'):
+                errors.append(status[0])
+            latencies.append(time.perf_counter() - start)
+
+        def connection(index):
+            for n in range(options['requests']):
+                request(paths[(index + n) % len(paths)])
+            connections.close_all()
+
+        # One thread per client connection; only the semaphore's threads do server work at a time
+        with ThreadPoolExecutor(max_workers=count) as clients:
+            for future in [clients.submit(connection, index) for index in range(count)]:
+                future.result()
+        return latencies, len(errors), options['threads']
+
+    def run_asgi(self, count, cookie, paths, options):
+        """Serve the connections from one event loop, awaiting each slow client instead of blocking on it."""
+        handler = ASGIHandler()
+        peak = PeakThreads()  # the event loop plus the threads running sync code
+        errors = []
+        latencies = []
+
+        async def request(path):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 50000),
+                'server': (HOST, 80),
+            }
+            received = asyncio.Event()
+            disconnected = asyncio.Event()
+
+            async def receive():
+                if not received.is_set():
+                    received.set()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start' and message['status'] != 200:
+                    errors.append(message['status'])
+                elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                    peak.sample()
+                    await asyncio.sleep(options['client_delay'])  # only this coroutine waits
+
+            start = time.perf_counter()
+            await handler(scope, receive, send)
+            disconnected.set()
+            latencies.append(time.perf_counter() - start)
+
+        async def connection(index):
+            for n in range(options['requests']):
+                await request(paths[(index + n) % len(paths)])
+
+        async def main():
+            await asyncio.gather(*(connection(index) for index in range(count)))
+
+        baseline = threading.active_count()
+        asyncio.run(main())
+        connections.close_all()
+        return latencies, len(errors), peak.peak - baseline + 1
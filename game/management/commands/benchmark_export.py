@@ -0,0 +1,87 @@
+"""
+Management command to benchmark the memory and time a chronicle export and re-import take as the chronicle grows.
+"""
+
+import os
+import time
+import tracemalloc
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from game.chronicle_import import import_chronicle
+from game.export import EXPORT_FORMATS, export_chunks
+from game.management.databases import scratch_database
+from game.models import VampireCharacter, Memory, Experience, GameSession
+
+
+class Command(BaseCommand):
+    help = 'Export chronicles of growing length, report the peak memory and time of each export, and time importing them back'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 50000],
+            help='Chronicle lengths, in sessions, to export (default: 1000 10000 50000)',
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database('chronicle.sqlite3', 'benchmark_export_') as db_dir:
+            vampire = self.create_vampire()
+            played = 0
+            self.stdout.write(
+                f'{"sessions":>9}  {"format":<9}{"MB out":>9}{"peak KB":>10}{"seconds":>9}{"import s":>10}'
+            )
+            for sessions in sorted(options['sessions']):
+                self.add_sessions(vampire, played, sessions)
+                played = sessions
+                for export_format in EXPORT_FORMATS:
+                    path = os.path.join(db_dir, f'export.{export_format}')
+                    size, peak, seconds = self.measure(vampire, export_format, path)
+                    imported = f'{self.time_import(path, vampire.user):>10.2f}' if export_format == 'jsonl' else ''
+                    self.stdout.write(
+                        f'{sessions:>9}  {export_format:<9}{size / 1e6:>9.1f}{peak / 1024:>10.0f}{seconds:>9.2f}{imported}'
+                    )
+            self.stdout.write(self.style.SUCCESS('\nPeak memory should stay level while the output grows'))
+
+    def create_vampire(self):
+        user = User.objects.create_user('exporter')
+        vampire = VampireCharacter.objects.create(
+            user=user, name='Exporter', origin_description='I am a temple scribe.', setup_complete=True
+        )
+        for order in range(1, 6):
+            memory = Memory.objects.create(character=vampire, order=order)
+            Experience.objects.create(memory=memory, text=f'Experience in memory {order}', order=1)
+        return vampire
+
+    def add_sessions(self, vampire, start, end, batch=5000):
+        for offset in range(start, end, batch):
+            GameSession.objects.bulk_create([
+                GameSession(
+                    character=vampire, prompt_number=n % 80 + 1, prompt_entry='a',
+                    response=f'Night {n}. ' + 'I remember the river and the taste of iron. ' * 5,
+                    dice_roll_d10=7, dice_roll_d6=3, next_prompt=n % 80 + 5,
+                )
+                for n in range(offset, min(offset + batch, end))
+            ])
+
+    def measure(self, vampire, export_format, path):
+        """Return (bytes written, peak bytes allocated, seconds) for one export written to path."""
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = 0
+        with open(path, 'wb') as file:
+            for chunk in export_chunks(vampire, export_format):
+                file.write(chunk)
+                size += len(chunk)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, peak, seconds
+
+    def time_import(self, path, user):
+        """Import an export back as a new vampire and return the seconds it took."""
+        start = time.perf_counter()
+        with open(path, 'rb') as file:
+            import_chronicle(file, user)
+        return time.perf_counter() - start
@@ -0,0 +1,164 @@
+"""
+Management command to benchmark the sheet filter indexes on a large synthetic fixture.
+"""
+
+import random
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from game.management.databases import scratch_database
+from game.models import VampireCharacter, Skill, Resource, Character, Mark, GameSession
+from game.timeline import timeline_queryset
+
+
+# Models whose Meta.indexes serve the hot sheet filters
+INDEXED_MODELS = (Skill, Resource, Character, Mark, GameSession)
+
+# The hot filters, as querysets for one vampire
+HOT_QUERIES = {
+    'live skills': lambda pk, rng: Skill.objects.filter(character_id=pk, is_lost=False),
+    'unchecked skills': lambda pk, rng: Skill.objects.filter(character_id=pk, is_checked=False, is_lost=False),
+    'stationary resources': lambda pk, rng: Resource.objects.filter(character_id=pk, is_stationary=True, is_lost=False),
+    'live mortals': lambda pk, rng: Character.objects.filter(vampire_id=pk, character_type='mortal', is_dead=False),
+    'live marks': lambda pk, rng: Mark.objects.filter(character_id=pk, is_removed=False),
+    'prompt sessions': lambda pk, rng: GameSession.objects.filter(character_id=pk, prompt_number=rng.randint(1, 80)),
+    # Both read the timeline index in order, newest first
+    'recent sessions': lambda pk, rng: GameSession.objects.filter(character_id=pk)[:5],
+    'timeline page': lambda pk, rng: timeline_queryset(pk),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare query plans and timings of the hot sheet filters without and with their indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--characters',
+            type=int,
+            default=100000,
+            help='Vampires in the fixture, each with a full sheet and play history (default: 100000)',
+        )
+        parser.add_argument('--repeat', type=int, default=2000, help='Lookups per query and phase (default: 2000)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the fixture and lookups')
+        parser.add_argument(
+            '--db-dir',
+            type=str,
+            help='Keep the fixture database in this directory instead of a temporary one',
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database('fixture.sqlite3', 'benchmark_indexes_', options['db_dir']):
+            start = time.perf_counter()
+            rows = self.build_fixture(options['characters'], random.Random(options['seed']))
+            self.stdout.write(f'Built a fixture of {rows} rows in {time.perf_counter() - start:.1f}s')
+
+            self.set_indexes(False)
+            before = self.measure(options)
+            self.set_indexes(True)
+            after = self.measure(options)
+
+        self.report(before, after)
+
+    def build_fixture(self, count, rng, chunk=5000):
+        """Create count vampires with skills, resources, characters, marks and sessions.
+
+        Rows go in through executemany() rather than model instances, which
+        would make a fixture this size take many minutes to build.
+        """
+        user = User.objects.create_user('benchmark')
+        now = timezone.now()
+        rows = 0
+        for offset in range(0, count, chunk):
+            children = {model: [] for model in INDEXED_MODELS}
+            vampires = []
+            for pk in range(offset + 1, min(offset + chunk, count) + 1):
+                vampires.append((pk, user.pk, f'Vampire {pk}', '', now, now, 1, 'a', False, True, '{}', 0))
+                # Long games leave most of the sheet lost, dead or removed
+                for i in range(rng.randint(3, 9)):
+                    children[Skill].append((pk, f'Skill {i}', '', rng.random() < 0.4, rng.random() < 0.6, now))
+                for i in range(rng.randint(3, 8)):
+                    children[Resource].append((pk, f'Resource {i}', '', rng.random() < 0.3, rng.random() < 0.6, now))
+                for i in range(rng.randint(3, 12)):
+                    mortal = rng.random() < 0.8
+                    children[Character].append((
+                        pk, f'Figure {i}', '', 'mortal' if mortal else 'immortal', 'neutral',
+                        mortal and rng.random() < 0.7, now,
+                    ))
+                for i in range(rng.randint(1, 5)):
+                    children[Mark].append((pk, f'Mark {i}', '', rng.random() < 0.5, now))
+                for i in range(rng.randint(5, 40)):
+                    children[GameSession].append((pk, rng.randint(1, 80), 'a', '', now))
+
+            with transaction.atomic():
+                self.insert(VampireCharacter, (
+                    'id', 'user', 'name', 'origin_description', 'created_at', 'updated_at', 'current_prompt',
+                    'prompt_entry', 'game_ended', 'setup_complete', 'prompt_visits', 'state_version',
+                ), vampires)
+                self.insert(Skill, ('character', 'name', 'description', 'is_checked', 'is_lost', 'created_at'), children[Skill])
+                self.insert(Resource, ('character', 'name', 'description', 'is_stationary', 'is_lost', 'created_at'), children[Resource])
+                self.insert(Character, ('vampire', 'name', 'description', 'character_type', 'relationship', 'is_dead', 'created_at'), children[Character])
+                self.insert(Mark, ('character', 'description', 'how_concealed', 'is_removed', 'created_at'), children[Mark])
+                self.insert(GameSession, ('character', 'prompt_number', 'prompt_entry', 'response', 'created_at'), children[GameSession])
+            rows += len(vampires) + sum(len(values) for values in children.values())
+        return rows
+
+    def insert(self, model, fields, values):
+        columns = [model._meta.get_field(field).column for field in fields]
+        sql = (
+            f'INSERT INTO {model._meta.db_table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})'
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, values)
+
+    def set_indexes(self, present):
+        """Drop or recreate the indexes from the models' Meta and refresh the planner statistics."""
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if present:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, options):
+        """Return {query: (plan, mean milliseconds)} over random vampires.
+
+        Only the SQL is timed, so that ORM overhead does not hide the difference.
+        """
+        pks = list(VampireCharacter.objects.values_list('pk', flat=True))
+        results = {}
+        for name, build in HOT_QUERIES.items():
+            rng = random.Random(options['seed'])
+            plan = build(pks[0], rng).explain()
+            elapsed = 0.0
+            with connection.cursor() as cursor:
+                for _ in range(options['repeat']):
+                    sql, params = build(rng.choice(pks), rng).query.sql_with_params()
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    elapsed += time.perf_counter() - start
+            results[name] = (plan, elapsed / options['repeat'] * 1000)
+        return results
+
+    def report(self, before, after):
+        for name in HOT_QUERIES:
+            (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+            self.stdout.write(f'\n{name}: {ms_before:.3f} ms -> {ms_after:.3f} ms ({ms_before / ms_after:.1f}x)')
+            self.stdout.write(f'  without: {self.plan_text(plan_before)}')
+            self.stdout.write(f'  with:    {self.plan_text(plan_after)}')
+
+        total_before = sum(ms for _, ms in before.values())
+        total_after = sum(ms for _, ms in after.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'\nAll hot filters: {total_before:.3f} ms -> {total_after:.3f} ms per round ({total_before / total_after:.1f}x)'
+        ))
+
+    def plan_text(self, plan):
+        # SQLite plans come back as "id parent notused detail" lines
+        return '; '.join(line.split(' ', 3)[-1] for line in plan.splitlines())
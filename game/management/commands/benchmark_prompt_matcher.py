@@ -0,0 +1,56 @@
+"""
+Management command to benchmark the precompiled prompt trigger matcher.
+"""
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from game.models import Prompt
+from game.prompt_matcher import TRIGGER_PHRASES, CAPTURE_PATTERNS, analyze_legacy, infer_actions
+
+
+class Command(BaseCommand):
+    help = 'Compare the single-pass trigger matcher with the per-phrase analysis it replaced over the prompt corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Number of passes over the corpus per matcher (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        texts = [text.lower() for text in Prompt.objects.values_list('text', flat=True)]
+        if not texts:
+            raise CommandError('No prompts found. Run load_prompts first.')
+
+        # Both must derive the same actions from every prompt before their timings mean anything,
+        # bar the plurals the old analysis reported twice
+        mismatches = [text for text in texts if analyze_legacy(text, plurals_twice=False) != infer_actions(text)]
+        if mismatches:
+            for text in mismatches[:5]:
+                self.stdout.write(self.style.ERROR(f'Mismatch: {text[:80]}'))
+            raise CommandError(f'{len(mismatches)} prompts are matched differently')
+
+        phrase_count = sum(len(phrases) for phrases in TRIGGER_PHRASES.values())
+        self.stdout.write(
+            f'{len(texts)} prompts, {phrase_count} phrases and {len(CAPTURE_PATTERNS)} capture patterns, '
+            f'{repeat} passes'
+        )
+
+        timings = {}
+        for name, matcher in (('per-phrase scan', analyze_legacy), ('single pass', infer_actions)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for text in texts:
+                    matcher(text)
+            elapsed = time.perf_counter() - start
+            timings[name] = elapsed
+            self.stdout.write(
+                f'{name:>16}: {elapsed / repeat * 1000:8.3f} ms per corpus, '
+                f'{elapsed / (repeat * len(texts)) * 1e6:7.2f} µs per prompt'
+            )
+
+        speedup = timings['per-phrase scan'] / timings['single pass']
+        self.stdout.write(self.style.SUCCESS(f'Single pass is {speedup:.1f}x faster'))
@@ -0,0 +1,96 @@
+"""
+Management command to benchmark rebuilding a vampire's sheet from its event log.
+"""
+
+import random
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from game.action_batch import execute_actions
+from game.events import live_state, rebuild, record_sheet_change, save_event
+from game.management.databases import scratch_database
+from game.models import VampireCharacter, Memory, SheetEvent, SheetSnapshot
+from game.simulator import percentile
+from game.turns import play_turn
+
+
+class Command(BaseCommand):
+    help = 'Play a long chronicle, then time rebuilding its sheet at random turns with and without snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=2000, help='Turns in the chronicle (default: 2000)')
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=getattr(settings, 'SHEET_SNAPSHOT_INTERVAL', 50),
+            help='Turns between snapshots (default: SHEET_SNAPSHOT_INTERVAL)',
+        )
+        parser.add_argument('--samples', type=int, default=100, help='Turns to rebuild per method (default: 100)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the chronicle and samples')
+
+    def handle(self, *args, **options):
+        with scratch_database('chronicle.sqlite3', 'benchmark_replay_'), \
+                override_settings(SHEET_SNAPSHOT_INTERVAL=options['interval']):
+            rng = random.Random(options['seed'])
+            random.seed(options['seed'])  # dice rolls in play_turn
+
+            start = time.perf_counter()
+            vampire = self.play_chronicle(options['turns'], rng)
+            self.stdout.write(
+                f'Played {options["turns"]} turns in {time.perf_counter() - start:.1f}s: '
+                f'{SheetEvent.objects.count()} events, {SheetSnapshot.objects.count()} snapshots'
+            )
+
+            # Both methods must agree with the tables before their timings mean anything
+            live = live_state(VampireCharacter.objects.get(pk=vampire.pk))
+            for use_snapshots in (True, False):
+                if rebuild(vampire.pk, use_snapshots=use_snapshots)[0] != live:
+                    self.stdout.write(self.style.ERROR('The rebuilt sheet does not match the tables'))
+                    return
+
+            turns = [rng.randint(1, options['turns']) for _ in range(options['samples'])]
+            self.stdout.write(f'\n{"method":<22}{"p50 ms":>10}{"p90 ms":>10}{"max ms":>10}')
+            timings = {}
+            for name, use_snapshots in (('nearest snapshot', True), ('full replay', False)):
+                timings[name] = self.time_rebuilds(vampire.pk, turns, use_snapshots)
+            start = time.perf_counter()
+            live_state(VampireCharacter.objects.get(pk=vampire.pk))
+            timings['live tables (now)'] = [time.perf_counter() - start]
+
+            for name, values in timings.items():
+                row = [percentile(values, p) * 1000 for p in (0.5, 0.9, 1.0)]
+                self.stdout.write(f'{name:<22}' + ''.join(f'{value:>10.2f}' for value in row))
+
+            speedup = percentile(timings['full replay'], 0.5) / percentile(timings['nearest snapshot'], 0.5)
+            self.stdout.write(self.style.SUCCESS(f'\nSnapshots make a rebuild {speedup:.1f}x faster at the median'))
+
+    def play_chronicle(self, turns, rng):
+        """Play a vampire through many turns, with the sheet changing along the way."""
+        user = User.objects.create_user('chronicler')
+        vampire = VampireCharacter.objects.create(
+            user=user, name='Chronicler', origin_description='', setup_complete=True
+        )
+        memories = Memory.objects.bulk_create([Memory(character=vampire, order=order) for order in range(1, 6)])
+        # The replay starts from the log, so the sheet it starts with must be in it
+        record_sheet_change(vampire, [save_event(row, vampire.pk) for row in (vampire, *memories)])
+
+        for turn in range(turns):
+            play_turn(vampire.pk, f'Night {turn}')
+            actions = [{'type': rng.choice(('create_skill', 'create_resource', 'create_mortal', 'create_mark')),
+                        'input_data': {'name': f'Gained on night {turn}', 'description': ''}}]
+            if turn % 3 == 0:
+                actions.append({'type': 'age_mortals'})
+            if turn % 4 == 0:
+                actions.append({'type': 'lose_stationary_resources'})
+            execute_actions(vampire, actions)
+        return vampire
+
+    def time_rebuilds(self, character_id, turns, use_snapshots):
+        timings = []
+        for turn in turns:
+            start = time.perf_counter()
+            rebuild(character_id, turn, use_snapshots=use_snapshots)
+            timings.append(time.perf_counter() - start)
+        return timings
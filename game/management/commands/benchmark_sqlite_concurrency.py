@@ -0,0 +1,183 @@
+"""
+Management command to benchmark concurrent writers against SQLite, with stock and tuned connection settings.
+"""
+
+import logging
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from game.management.databases import scratch_database, use_database
+from game.models import VampireCharacter, Memory
+from game.simulator import percentile
+
+
+# Connection settings compared by the benchmark. "stock" is what Django does
+# out of the box: a rollback journal, deferred transactions, no retries and no
+# queue of writers.
+PROFILES = {
+    'stock': {
+        'pragmas': {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': None, 'mmap_size': None},
+        'transaction_mode': None,
+        'retry': {'attempts': 1, 'queue': False},
+    },
+    'tuned': {
+        'pragmas': {},  # SQLITE_PRAGMAS from settings
+        'transaction_mode': 'IMMEDIATE',
+        'retry': {},  # SQLITE_WRITE_RETRY from settings
+    },
+}
+
+# The project's own settings, which each profile is applied over
+PROJECT_SETTINGS = {
+    'SQLITE_PRAGMAS': dict(getattr(settings, 'SQLITE_PRAGMAS', {})),
+    'SQLITE_WRITE_RETRY': dict(getattr(settings, 'SQLITE_WRITE_RETRY', {})),
+}
+
+# How often each kind of write is picked
+OPERATIONS = (('add_skill', 4), ('toggle_skill', 3), ('play_turn', 3))
+
+
+def _use_profile(db_path, profile):
+    """Point this process at db_path, with the connection settings of a profile.
+
+    The profile is applied over the project's settings rather than the current
+    ones, so that a run never inherits the profile of the run before it.
+    """
+    settings.SQLITE_PRAGMAS = {**PROJECT_SETTINGS['SQLITE_PRAGMAS'], **profile['pragmas']}
+    settings.SQLITE_WRITE_RETRY = {**PROJECT_SETTINGS['SQLITE_WRITE_RETRY'], **profile['retry']}
+    options = {'transaction_mode': profile['transaction_mode']} if profile['transaction_mode'] else {}
+    use_database(db_path, migrate=False, options=options)
+
+
+def run_writer(profile_name, worker_id, db_path, seconds, seed):
+    """Send a mix of sheet and turn writes for one vampire until the time is up.
+
+    Returns plain counts and latencies for the parent process to merge.
+    """
+    from django.db import OperationalError
+    from django.test import Client
+    from django.urls import reverse
+    from game.database import is_lock_error
+    from game.turns import play_turn
+
+    _use_profile(db_path, PROFILES[profile_name])
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)  # lock errors are counted, not logged
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    # As in production: a failed write gets a plain 500, not the debug page, whose
+    # rendering of the view's locals runs queries that would count against its budget
+    settings.DEBUG = False
+
+    rng = random.Random(seed + worker_id)
+    vampire = VampireCharacter.objects.get(name=f'Writer {worker_id}')
+    client = Client()
+    client.force_login(vampire.user)
+    names, weights = zip(*OPERATIONS)
+    skill_ids = []
+    latencies = []
+    done = locked = failed = 0
+
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        operation = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            if operation == 'add_skill':
+                response = client.post(reverse('add_skill', args=[vampire.id]), {'name': f'Skill {rng.randint(1, 9999)}'})
+                skill_ids.append(response.json()['skill']['id'])
+            elif operation == 'toggle_skill' and skill_ids:
+                client.post(reverse('toggle_skill', args=[vampire.id, skill_ids.pop(rng.randrange(len(skill_ids)))]))
+            elif operation == 'play_turn':
+                play_turn(vampire.id, 'Another night passes.')
+            else:
+                continue
+        except OperationalError as exc:
+            if not is_lock_error(exc):
+                raise
+            locked += 1
+        except Exception:
+            failed += 1
+        else:
+            done += 1
+            latencies.append(time.perf_counter() - start)
+
+    connections.close_all()
+    return {'done': done, 'locked': locked, 'failed': failed, 'latencies': latencies}
+
+
+class Command(BaseCommand):
+    help = 'Measure how write throughput and lock errors scale with concurrent worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4, 8],
+            help='Worker process counts to try (default: 1 2 4 8)',
+        )
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run (default: 5)')
+        parser.add_argument(
+            '--profile',
+            choices=sorted(PROFILES),
+            nargs='+',
+            default=['stock', 'tuned'],
+            help='Connection settings to compare (default: stock tuned)',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the mix of writes')
+
+    def handle(self, *args, **options):
+        with scratch_database('template.sqlite3', 'benchmark_sqlite_') as db_dir:
+            template = os.path.join(db_dir, 'template.sqlite3')
+            self.build_template(max(options['workers']))
+
+            self.stdout.write(f'{os.cpu_count()} CPUs; writes/s can only grow with workers while there are spare CPUs')
+            self.stdout.write(
+                f'{"profile":<8}{"workers":>8}{"writes/s":>10}{"locked":>8}{"failed":>8}{"p50 ms":>9}{"p99 ms":>9}'
+            )
+            try:
+                for profile in options['profile']:
+                    for workers in options['workers']:
+                        db_path = os.path.join(db_dir, f'{profile}_{workers}.sqlite3')
+                        shutil.copy(template, db_path)
+                        # Switch the journal mode once, before the workers race to do it
+                        _use_profile(db_path, PROFILES[profile])
+                        connections['default'].ensure_connection()
+                        connections.close_all()
+                        results = self.run(profile, workers, db_path, options)
+                        self.report(profile, workers, results, options['seconds'])
+            finally:
+                for name, value in PROJECT_SETTINGS.items():
+                    setattr(settings, name, value)
+
+    def build_template(self, writers):
+        """Fill the fresh database with one vampire, with its memory slots, per writer."""
+        for i in range(writers):
+            user = User.objects.create_user(f'writer-{i}')
+            vampire = VampireCharacter.objects.create(
+                user=user, name=f'Writer {i}', origin_description='', setup_complete=True
+            )
+            Memory.objects.bulk_create([Memory(character=vampire, order=order) for order in range(1, 6)])
+        connections.close_all()  # checkpoints the WAL so the file can be copied
+
+    def run(self, profile, workers, db_path, options):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_writer, profile, i, db_path, options['seconds'], options['seed'])
+                for i in range(workers)
+            ]
+            return [future.result() for future in futures]
+
+    def report(self, profile, workers, results, seconds):
+        done = sum(result['done'] for result in results)
+        latencies = [latency for result in results for latency in result['latencies']]
+        self.stdout.write(
+            f'{profile:<8}{workers:>8}{done / seconds:>10.1f}'
+            f'{sum(result["locked"] for result in results):>8}{sum(result["failed"] for result in results):>8}'
+            f'{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}'
+        )
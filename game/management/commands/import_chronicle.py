@@ -0,0 +1,43 @@
+"""
+Management command to import a chronicle exported as JSON Lines as a new vampire.
+"""
+
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from game.chronicle_import import ChronicleImportError, import_chronicle
+
+
+class Command(BaseCommand):
+    help = 'Import a JSON Lines chronicle export as a new vampire for a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Path to the .jsonl export')
+        parser.add_argument('--user', type=str, required=True, help='Username of the new vampire\'s player')
+        parser.add_argument('--name', type=str, help='Name for the new vampire instead of the one in the file')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f"User not found: {options['user']}"))
+            return
+
+        started = time.perf_counter()
+        try:
+            # Read as bytes, so that a line that is not UTF-8 is reported like any other bad line
+            with open(options['file'], 'rb') as file:
+                vampire, counts = import_chronicle(file, user, name=options['name'])
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f"File not found: {options['file']}"))
+            return
+        except ChronicleImportError as e:
+            self.stdout.write(self.style.ERROR(f'Nothing imported: {e}'))
+            return
+
+        for name, count in counts.items():
+            self.stdout.write(f'  {name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {vampire.name} (id {vampire.id}) for {user.username} '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
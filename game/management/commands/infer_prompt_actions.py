@@ -0,0 +1,37 @@
+"""
+Management command to derive action templates from prompt text.
+"""
+
+from django.core.management.base import BaseCommand
+from game.models import Prompt
+from game.prompt_matcher import infer_actions
+from game.prompt_table import invalidate_prompt_table
+
+
+class Command(BaseCommand):
+    help = 'Store the action templates inferred from each prompt\'s text, so play never pattern-matches; run with --missing-only after migrating'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only analyze prompts that have not been analyzed yet',
+        )
+
+    def handle(self, *args, **options):
+        prompts = Prompt.objects.all()
+        if options['missing_only']:
+            prompts = prompts.filter(inferred_actions__isnull=True)
+
+        changed = []
+        for prompt in prompts:
+            inferred = infer_actions(prompt.text)
+            if inferred != prompt.inferred_actions:
+                prompt.inferred_actions = inferred
+                changed.append(prompt)
+
+        Prompt.objects.bulk_update(changed, ['inferred_actions'], batch_size=500)
+        if changed:
+            invalidate_prompt_table()
+
+        self.stdout.write(self.style.SUCCESS(f'Inferred actions for {len(changed)} prompts'))
@@ -1,6 +1,14 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from game.models import Prompt
+from django.db import transaction
+from django.db.models import Count, Q
+from game.models import Prompt, PromptSource
+from game.prompt_matcher import infer_actions
+from game.prompt_table import invalidate_prompt_table
+import hashlib
+import os
 import re
+import time
 
 
 class Command(BaseCommand):
@@ -13,19 +21,79 @@ class Command(BaseCommand):
             default='source/Thousand Year Old Vampire_TextOnly.txt',
             help='Path to the game text file'
         )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Load the file even if it has not changed since the last run'
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Report how long reading, parsing and writing took'
+        )
 
     def handle(self, *args, **options):
         file_path = options['file']
+        timings = {}
         
+        started = time.perf_counter()
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
+            with open(file_path, 'rb') as file:
+                raw = file.read()
         except FileNotFoundError:
             self.stdout.write(
                 self.style.ERROR(f'File not found: {file_path}')
             )
             return
+        content_hash = hashlib.sha256(raw).hexdigest()
+        timings['read'] = time.perf_counter() - started
+        
+        # Skip the run when this exact file was loaded before and its prompts are still there
+        source = PromptSource.objects.filter(path=os.path.abspath(file_path)).first()
+        if not options['force'] and source and source.content_hash == content_hash:
+            counts = Prompt.objects.aggregate(
+                total=Count('pk'), unanalyzed=Count('pk', filter=Q(inferred_actions__isnull=True))
+            )
+            if source.prompt_count == counts['total']:
+                if counts['unanalyzed']:
+                    # Prompts loaded before inferred_actions existed still need it
+                    call_command('infer_prompt_actions', missing_only=True, stdout=self.stdout)
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'{file_path} is unchanged since the last load; nothing to do'))
+                self.report_timings(options, timings)
+                return
+        
+        started = time.perf_counter()
+        parsed = self.parse_prompts(raw.decode('utf-8'))
+        timings['parse'] = time.perf_counter() - started
+        if parsed is None:
+            return
+        
+        if not parsed:
+            # Also add some sample prompts if none were found
+            self.create_sample_prompts()
+            invalidate_prompt_table()
+            return
+        
+        started = time.perf_counter()
+        created_count, updated_count = self.write_prompts(parsed)
+        PromptSource.objects.update_or_create(
+            path=os.path.abspath(file_path),
+            defaults={'content_hash': content_hash, 'prompt_count': Prompt.objects.count()}
+        )
+        timings['write'] = time.perf_counter() - started
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully processed prompts: {created_count} created, {updated_count} updated'
+            )
+        )
         
+        invalidate_prompt_table()
+        self.report_timings(options, timings)
+    
+    def parse_prompts(self, content):
+        """Return {(number, entry): text} for the prompts in the file, or None if it has no prompts section."""
         # Find the start of the prompts section
         prompts_start = content.find('________________\n\n\nPrompts\n\n')
         if prompts_start == -1:
@@ -35,7 +103,7 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.ERROR('Could not find prompts section in the file')
                 )
-                return
+                return None
         
         prompts_section = content[prompts_start:]
         
@@ -43,44 +111,50 @@ class Command(BaseCommand):
         prompt_pattern = r'(\d+)([abc])\n(.+?)(?=\n\d+[abc]\n|\nAppendix|\n\n\n|\Z)'
         matches = re.findall(prompt_pattern, prompts_section, re.DOTALL)
         
-        created_count = 0
-        updated_count = 0
-        
-        for match in matches:
-            number = int(match[0])
-            entry = match[1]
-            text = match[2].strip()
-            
+        parsed = {}
+        for number, entry, text in matches:
             # Clean up the text
-            text = re.sub(r'\n+', '\n', text)  # Remove multiple newlines
+            text = re.sub(r'\n+', '\n', text.strip())  # Remove multiple newlines
             text = text.strip()
             
+            # A prompt that appears twice keeps its last text
             if text:
-                prompt, created = Prompt.objects.get_or_create(
-                    number=number,
-                    entry=entry,
-                    defaults={'text': text}
-                )
-                
-                if created:
-                    created_count += 1
-                    self.stdout.write(f'Created prompt {number}{entry}')
-                else:
-                    if prompt.text != text:
-                        prompt.text = text
-                        prompt.save()
-                        updated_count += 1
-                        self.stdout.write(f'Updated prompt {number}{entry}')
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully processed prompts: {created_count} created, {updated_count} updated'
-            )
-        )
+                parsed[(int(number), entry)] = text
+        return parsed
+    
+    def write_prompts(self, parsed):
+        """Diff parsed prompts against the database and apply the changes in bulk.
         
-        # Also add some sample prompts if none were found
-        if created_count == 0 and updated_count == 0:
-            self.create_sample_prompts()
+        Bulk writes bypass Prompt.save(), so inferred actions are derived here,
+        also for unchanged prompts that have none yet.
+        """
+        with transaction.atomic():
+            existing = {(p.number, p.entry): p for p in Prompt.objects.all()}
+            to_create = []
+            to_update = []
+            for (number, entry), text in parsed.items():
+                prompt = existing.get((number, entry))
+                if prompt is None:
+                    to_create.append(Prompt(number=number, entry=entry, text=text, inferred_actions=infer_actions(text)))
+                    self.stdout.write(f'Created prompt {number}{entry}')
+                elif prompt.text != text:
+                    prompt.text = text
+                    prompt.inferred_actions = infer_actions(text)
+                    to_update.append(prompt)
+                    self.stdout.write(f'Updated prompt {number}{entry}')
+                elif prompt.inferred_actions is None:
+                    # Loaded before inferred_actions existed
+                    prompt.inferred_actions = infer_actions(text)
+                    to_update.append(prompt)
+            
+            Prompt.objects.bulk_create(to_create, batch_size=500)
+            Prompt.objects.bulk_update(to_update, ['text', 'inferred_actions'], batch_size=500)
+        return len(to_create), len(to_update)
+    
+    def report_timings(self, options, timings):
+        if options['stats']:
+            for step, seconds in timings.items():
+                self.stdout.write(f'{step:>6}: {seconds * 1000:8.1f} ms')
     
     def create_sample_prompts(self):
         """Create some sample prompts for testing"""
@@ -0,0 +1,115 @@
+"""
+Management command to play synthetic games end to end and report turn-path performance.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from game.models import Prompt
+from game.simulator import TURN_STAGES, percentile, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Simulate vampires playing through setup and many turns, in parallel worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vampires', type=int, default=8, help='Number of vampires to play (default: 8)')
+        parser.add_argument('--turns', type=int, default=50, help='Maximum turns per vampire (default: 50)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Worker processes, each with its own SQLite database (default: up to 4)',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for responses, choices and dice')
+        parser.add_argument(
+            '--db-dir',
+            type=str,
+            help='Keep the worker databases in this directory instead of a temporary one',
+        )
+
+    def handle(self, *args, **options):
+        vampires = options['vampires']
+        workers = max(1, min(options['workers'], vampires))
+        prompts = list(Prompt.objects.values('number', 'entry', 'text', 'actions', 'inferred_actions'))
+        if not prompts:
+            raise CommandError('No prompts found. Run load_prompts first.')
+
+        db_dir = options['db_dir'] or tempfile.mkdtemp(prefix='simulate_games_')
+        os.makedirs(db_dir, exist_ok=True)
+        # Spread the vampires over the workers as evenly as possible
+        shares = [vampires // workers + (i < vampires % workers) for i in range(workers)]
+
+        self.stdout.write(f'Simulating {vampires} vampires, up to {options["turns"]} turns each, in {workers} workers')
+        connections.close_all()  # never hand an open connection to a forked worker
+        start = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(
+                        run_worker, i, share, options['turns'], prompts,
+                        os.path.join(db_dir, f'worker_{i}.sqlite3'), options['seed']
+                    )
+                    for i, share in enumerate(shares)
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            if not options['db_dir']:
+                shutil.rmtree(db_dir, ignore_errors=True)
+        wall = time.perf_counter() - start
+
+        self.report(results, wall)
+
+    def report(self, results, wall):
+        turns = sum(result['turns'] for result in results)
+        busiest = max(result['elapsed'] for result in results)
+        latencies = {}
+        queries = {}
+        errors = {}
+        views = {}
+        for result in results:
+            for stage, values in result['latencies'].items():
+                latencies.setdefault(stage, []).extend(values)
+            for stage, count in result['queries'].items():
+                queries[stage] = queries.get(stage, 0) + count
+            for stage, messages in result['errors'].items():
+                for message, count in messages.items():
+                    errors[(stage, message)] = errors.get((stage, message), 0) + count
+            for name, metrics in result['views'].items():
+                merged = views.setdefault(name, {'requests': 0, 'queries': 0, 'max_queries': 0})
+                merged['budget'] = metrics['budget']
+                merged['requests'] += metrics['requests']
+                merged['queries'] += metrics['mean_queries'] * metrics['requests']
+                merged['max_queries'] = max(merged['max_queries'], metrics['max_queries'])
+
+        self.stdout.write(
+            f'{turns} turns in {busiest:.2f}s of play ({wall:.2f}s including migrations): '
+            f'{turns / busiest:.1f} turns/s, {sum(r["finished"] for r in results)} games finished, '
+            f'{sum(r["stopped"] for r in results)} stopped early'
+        )
+        if turns:
+            turn_queries = sum(queries.get(stage, 0) for stage in TURN_STAGES)
+            self.stdout.write(f'Queries per turn: {turn_queries / turns:.1f}')
+
+        self.stdout.write(f'\n{"stage":<18}{"calls":>8}{"queries":>10}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+        for stage, values in latencies.items():
+            row = [percentile(values, p) * 1000 for p in (0.5, 0.9, 0.99, 1.0)]
+            self.stdout.write(
+                f'{stage:<18}{len(values):>8}{queries.get(stage, 0) / len(values):>10.1f}'
+                + ''.join(f'{value:>10.2f}' for value in row)
+            )
+
+        # The most queries any request made, next to the budget it is held to (see QUERY_BUDGETS)
+        self.stdout.write(f'\n{"view":<18}{"requests":>10}{"queries":>10}{"max":>8}{"budget":>8}')
+        for name, merged in sorted(views.items()):
+            self.stdout.write(
+                f'{name:<18}{merged["requests"]:>10}{merged["queries"] / merged["requests"]:>10.1f}'
+                f'{merged["max_queries"]:>8}{merged["budget"] if merged["budget"] is not None else "-":>8}'
+            )
+
+        for (stage, message), count in sorted(errors.items()):
+            self.stdout.write(self.style.WARNING(f'{stage}: {count} x {message}'))
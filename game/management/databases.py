@@ -0,0 +1,49 @@
+"""
+Scratch databases for the benchmark and simulation commands
+The commands build their fixtures in SQLite files of their own, so that they never write to the
+database the site runs on, and switch back to it when they are done.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+
+
+def use_database(db_path, migrate=True, options=None):
+    """Point the default connection at the SQLite file db_path, and migrate it unless told not to.
+
+    options, if given, replaces the connection's OPTIONS.
+    """
+    connections.close_all()
+    for settings_dict in (settings.DATABASES['default'], connections['default'].settings_dict):
+        settings_dict['NAME'] = db_path
+        if options is not None:
+            settings_dict['OPTIONS'] = options
+    if migrate:
+        call_command('migrate', verbosity=0, interactive=False)
+
+
+@contextmanager
+def scratch_database(filename, prefix, db_dir=None):
+    """Run the block against a fresh, migrated database in a temporary directory, and yield the directory.
+
+    The directory is removed afterwards unless db_dir names one to keep, and
+    the default connection is pointed back at the database it used before.
+    """
+    saved = {key: settings.DATABASES['default'].get(key) for key in ('NAME', 'OPTIONS')}
+    keep = db_dir is not None
+    db_dir = db_dir or tempfile.mkdtemp(prefix=prefix)
+    os.makedirs(db_dir, exist_ok=True)
+    try:
+        use_database(os.path.join(db_dir, filename))
+        yield db_dir
+    finally:
+        connections.close_all()
+        settings.DATABASES['default'].update(saved)
+        connections['default'].settings_dict.update(saved)
+        if not keep:
+            shutil.rmtree(db_dir, ignore_errors=True)
@@ -0,0 +1,54 @@
+"""
+Memory slot allocation for Thousand Year Old Vampire
+This module decides which memory a new experience goes into, using one annotated query.
+"""
+
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
+from .models import Memory
+
+
+# A memory holds at most three experiences
+MAX_EXPERIENCES = 3
+
+
+class MemoryFullError(Exception):
+    """Raised when an experience is added to a memory that already holds three."""
+
+
+def with_experience_counts(memories):
+    """Annotate a Memory queryset with experience_count and last_experience_order."""
+    return memories.annotate(
+        experience_count=Count('experiences'),
+        last_experience_order=Coalesce(Max('experiences__order'), 0),
+    )
+
+
+def allocate_memory_slot(character):
+    """Pick the memory slot the next prompt experience goes into.
+
+    Returns (memory, experience_order, recycled). The first unlost memory with
+    room is used; when every memory is full, the oldest one is returned with
+    recycled=True and the caller is expected to clear it before writing.
+    """
+    memories = list(with_experience_counts(character.memories.filter(is_lost=False)).order_by('order'))
+    if not memories:
+        raise Memory.DoesNotExist("No memory slots remain")
+
+    for memory in memories:
+        if memory.experience_count < MAX_EXPERIENCES:
+            return memory, memory.last_experience_order + 1, False
+    return memories[0], 1, True
+
+
+def next_experience_order(memories, memory_id):
+    """Return (memory, experience_order) for adding an experience to a chosen memory.
+
+    memories is a queryset of one vampire's memories. Raises
+    Memory.DoesNotExist if the memory is not among them, and MemoryFullError
+    if it already holds the maximum number of experiences.
+    """
+    memory = with_experience_counts(memories).get(id=memory_id)
+    if memory.experience_count >= MAX_EXPERIENCES:
+        raise MemoryFullError(f"Memory is full (max {MAX_EXPERIENCES} experiences)")
+    return memory, memory.last_experience_order + 1
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def backfill_setup_complete(apps, schema_editor):
+    VampireCharacter = apps.get_model('game', 'VampireCharacter')
+    Experience = apps.get_model('game', 'Experience')
+    for character in VampireCharacter.objects.all():
+        character.setup_complete = (
+            character.skills.count() >= 3 and
+            character.resources.count() >= 3 and
+            character.characters.filter(character_type='immortal').exists() and
+            character.marks.exists() and
+            Experience.objects.filter(memory__character=character, memory__order=5).exists()
+        )
+        character.save(update_fields=['setup_complete'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_prompt_actions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vampirecharacter',
+            name='setup_complete',
+            field=models.BooleanField(default=False, help_text='Set once the vampire has the skills, resources, immortal, mark and memories setup requires'),
+        ),
+        migrations.RunPython(backfill_setup_complete, migrations.RunPython.noop),
+    ]
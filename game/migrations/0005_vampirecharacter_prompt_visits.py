@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_prompt_visits(apps, schema_editor):
+    VampireCharacter = apps.get_model('game', 'VampireCharacter')
+    GameSession = apps.get_model('game', 'GameSession')
+    for character in VampireCharacter.objects.all():
+        visits = (
+            GameSession.objects.filter(character=character)
+            .values('prompt_number')
+            .annotate(visits=Count('id'))
+        )
+        character.prompt_visits = {str(v['prompt_number']): v['visits'] for v in visits}
+        character.save(update_fields=['prompt_visits'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_vampirecharacter_setup_complete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vampirecharacter',
+            name='prompt_visits',
+            field=models.JSONField(blank=True, default=dict, help_text='How many times each prompt number has been answered, keyed by number'),
+        ),
+        migrations.RunPython(backfill_prompt_visits, migrations.RunPython.noop),
+    ]
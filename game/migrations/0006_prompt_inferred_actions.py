@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Existing prompts are left null, "not yet analyzed", and matched at play time until
+    # `manage.py load_prompts` (or `infer_prompt_actions --missing-only`) fills them in, which
+    # it does even when the prompts file is unchanged. The matcher is app code that keeps
+    # changing, so it is not run from here.
+
+    dependencies = [
+        ('game', '0005_vampirecharacter_prompt_visits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='inferred_actions',
+            field=models.JSONField(blank=True, editable=False, help_text='Action templates derived from the prompt text when it was saved; null if not yet analyzed', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_prompt_inferred_actions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vampirecharacter',
+            name='state_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Increases whenever the character sheet changes; keys cached views of the sheet'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_vampirecharacter_state_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('content_hash', models.CharField(help_text='SHA-256 of the file as last loaded', max_length=64)),
+                ('prompt_count', models.IntegerField(default=0, help_text='Prompts in the database after the last load')),
+                ('loaded_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_promptsource'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(condition=models.Q(('character_type', 'mortal'), ('is_dead', False)), fields=['vampire'], name='game_character_live_mortal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['character', 'prompt_number'], name='game_session_prompt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['character', '-created_at'], name='game_session_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mark',
+            index=models.Index(condition=models.Q(('is_removed', False)), fields=['character'], name='game_mark_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(condition=models.Q(('is_lost', False)), fields=['character', 'is_stationary'], name='game_resource_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='skill',
+            index=models.Index(condition=models.Q(('is_lost', False)), fields=['character', 'is_checked'], name='game_skill_live_idx'),
+        ),
+    ]
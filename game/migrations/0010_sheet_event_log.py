@@ -0,0 +1,108 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:37
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Sheet models and the path from each to the vampire it belongs to
+SHEET_OWNERS = (
+    ('VampireCharacter', 'id'),
+    ('Memory', 'character_id'),
+    ('Experience', 'memory__character_id'),
+    ('Skill', 'character_id'),
+    ('Resource', 'character_id'),
+    ('Character', 'vampire_id'),
+    ('Mark', 'character_id'),
+    ('Diary', 'character_id'),
+)
+
+# Bookkeeping fields that change without the sheet changing
+IGNORED_FIELDS = {'state_version', 'updated_at'}
+
+
+def row_image(row):
+    """Return {attname: value} for a row, as game.events logged it when this migration was written."""
+    return {
+        field.attname: field.value_from_object(row)
+        for field in row._meta.concrete_fields
+        if not field.primary_key and field.name not in IGNORED_FIELDS
+    }
+
+
+def log_existing_sheets(apps, schema_editor):
+    """Start every existing vampire's log with one save event per row of its sheet."""
+    SheetEvent = apps.get_model('game', 'SheetEvent')
+    for model_name, owner in SHEET_OWNERS:
+        model = apps.get_model('game', model_name)
+        events = [
+            SheetEvent(
+                character_id=owner_id, kind='save', model=model._meta.model_name,
+                object_id=row.pk, data=row_image(row),
+            )
+            for row, owner_id in (
+                (row, row.owner_id) for row in model.objects.annotate(owner_id=models.F(owner)).order_by('pk')
+            )
+        ]
+        SheetEvent.objects.bulk_create(events, batch_size=1000)
+
+    # Mark how far each chronicle had got, so that the state now is the state at that turn
+    VampireCharacter = apps.get_model('game', 'VampireCharacter')
+    SheetEvent.objects.bulk_create([
+        SheetEvent(character_id=vampire.pk, kind='turn', turn=sum(vampire.prompt_visits.values()))
+        for vampire in VampireCharacter.objects.order_by('pk')
+        if vampire.prompt_visits
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_sheet_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('save', 'Save'), ('delete', 'Delete'), ('turn', 'Turn')], max_length=10)),
+                ('model', models.CharField(blank=True, help_text='Model name of the changed row', max_length=30)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='The field values written, or the session of a turn')),
+                ('turn', models.PositiveIntegerField(blank=True, help_text='Turns played so far, on turn events', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sheet_events', to='game.vampirecharacter')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SheetSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('turn', models.PositiveIntegerField()),
+                ('state', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sheet_snapshots', to='game.vampirecharacter')),
+                ('last_event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='game.sheetevent')),
+            ],
+            options={
+                'ordering': ['-last_event'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='sheetevent',
+            index=models.Index(fields=['character', 'id'], name='game_sheetevent_log_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sheetevent',
+            index=models.Index(condition=models.Q(('kind', 'turn')), fields=['character', 'turn'], name='game_sheetevent_turn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sheetsnapshot',
+            index=models.Index(fields=['character', 'last_event'], name='game_sheetsnapshot_idx'),
+        ),
+        migrations.RunPython(log_existing_sheets, migrations.RunPython.noop),
+    ]
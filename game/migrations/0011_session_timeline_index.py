@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_sheet_event_log'),
+    ]
+
+    operations = [
+        # The timeline index starts with the same columns, so it serves the recent-sessions filter too
+        migrations.RemoveIndex(
+            model_name='gamesession',
+            name='game_session_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['character', '-created_at', '-id'], name='game_session_timeline_idx'),
+        ),
+    ]
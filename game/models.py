@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 import json
+from .prompt_matcher import infer_actions
 
 
 class VampireCharacter(models.Model):
@@ -11,12 +13,68 @@ class VampireCharacter(models.Model):
     current_prompt = models.IntegerField(default=1)
     prompt_entry = models.CharField(max_length=1, default='a')  # a, b, or c
     game_ended = models.BooleanField(default=False)
+    setup_complete = models.BooleanField(
+        default=False,
+        help_text="Set once the vampire has the skills, resources, immortal, mark and memories setup requires"
+    )
+    
+    prompt_visits = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="How many times each prompt number has been answered, keyed by number"
+    )
+    state_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Increases whenever the character sheet changes; keys cached views of the sheet"
+    )
     
     # Starting information
     origin_description = models.TextField(help_text="Who were they before becoming a vampire?")
     
     def __str__(self):
         return f"{self.name} ({self.user.username})"
+    
+    @classmethod
+    def bump_state_version(cls, **filters):
+        """Record a change to the sheet of every vampire matching the filters."""
+        cls.objects.filter(**filters).update(state_version=models.F('state_version') + 1)
+    
+    def current_state_version(self):
+        """Reload the sheet's state version, which only moves in the database, and return it."""
+        self.refresh_from_db(fields=['state_version'])
+        return self.state_version
+    
+    def visits_to(self, prompt_number):
+        """Return how many times this vampire has answered the given prompt number."""
+        return self.prompt_visits.get(str(prompt_number), 0)
+    
+    def record_visit(self, prompt_number):
+        """Count one more answer to the given prompt number (saved with the character)."""
+        self.prompt_visits[str(prompt_number)] = self.visits_to(prompt_number) + 1
+    
+    def compute_setup_complete(self):
+        """Probe the sheet, in one query, to check whether every character setup step has been done."""
+        def has(queryset, count=1):
+            # The count-th row exists, found without counting them all
+            return models.Exists(queryset[count - 1:count])
+        mine = models.OuterRef('pk')
+        return type(self).objects.filter(
+            has(Skill.objects.filter(character=mine), 3),
+            has(Resource.objects.filter(character=mine), 3),
+            has(Character.objects.filter(vampire=mine, character_type='immortal')),
+            has(Mark.objects.filter(character=mine)),
+            has(Experience.objects.filter(memory__character=mine, memory__order=5)),
+            pk=self.pk,
+        ).exists()
+    
+    def refresh_setup_complete(self):
+        """Recompute the setup_complete flag and save it if it changed."""
+        setup_complete = self.compute_setup_complete()
+        if setup_complete != self.setup_complete:
+            self.setup_complete = setup_complete
+            self.save(update_fields=['setup_complete'])
+        return setup_complete
 
 
 class Memory(models.Model):
@@ -56,6 +114,16 @@ class Skill(models.Model):
     is_lost = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # A vampire's skills still in play, split by whether they are checked
+            models.Index(
+                fields=['character', 'is_checked'],
+                condition=models.Q(is_lost=False),
+                name='game_skill_live_idx',
+            ),
+        ]
+    
     def __str__(self):
         status = "✓" if self.is_checked else "○"
         if self.is_lost:
@@ -71,6 +139,15 @@ class Resource(models.Model):
     is_lost = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['character', 'is_stationary'],
+                condition=models.Q(is_lost=False),
+                name='game_resource_live_idx',
+            ),
+        ]
+    
     def __str__(self):
         status = "✗" if self.is_lost else "○"
         return f"{status} {self.name}"
@@ -100,6 +177,16 @@ class Character(models.Model):
     is_dead = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Mortals who can still be killed, converted or aged out
+            models.Index(
+                fields=['vampire'],
+                condition=models.Q(character_type='mortal', is_dead=False),
+                name='game_character_live_mortal_idx',
+            ),
+        ]
+    
     def __str__(self):
         status = "✗" if self.is_dead else "○"
         return f"{status} {self.name} ({self.character_type})"
@@ -112,6 +199,11 @@ class Mark(models.Model):
     is_removed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['character'], condition=models.Q(is_removed=False), name='game_mark_live_idx'),
+        ]
+    
     def __str__(self):
         status = "✗" if self.is_removed else "○"
         return f"{status} {self.description[:50]}"
@@ -140,6 +232,11 @@ class GameSession(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['character', 'prompt_number'], name='game_session_prompt_idx'),
+            # A vampire's sessions newest first, with id breaking ties: the keyset of the timeline
+            models.Index(fields=['character', '-created_at', '-id'], name='game_session_timeline_idx'),
+        ]
     
     def __str__(self):
         return f"Session {self.id}: Prompt {self.prompt_number}{self.prompt_entry}"
@@ -154,6 +251,12 @@ class Prompt(models.Model):
         blank=True,
         help_text="JSON array of required mechanical actions for this prompt"
     )
+    inferred_actions = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Action templates derived from the prompt text when it was saved; null if not yet analyzed"
+    )
     
     class Meta:
         unique_together = ['number', 'entry']
@@ -162,6 +265,14 @@ class Prompt(models.Model):
     def __str__(self):
         return f"Prompt {self.number}{self.entry}"
     
+    def save(self, *args, **kwargs):
+        # Prompt text never changes during play, so its actions are derived here once
+        self.inferred_actions = infer_actions(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'inferred_actions'}
+        super().save(*args, **kwargs)
+    
     def get_actions(self):
         """Return the actions as a Python list."""
         return self.actions if self.actions else []
@@ -170,3 +281,66 @@ class Prompt(models.Model):
     def has_actions(self):
         """Return True if this prompt has any actions defined."""
         return bool(self.actions and len(self.actions) > 0)
+
+
+class PromptSource(models.Model):
+    """A prompt text file that load_prompts has loaded, with the hash of its contents."""
+    path = models.CharField(max_length=500, unique=True)
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the file as last loaded")
+    prompt_count = models.IntegerField(default=0, help_text="Prompts in the database after the last load")
+    loaded_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.path} ({self.content_hash[:12]})"
+
+
+class SheetEvent(models.Model):
+    """One change to a vampire's sheet, in the order it happened. Events are only ever appended."""
+    KINDS = [
+        ('save', 'Save'),
+        ('delete', 'Delete'),
+        ('turn', 'Turn'),
+    ]
+    
+    character = models.ForeignKey(VampireCharacter, on_delete=models.CASCADE, related_name='sheet_events')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    model = models.CharField(max_length=30, blank=True, help_text="Model name of the changed row")
+    object_id = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField(
+        default=dict,
+        encoder=DjangoJSONEncoder,
+        help_text="The field values written, or the session of a turn"
+    )
+    turn = models.PositiveIntegerField(null=True, blank=True, help_text="Turns played so far, on turn events")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['character', 'id'], name='game_sheetevent_log_idx'),
+            models.Index(fields=['character', 'turn'], condition=models.Q(kind='turn'), name='game_sheetevent_turn_idx'),
+        ]
+    
+    def __str__(self):
+        if self.kind == 'turn':
+            return f"Event {self.id}: turn {self.turn}"
+        return f"Event {self.id}: {self.kind} {self.model} {self.object_id}"
+
+
+class SheetSnapshot(models.Model):
+    """The whole sheet of a vampire as rebuilt from its event log up to and including last_event."""
+    character = models.ForeignKey(VampireCharacter, on_delete=models.CASCADE, related_name='sheet_snapshots')
+    last_event = models.ForeignKey(SheetEvent, on_delete=models.CASCADE, related_name='+')
+    turn = models.PositiveIntegerField()
+    state = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-last_event']
+        indexes = [
+            models.Index(fields=['character', 'last_event'], name='game_sheetsnapshot_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Snapshot of {self.character_id} at turn {self.turn}"
+
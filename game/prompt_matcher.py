@@ -0,0 +1,345 @@
+"""
+Precompiled trigger matcher for PromptProcessor fallback analysis
+Every trigger phrase is folded into one trie-shaped regular expression, compiled once
+at import, which finds all action triggers in a single pass over the prompt text. The
+triggers are turned into character-independent action templates by infer_actions().
+"""
+
+import re
+
+
+# Plain trigger phrases, by trigger name. A trigger is present when any of its
+# phrases occurs in the (lowercased) prompt text.
+TRIGGER_PHRASES = {
+    'kill_mortal': [
+        'kill a mortal character',
+        'kill a character',
+        'murder someone',
+        'destroy someone close to you',
+    ],
+    'create_mortal': ['create a new mortal character', 'create a mortal character'],
+    'create_mortal_if_none': ['create a mortal if none are available'],
+    'create_immortal': [
+        'create an immortal',
+        'create a new immortal character',
+        'create an immortal character',
+    ],
+    'convert_mortal': [
+        'convert a mortal character into an immortal',
+        'turning them into a monster like yourself',
+    ],
+    'create_skill_specific': [
+        'create a skill that reflects',
+        'create a skill based on',
+        'create an appropriate skill',
+    ],
+    'create_skill': ['create a skill'],
+    # Even without a skill name to capture, these rule out a generic skill
+    'name_skill': ['take the skill', 'gain the skill'],
+    'lose_skill': ['lose a skill', 'lose one of your skills'],
+    'create_stationary_resource': ['gain a stationary resource', 'create a stationary resource'],
+    'create_resource': ['gain a resource', 'create a resource'],
+    'lose_stationary_resources': ['lose all stationary resources'],
+    'create_mark': ['gain a mark', 'create a mark', 'take a mark'],
+    'remove_mark': ['remove a mark', 'you may remove a mark'],
+    'you_may': ['you may'],
+    'age_mortals': ['strikeout all mortal characters'],
+    'lose_memory': ['strikeout a memory', 'lose a memory'],
+}
+
+# Triggers that capture a value, as (literal prefix, value pattern, terminator pattern).
+# The value is read ahead without being consumed, so triggers inside it are still found;
+# like re.findall, a trigger's next capture only starts after the terminator of its last.
+CAPTURE_PATTERNS = {
+    'take_skill': ('take the skill ', r'[^.]+?', r'(?:\.|$)'),
+    'gain_skill': ('gain the skill ', r'[^.]+?', r'(?:\.|$)'),
+    'check_skills': ('check ', r'\d+', r' skills?'),
+    'lose_resources': ('lose ', r'\d+', r' resources?'),
+}
+
+
+def analyze_legacy(text, plurals_twice=True):
+    """The fallback analysis PromptProcessor ran before match_triggers(), as action templates.
+
+    This is the removed code path, one substring scan per phrase and one
+    re.findall per pattern, with the sheet lookups (choices, allow_create) left
+    out. It is kept to check and benchmark infer_actions() against. The old
+    code ran a plural and a singular pattern for "check N skills" and "lose N
+    resources", so plurals were reported twice; plurals_twice=False leaves out
+    the plural patterns' duplicates, which infer_actions() no longer makes.
+    """
+    actions = []
+
+    # Characters
+    if any(phrase in text for phrase in [
+        'kill a mortal character',
+        'kill a character',
+        'murder someone',
+        'destroy someone close to you'
+    ]):
+        actions.append({'type': 'kill_mortal', 'description': 'Kill a mortal character'})
+    if any(phrase in text for phrase in [
+        'create a new mortal character',
+        'create a mortal character'
+    ]) and 'create a mortal if none are available' not in text:
+        actions.append({'type': 'create_mortal', 'description': 'Create a new mortal character', 'requires_input': True})
+    if any(phrase in text for phrase in [
+        'create an immortal',
+        'create a new immortal character',
+        'create an immortal character'
+    ]):
+        actions.append({'type': 'create_immortal', 'description': 'Create a new immortal character', 'requires_input': True})
+    if any(phrase in text for phrase in [
+        'convert a mortal character into an immortal',
+        'turning them into a monster like yourself'
+    ]):
+        actions.append({'type': 'convert_mortal', 'description': 'Convert a mortal character into an immortal'})
+
+    # Skills
+    for pattern in [r'take the skill ([^.]+?)(?:\.|$)', r'gain the skill ([^.]+?)(?:\.|$)']:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            skill_name = match.strip().title().replace(' And', ' and')
+            actions.append({
+                'type': 'add_skill',
+                'description': f'Gain the skill: {skill_name}',
+                'skill_name': skill_name,
+                'auto_execute': True
+            })
+    if any(phrase in text for phrase in [
+        'create a skill that reflects',
+        'create a skill based on',
+        'create an appropriate skill',
+    ]) or (
+        'create a skill' in text and
+        'take the skill' not in text and
+        'gain the skill' not in text
+    ):
+        if not any(action['type'] == 'add_skill' for action in actions):
+            actions.append({'type': 'create_skill', 'description': 'Create a new skill', 'requires_input': True})
+    for pattern in [r'check (\d+) skills', r'check (\d+) skill'][0 if plurals_twice else 1:]:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            count = int(match)
+            actions.append({'type': 'check_skills', 'description': f'Check {count} skill(s)', 'count': count})
+    if any(phrase in text for phrase in [
+        'lose a skill',
+        'lose one of your skills'
+    ]):
+        actions.append({'type': 'lose_skill', 'description': 'Lose a skill'})
+
+    # Resources
+    if any(phrase in text for phrase in [
+        'gain a stationary resource',
+        'create a stationary resource'
+    ]):
+        actions.append({
+            'type': 'create_resource',
+            'description': 'Gain a new stationary resource',
+            'requires_input': True,
+            'is_stationary': True
+        })
+    if any(phrase in text for phrase in [
+        'gain a resource',
+        'create a resource'
+    ]):
+        actions.append({
+            'type': 'create_resource',
+            'description': 'Gain a new resource',
+            'requires_input': True,
+            'is_stationary': False
+        })
+    for pattern in [r'lose (\d+) resources', r'lose (\d+) resource'][0 if plurals_twice else 1:]:
+        for match in re.findall(pattern, text, re.IGNORECASE):
+            count = int(match)
+            actions.append({'type': 'lose_resources', 'description': f'Lose {count} resource(s)', 'count': count})
+    if 'lose all stationary resources' in text:
+        actions.append({
+            'type': 'lose_stationary_resources',
+            'description': 'Lose all stationary resources',
+            'auto_execute': True
+        })
+
+    # Marks
+    if any(phrase in text for phrase in [
+        'gain a mark',
+        'create a mark',
+        'take a mark'
+    ]):
+        actions.append({'type': 'create_mark', 'description': 'Gain a new mark', 'requires_input': True})
+    if any(phrase in text for phrase in [
+        'remove a mark',
+        'you may remove a mark'
+    ]):
+        actions.append({'type': 'remove_mark', 'description': 'Remove a mark', 'optional': 'you may' in text})
+
+    # Memories
+    if 'strikeout all mortal characters' in text:
+        actions.append({'type': 'age_mortals', 'description': 'All mortal characters die of old age', 'auto_execute': True})
+    elif any(phrase in text for phrase in [
+        'strikeout a memory',
+        'lose a memory'
+    ]):
+        actions.append({'type': 'lose_memory', 'description': 'Lose a memory'})
+
+    return actions
+
+
+def _split_tail(phrase, starts):
+    """Split a phrase into the part to consume and a tail to only look ahead at.
+
+    "destroy someone close to you" ends where "you may" begins, so its "you" is
+    left unconsumed and the next match can still start there.
+    """
+    for cut in range(1, len(phrase)):
+        tail = phrase[cut:]
+        if any(start != phrase and start.startswith(tail) for start in starts):
+            return phrase[:cut], tail
+    return phrase, ''
+
+
+def _trie_pattern(node):
+    """Render a character trie as a regex, trying longer continuations before leaves."""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in node.items() if char]
+    branches += node.get('', [])
+    if len(branches) == 1:
+        return branches[0]
+    return '(?:' + '|'.join(branches) + ')'
+
+
+def _compile():
+    """Build one regex over every trigger, factored into a trie on shared prefixes.
+
+    Each phrase or capture ends in an empty named group, so match.lastgroup
+    tells which one matched. Sharing prefixes means the engine tests each
+    position once instead of once per phrase.
+    """
+    phrases = [(trigger, phrase) for trigger, group in TRIGGER_PHRASES.items() for phrase in group]
+    starts = [phrase for _, phrase in phrases] + [prefix for prefix, _, _ in CAPTURE_PATTERNS.values()]
+
+    trie = {}
+    implied = {}
+
+    def add(literal, leaf):
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node.setdefault('', []).append(leaf)
+
+    for index, (trigger, phrase) in enumerate(phrases):
+        name = f'p{index}'
+        head, tail = _split_tail(phrase, starts)
+        add(head, (f'(?={re.escape(tail)})' if tail else '') + f'(?P<{name}>)')
+        # A phrase implies every trigger whose phrase lies inside it, since the
+        # longest match at a position hides the shorter ones
+        implied[name] = (trigger,) + tuple(
+            other for other, inner in phrases if inner != phrase and inner in phrase and other != trigger
+        )
+    for trigger, (prefix, value, terminator) in CAPTURE_PATTERNS.items():
+        add(prefix, f'(?=(?P<{trigger}_value>{value})(?P<{trigger}_end>{terminator}))(?P<{trigger}>)')
+    return re.compile(_trie_pattern(trie)), implied
+
+
+TRIGGER_REGEX, _IMPLIED_TRIGGERS = _compile()
+
+
+def match_triggers(text):
+    """Find every action trigger in lowercased prompt text in one pass.
+
+    Returns a dict mapping each trigger present to a tuple of captured values,
+    which is empty for plain phrase triggers.
+    """
+    triggers = {}
+    capture_ends = {}
+    for match in TRIGGER_REGEX.finditer(text):
+        name = match.lastgroup
+        if name in CAPTURE_PATTERNS:
+            # Its prefix inside the value of an earlier capture, as in "take the skill take the skill x."
+            if match.start() < capture_ends.get(name, 0):
+                continue
+            capture_ends[name] = match.end(f'{name}_end')
+            triggers[name] = triggers.get(name, ()) + (match.group(f'{name}_value'),)
+        else:
+            for trigger in _IMPLIED_TRIGGERS[name]:
+                triggers.setdefault(trigger, ())
+    return triggers
+
+
+def infer_actions(text):
+    """Derive the action templates a prompt's text calls for.
+
+    Templates hold everything that follows from the text alone; the entities a
+    player picks from (choices, allow_create) are attached later, by
+    PromptProcessor, from the character's current sheet. Prompt text never
+    changes, so this runs once per prompt when it is saved.
+    """
+    triggers = match_triggers(text.lower())
+    actions = []
+
+    # Characters
+    if 'kill_mortal' in triggers:
+        actions.append({'type': 'kill_mortal', 'description': 'Kill a mortal character'})
+    # A mortal created only if none are available is handled by kill_mortal's allow_create
+    if 'create_mortal' in triggers and 'create_mortal_if_none' not in triggers:
+        actions.append({'type': 'create_mortal', 'description': 'Create a new mortal character', 'requires_input': True})
+    if 'create_immortal' in triggers:
+        actions.append({'type': 'create_immortal', 'description': 'Create a new immortal character', 'requires_input': True})
+    if 'convert_mortal' in triggers:
+        actions.append({'type': 'convert_mortal', 'description': 'Convert a mortal character into an immortal'})
+
+    # Skills
+    skill_names = triggers.get('take_skill', ()) + triggers.get('gain_skill', ())
+    for match in skill_names:
+        skill_name = match.strip().title().replace(' And', ' and')
+        actions.append({
+            'type': 'add_skill',
+            'description': f'Gain the skill: {skill_name}',
+            'skill_name': skill_name,
+            'auto_execute': True
+        })
+    # A generic skill is only created when no specific one is named
+    if not skill_names and ('create_skill_specific' in triggers
+                            or ('create_skill' in triggers and 'name_skill' not in triggers)):
+        actions.append({'type': 'create_skill', 'description': 'Create a new skill', 'requires_input': True})
+    for match in triggers.get('check_skills', ()):
+        count = int(match)
+        actions.append({'type': 'check_skills', 'description': f'Check {count} skill(s)', 'count': count})
+    if 'lose_skill' in triggers:
+        actions.append({'type': 'lose_skill', 'description': 'Lose a skill'})
+
+    # Resources
+    if 'create_stationary_resource' in triggers:
+        actions.append({
+            'type': 'create_resource',
+            'description': 'Gain a new stationary resource',
+            'requires_input': True,
+            'is_stationary': True
+        })
+    if 'create_resource' in triggers:
+        actions.append({
+            'type': 'create_resource',
+            'description': 'Gain a new resource',
+            'requires_input': True,
+            'is_stationary': False
+        })
+    for match in triggers.get('lose_resources', ()):
+        count = int(match)
+        actions.append({'type': 'lose_resources', 'description': f'Lose {count} resource(s)', 'count': count})
+    if 'lose_stationary_resources' in triggers:
+        actions.append({
+            'type': 'lose_stationary_resources',
+            'description': 'Lose all stationary resources',
+            'auto_execute': True
+        })
+
+    # Marks
+    if 'create_mark' in triggers:
+        actions.append({'type': 'create_mark', 'description': 'Gain a new mark', 'requires_input': True})
+    if 'remove_mark' in triggers:
+        actions.append({'type': 'remove_mark', 'description': 'Remove a mark', 'optional': 'you_may' in triggers})
+
+    # Memories
+    if 'age_mortals' in triggers:
+        actions.append({'type': 'age_mortals', 'description': 'All mortal characters die of old age', 'auto_execute': True})
+    elif 'lose_memory' in triggers:
+        actions.append({'type': 'lose_memory', 'description': 'Lose a memory'})
+
+    return actions
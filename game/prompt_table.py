@@ -0,0 +1,121 @@
+"""
+In-process prompt table for Thousand Year Old Vampire
+The prompt corpus is static, so it is read from the database once per process and served
+from an immutable table keyed by (number, entry).
+"""
+
+import threading
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+from django.core.cache import caches
+from .models import Prompt
+
+
+# Cache key holding the current table generation, in the 'prompt_table' cache that every
+# process shares (see CACHES). Bumping it makes each process reload its table at the start
+# of its next request, including a running server after a management command changed prompts.
+VERSION_CACHE_KEY = 'game:prompt_table:version'
+
+_lock = threading.Lock()
+_table = None
+_table_version = None
+
+
+class PromptEntry(namedtuple('PromptEntry', ['id', 'number', 'entry', 'text', 'actions', 'inferred_actions'])):
+    """Immutable snapshot of a Prompt row."""
+    __slots__ = ()
+
+    @property
+    def prompt_id(self):
+        return f"{self.number}{self.entry}"
+
+    @property
+    def has_actions(self):
+        return bool(self.actions)
+
+
+def _freeze(value):
+    """Recursively turn JSON lists and dicts into tuples and read-only mappings."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _load_table():
+    rows = Prompt.objects.values_list('id', 'number', 'entry', 'text', 'actions', 'inferred_actions')
+    return MappingProxyType({
+        (number, entry): PromptEntry(pk, number, entry, text, _freeze(actions or []), _freeze(inferred))
+        for pk, number, entry, text, actions, inferred in rows
+    })
+
+
+def table_version():
+    """Return the current table generation from the shared cache, or None before the first change."""
+    return caches['prompt_table'].get(VERSION_CACHE_KEY)
+
+
+def get_prompt_table():
+    """Return the {(number, entry): PromptEntry} table, loading it on first use.
+
+    Lookups never touch the shared cache; check_prompt_table_version() looks
+    for changes made by other processes once per request.
+    """
+    global _table, _table_version
+    table = _table
+    if table is None:
+        with _lock:
+            if _table is None:
+                # Read before the rows, so a change made while loading is caught by the next check
+                _table_version = table_version()
+                _table = _load_table()
+            table = _table
+    return table
+
+
+def check_prompt_table_version(**kwargs):
+    """Drop the loaded table if the prompts were changed since it was loaded.
+
+    Connected to request_started, so the shared cache is asked once per request.
+    """
+    global _table
+    if _table is not None and table_version() != _table_version:
+        with _lock:
+            _table = None
+
+
+def get_prompt(number, entry):
+    """Return the PromptEntry for a prompt number and entry, or None if it does not exist."""
+    return get_prompt_table().get((number, entry))
+
+
+def parse_prompt_id(prompt_id):
+    """Split a prompt ID such as "9a" into (9, "a"); return None if it is malformed."""
+    number_str = ""
+    entry = ""
+    for i, char in enumerate(prompt_id or ""):
+        if char.isdigit():
+            number_str += char
+        else:
+            entry = prompt_id[i:]
+            break
+    if not number_str or not entry:
+        return None
+    return int(number_str), entry
+
+
+def get_prompt_by_id(prompt_id):
+    """Return the PromptEntry for a prompt ID such as "9a", or None."""
+    key = parse_prompt_id(prompt_id)
+    return get_prompt(*key) if key else None
+
+
+def invalidate_prompt_table():
+    """Drop the loaded table here and in every other process."""
+    global _table, _table_version
+    with _lock:
+        _table = None
+        _table_version = None
+    caches['prompt_table'].set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,189 @@
+"""
+Markov-chain analysis of the prompt walk in Thousand Year Old Vampire
+Each turn moves the vampire d10 - d6 prompts on, and revisits read the b and then c entry.
+This module solves that walk exactly as an absorbing Markov chain with NumPy.
+
+A state is the prompt the vampire has just arrived at, together with how often
+it has answered each "watched" prompt. A prompt only needs watching when a
+revisit changes how the game goes on, because its b or c entry ends the game or
+is missing. Every other prompt behaves the same on each visit, so its visit
+count can be left out. That keeps the chain small while still being exact.
+Per-prompt revisit statistics come from the fundamental matrix instead.
+"""
+
+import re
+import numpy as np
+from django.core.cache import cache
+from .prompt_table import get_prompt_table, table_version
+from .turns import PROMPT_ENTRIES, entry_for_visits, next_prompt_number
+
+
+# Cache key prefix for computed statistics; the prompt table version is appended
+STATS_CACHE_KEY = 'game:prompt_walk:stats'
+
+# "Roll a d10. On a 1 or 2, the game is over"
+GAME_OVER_ROLL = re.compile(r'on an? ((?:\d+(?:, | or |,? or )?)+), the game is over')
+
+
+def movement_distribution():
+    """Return {movement: probability} for a d10 - d6 roll."""
+    rolls = np.subtract.outer(np.arange(1, 11), np.arange(1, 7)).ravel()
+    movements, counts = np.unique(rolls, return_counts=True)
+    return dict(zip(movements.tolist(), (counts / rolls.size).tolist()))
+
+
+def game_over_chance(text):
+    """Return the chance that answering a prompt with this text ends the game."""
+    text = text.lower()
+    if 'the game is over' not in text:
+        return 0.0
+    roll = GAME_OVER_ROLL.search(text)
+    if roll:
+        return len(re.findall(r'\d+', roll.group(1))) / 10
+    return 1.0
+
+
+class PromptWalk:
+    """The prompt walk over a set of prompt texts, as an absorbing Markov chain.
+
+    prompts maps (number, entry) to prompt text. Arriving at a prompt whose
+    entry does not exist ends the walk as "stuck", as play_game cannot go on
+    from there.
+    """
+
+    def __init__(self, prompts, start=1):
+        self.prompts = prompts
+        self.moves = movement_distribution()
+        self.outcomes = {}
+        self.watched = []
+        numbers = {number for number, _ in prompts}
+        reachable_max = max(numbers, default=start) + max(self.moves)
+        for number in range(1, reachable_max + 1):
+            self.outcomes[number] = self._outcomes(number)
+            if len(self.outcomes[number]) > 1:
+                self.watched.append(number)
+        self.watch_index = {number: i for i, number in enumerate(self.watched)}
+        self._build(start)
+
+    def _outcomes(self, number):
+        """Return the game-over chance of each visit to a prompt, with None for a missing entry.
+
+        The list stops at the visit from which nothing changes any more, so it
+        has one item for a prompt whose visits all play out alike.
+        """
+        outcomes = []
+        for visits in range(len(PROMPT_ENTRIES)):
+            text = self.prompts.get((number, entry_for_visits(visits)))
+            outcomes.append(None if text is None else game_over_chance(text))
+            if outcomes[-1] is None or outcomes[-1] == 1.0:
+                break  # the walk never gets past this visit
+        while len(outcomes) > 1 and outcomes[-2] == outcomes[-1]:
+            outcomes.pop()
+        return outcomes
+
+    def _outcome(self, number, counts):
+        outcomes = self.outcomes.get(number, [None])
+        visits = counts[self.watch_index[number]] if number in self.watch_index else 0
+        return outcomes[min(visits, len(outcomes) - 1)]
+
+    def _build(self, start):
+        """Enumerate the reachable states and fill the transient and absorbing transition arrays."""
+        initial = (start, (0,) * len(self.watched))
+        self.states = [initial]
+        index = {initial: 0}
+        transitions = []  # (from, to, probability)
+        game_over = []
+        stuck = []
+
+        i = 0
+        while i < len(self.states):
+            number, counts = self.states[i]
+            end_chance = self._outcome(number, counts)
+            game_over.append(end_chance)
+            stuck.append(0.0)
+
+            # Answering the prompt counts a visit to it
+            answered = list(counts)
+            if number in self.watch_index:
+                w = self.watch_index[number]
+                answered[w] = min(answered[w] + 1, len(self.outcomes[number]) - 1)
+            answered = tuple(answered)
+
+            # A prompt that always ends the game leads nowhere
+            moves = self.moves.items() if end_chance < 1 else ()
+            for movement, probability in moves:
+                probability *= 1 - end_chance
+                target = next_prompt_number(number, movement)
+                if self._outcome(target, answered) is None:
+                    stuck[i] += probability
+                    continue
+                state = (target, answered)
+                if state not in index:
+                    index[state] = len(self.states)
+                    self.states.append(state)
+                transitions.append((i, index[state], probability))
+            i += 1
+
+        size = len(self.states)
+        self.Q = np.zeros((size, size))
+        rows, cols, probabilities = zip(*transitions) if transitions else ((), (), ())
+        np.add.at(self.Q, (np.array(rows, dtype=int), np.array(cols, dtype=int)), probabilities)
+        self.game_over = np.array(game_over)
+        self.stuck = np.array(stuck)
+        self.numbers = np.array([number for number, _ in self.states])
+
+    def analyze(self):
+        """Solve the chain and return the statistics as plain data.
+
+        N = (I - Q)^-1 holds the expected visits to each state. For the set S
+        of states at one prompt, R = I - N[S, S]^-1 is the chance of coming
+        back to S and H = N[0, S] N[S, S]^-1 is where S is first reached.
+        So the chance of at least k visits is H R^(k-1) 1. The expected number
+        of visits past the second, which read the c entry, is H R^2 N[S, S] 1.
+        """
+        N = np.linalg.inv(np.eye(len(self.states)) - self.Q)
+        visits = N[0]
+
+        prompts = []
+        for number in sorted(set(self.numbers.tolist())):
+            S = np.flatnonzero(self.numbers == number)
+            N_SS = N[np.ix_(S, S)]
+            N_SS_inv = np.linalg.inv(N_SS)
+            H = visits[S] @ N_SS_inv
+            R = np.eye(len(S)) - N_SS_inv
+            at_least = [H.sum(), (H @ R).sum(), (H @ R @ R).sum()]
+            entries = {}
+            for k, entry in enumerate(PROMPT_ENTRIES):
+                entries[entry] = float(at_least[k]) if (number, entry) in self.prompts else None
+            prompts.append({
+                'number': number,
+                'entries': entries,
+                'expected_visits': float(visits[S].sum()),
+                'expected_c_entries': float((H @ R @ R @ N_SS).sum()),
+            })
+
+        return {
+            'states': len(self.states),
+            'watched_prompts': [number for number in self.watched if number in self.numbers],
+            'expected_turns': float(visits.sum()),
+            'game_over_probability': float(visits @ self.game_over),
+            'stuck_probability': float(visits @ self.stuck),
+            'expected_c_entries': sum(prompt['expected_c_entries'] for prompt in prompts),
+            'prompts': prompts,
+        }
+
+
+def analyze_prompt_walk(prompts):
+    """Return walk statistics for a {(number, entry): text} mapping of prompts."""
+    return PromptWalk(prompts).analyze()
+
+
+def get_walk_stats():
+    """Return walk statistics for the loaded prompts, computed once per prompt table version."""
+    key = f'{STATS_CACHE_KEY}:{table_version()}'
+    stats = cache.get(key)
+    if stats is None:
+        table = get_prompt_table()
+        stats = analyze_prompt_walk({key: prompt.text for key, prompt in table.items()})
+        cache.set(key, stats, None)
+    return stats
@@ -0,0 +1,10 @@
+"""
+WebSocket URL configuration for the game app.
+"""
+
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/characters/<int:character_id>/sheet/', consumers.SheetConsumer.as_asgi()),
+]
@@ -0,0 +1,134 @@
+"""
+Character sheet loading for Thousand Year Old Vampire
+This module fetches a vampire together with everything on its sheet in a fixed number of queries.
+"""
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from .models import VampireCharacter
+
+
+# Relations fetched for a full character sheet. Each entry costs exactly one query,
+# however many memories, experiences or traits the vampire has collected.
+SHEET_PREFETCH = (
+    'memories__experiences',
+    'skills',
+    'resources',
+    'characters',
+    'marks',
+)
+
+# The panels of the play page, each rendered by its own template so that they can
+# be fetched one at a time when the sheet changes
+PLAY_PANELS = {
+    name: f'game/panels/play_{name}.html'
+    for name in ('status', 'memories', 'memory_options', 'skills', 'resources', 'characters', 'marks')
+}
+
+# Which play panels show rows of each sheet model, by the model names sheet_changes reports
+PANELS_BY_MODEL = {
+    'vampirecharacter': ['status'],
+    'memory': ['status', 'memories', 'memory_options'],
+    'experience': ['memories', 'memory_options'],
+    'skill': ['status', 'skills'],
+    'resource': ['status', 'resources'],
+    'character': ['status', 'characters'],
+    'mark': ['marks'],
+}
+
+
+def sheet_queryset():
+    """Return a VampireCharacter queryset that loads the whole sheet alongside each vampire."""
+    return VampireCharacter.objects.select_related('diary').prefetch_related(*SHEET_PREFETCH)
+
+
+def load_character_sheet(**filters):
+    """Fetch a single vampire matching filters and wrap it in a CharacterSheet."""
+    return CharacterSheet(sheet_queryset().get(**filters))
+
+
+class CharacterSheet:
+    """Read-only view of a vampire's sheet backed by prefetched relations.
+
+    The sheet is filled lazily: nothing is queried until a panel is first
+    accessed, and then every relation is fetched at once. Characters loaded
+    through sheet_queryset() are already filled and cost nothing extra.
+    """
+
+    def __init__(self, character):
+        self.character = character
+        self._loaded = False
+
+    def _load(self):
+        """Prefetch any sheet relations the character does not already carry."""
+        if self._loaded:
+            return
+        cache = getattr(self.character, '_prefetched_objects_cache', {})
+        missing = [lookup for lookup in SHEET_PREFETCH if lookup.split('__')[0] not in cache]
+        if missing:
+            prefetch_related_objects([self.character], *missing)
+        self._loaded = True
+
+    def _all(self, relation):
+        self._load()
+        return list(getattr(self.character, relation).all())
+
+    @property
+    def memories(self):
+        """All five memory slots, in order, with their experiences prefetched."""
+        return self._all('memories')
+
+    @property
+    def active_memories(self):
+        return [m for m in self.memories if not m.is_lost]
+
+    @property
+    def skills(self):
+        return [s for s in self._all('skills') if not s.is_lost]
+
+    @property
+    def unchecked_skills(self):
+        return [s for s in self.skills if not s.is_checked]
+
+    @property
+    def resources(self):
+        return [r for r in self._all('resources') if not r.is_lost]
+
+    @property
+    def stationary_resources(self):
+        return [r for r in self.resources if r.is_stationary]
+
+    @property
+    def characters(self):
+        return [c for c in self._all('characters') if not c.is_dead]
+
+    @property
+    def mortals(self):
+        return [c for c in self.characters if c.character_type == 'mortal']
+
+    @property
+    def marks(self):
+        return [m for m in self._all('marks') if not m.is_removed]
+
+    @property
+    def diary(self):
+        return getattr(self.character, 'diary', None)
+
+    def context(self):
+        """Return the template context shared by the character sheet pages.
+
+        The panels are rendered inside {% cache %} blocks keyed on the
+        character's state_version, so their data is passed as callables: the
+        template only calls them, and the sheet is only queried, when a
+        fragment is missing from the cache.
+        """
+        return {
+            'character': self.character,
+            'memories': lambda: self.memories,
+            'skills': lambda: self.skills,
+            'resources': lambda: self.resources,
+            'characters': lambda: self.characters,
+            'marks': lambda: self.marks,
+            'diary': lambda: self.diary,
+            'sheet_cache_timeout': getattr(settings, 'SHEET_CACHE_TIMEOUT', 60 * 60 * 24),
+        }
@@ -0,0 +1,169 @@
+"""
+Batched sheet edits for Thousand Year Old Vampire
+This module applies a list of player edits to a vampire's sheet, validated with the sheet forms,
+as one unit of work in a fixed number of queries.
+"""
+
+from django.db import transaction
+from .events import record_sheet_change, save_event
+from .forms import ExperienceForm, SkillForm, ResourceForm, CharacterForm, MarkForm
+from .memory_slots import MAX_EXPERIENCES, with_experience_counts
+from .models import Memory, Experience, Skill, Resource, Character, Mark
+
+
+# Most operations one batch may carry
+MAX_OPERATIONS = 50
+
+
+class SheetEditBatch:
+    """Applies the edits a player makes to their sheet between turns.
+
+    Each operation is a dict with an 'op', one of OPERATIONS, and the 'data'
+    the matching single-edit view takes as POST data. Every operation is
+    validated and applied to unsaved or preloaded rows first; only if all of
+    them succeed is anything written, with one bulk_create() per model. The
+    result has one entry per operation, in the same form as the single-edit
+    views' responses.
+    """
+
+    OPERATIONS = ('add_experience', 'add_skill', 'toggle_skill', 'add_resource', 'add_character', 'add_mark')
+
+    # The form validating each creating operation, and the key its row is returned under
+    FORMS = {
+        'add_experience': (ExperienceForm, 'experience'),
+        'add_skill': (SkillForm, 'skill'),
+        'add_resource': (ResourceForm, 'resource'),
+        'add_character': (CharacterForm, 'character'),
+        'add_mark': (MarkForm, 'mark'),
+    }
+
+    # Fields of each row sent back to the client
+    RESULT_FIELDS = {
+        'experience': ('id', 'text', 'order'),
+        'skill': ('id', 'name', 'description', 'is_checked'),
+        'resource': ('id', 'name', 'description', 'is_stationary'),
+        'character': ('id', 'name', 'description', 'character_type', 'relationship'),
+        'mark': ('id', 'description', 'how_concealed'),
+    }
+
+    def __init__(self, character, operations):
+        self.character = character
+        self.operations = []
+        for operation in operations:
+            operation = operation if isinstance(operation, dict) else {}
+            data = operation.get('data')
+            self.operations.append((operation.get('op'), data if isinstance(data, dict) else {}))
+        self.memories = {}
+        self.skills = {}
+        self.created = []
+        self.checked = []
+        self.results = []
+
+    def execute(self):
+        """Apply every operation in one transaction.
+
+        Returns (success, results). If any operation fails, nothing is
+        written and its result carries the error.
+        """
+        with transaction.atomic():
+            self._load()
+            for op, data in self.operations:
+                try:
+                    self.results.append(self._apply(op, data))
+                except (ValueError, Memory.DoesNotExist, Skill.DoesNotExist) as e:
+                    self.results.append({'success': False, 'error': str(e)})
+            success = all(result['success'] for result in self.results)
+            if success:
+                self._flush()
+            else:
+                self.results = [
+                    result if not result['success']
+                    else {'success': False, 'error': 'Not applied because another operation failed'}
+                    for result in self.results
+                ]
+        return success, [self._result(result) for result in self.results]
+
+    def _load(self):
+        memory_ids, skill_ids = set(), set()
+        for op, data in self.operations:
+            if op == 'add_experience' and str(data.get('memory_id', '')).isdigit():
+                memory_ids.add(int(data['memory_id']))
+            elif op == 'toggle_skill' and str(data.get('skill_id', '')).isdigit():
+                skill_ids.add(int(data['skill_id']))
+        if memory_ids:
+            self.memories = with_experience_counts(
+                Memory.objects.filter(character=self.character, id__in=memory_ids)
+            ).in_bulk()
+        if skill_ids:
+            self.skills = Skill.objects.filter(character=self.character, id__in=skill_ids).in_bulk()
+
+    def _get(self, rows, model, pk):
+        """Return a preloaded row, raising DoesNotExist like get() when it is not the vampire's."""
+        try:
+            return rows[int(pk)]
+        except (KeyError, TypeError, ValueError):
+            raise model.DoesNotExist(f"{model.__name__} not found")
+
+    def _apply(self, op, data):
+        if op not in self.OPERATIONS:
+            raise ValueError(f"Unknown operation: {op}")
+        if op == 'toggle_skill':
+            return self._toggle_skill(data)
+
+        form_class, key = self.FORMS[op]
+        form = form_class(data)
+        if not form.is_valid():
+            return {'success': False, 'errors': form.errors.get_json_data()}
+        instance = form.save(commit=False)
+        if op == 'add_experience':
+            memory = self._get(self.memories, Memory, data.get('memory_id'))
+            if memory.experience_count >= MAX_EXPERIENCES:
+                raise ValueError(f"Memory is full (max {MAX_EXPERIENCES} experiences)")
+            # Later operations in the batch see the experiences added before them
+            memory.experience_count += 1
+            memory.last_experience_order += 1
+            instance.memory, instance.order = memory, memory.last_experience_order
+        elif op == 'add_character':
+            instance.vampire = self.character
+        else:
+            instance.character = self.character
+        self.created.append(instance)
+        return {'success': True, key: instance}
+
+    def _toggle_skill(self, data):
+        skill = self._get(self.skills, Skill, data.get('skill_id'))
+        if skill.is_checked:  # Can only check once
+            return {'success': False, 'error': 'Skill already checked'}
+        skill.is_checked = True
+        self.checked.append(skill)
+        return {'success': True, 'checked': True}
+
+    def _flush(self):
+        for model in (Experience, Skill, Resource, Character, Mark):
+            instances = [instance for instance in self.created if isinstance(instance, model)]
+            if instances:
+                model.objects.bulk_create(instances)
+        if self.checked:
+            Skill.objects.filter(pk__in=[skill.pk for skill in self.checked]).update(is_checked=True)
+        owner = self.character.pk
+        record_sheet_change(
+            self.character,
+            [save_event(instance, owner) for instance in self.created]
+            + [save_event(skill, owner, ['is_checked']) for skill in self.checked]
+        )
+
+    def _result(self, result):
+        """Replace the row in a result with the fields sent to the client."""
+        return {
+            name: {field: getattr(value, field) for field in self.RESULT_FIELDS[name]}
+            if name in self.RESULT_FIELDS else value
+            for name, value in result.items()
+        }
+
+
+def apply_sheet_edits(character, operations):
+    """Apply a player's batch of sheet edits; see SheetEditBatch.
+
+    Returns (success, results), one result per operation.
+    """
+    return SheetEditBatch(character, operations).execute()
@@ -0,0 +1,21 @@
+"""
+Signal handlers for the game app.
+
+Writes to a vampire's sheet are not tracked here: each unit of work records its
+changes in one go with events.record_sheet_change().
+"""
+
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Prompt
+from .prompt_table import check_prompt_table_version, invalidate_prompt_table
+
+
+@receiver([post_save, post_delete], sender=Prompt)
+def prompt_changed(sender, **kwargs):
+    """Reload the in-process prompt table after a prompt is edited, e.g. in the admin."""
+    invalidate_prompt_table()
+
+
+request_started.connect(check_prompt_table_version, dispatch_uid='game.check_prompt_table_version')
@@ -0,0 +1,225 @@
+"""
+Headless game simulator for Thousand Year Old Vampire
+Synthetic players create vampires, go through setup and play turns through the real views,
+while every stage is timed and its queries counted. Used by the simulate_games command.
+"""
+
+import random
+import time
+from collections import Counter, defaultdict
+
+
+# Stages timed for every turn; together they make up one turn of play
+TURN_STAGES = ('play_view', 'analyze', 'execute', 'play_turn')
+
+RESPONSES = [
+    'I remember the smell of the river at night.',
+    'I hid in the cellar until the bells stopped.',
+    'They never found out what I had become.',
+    'I wrote it down so that I would not forget.',
+]
+
+
+class QueryCounter:
+    """Database execute wrapper that counts the queries run through it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class StageRecorder:
+    """Collects latencies, query counts and errors per stage."""
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.latencies = defaultdict(list)
+        self.queries = Counter()
+        self.errors = defaultdict(Counter)
+
+    def run(self, stage, func, *args, **kwargs):
+        """Run func as one call of stage; return its result, or None if it raised."""
+        queries = self.counter.count
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            self.errors[stage][f'{type(exc).__name__}: {exc}'[:120]] += 1
+            return None
+        finally:
+            self.latencies[stage].append(time.perf_counter() - start)
+            self.queries[stage] += self.counter.count - queries
+
+
+def resolve_actions(required_actions, rng):
+    """Make the choices a player would for a list of analyzed prompt actions.
+
+    Returns the resolved actions in the form PromptProcessor.execute_actions() takes.
+    """
+    resolved = []
+    for action in required_actions:
+        action_type = action['type']
+        ids = [choice['id'] for choice in action.get('choices', [])]
+        rng.shuffle(ids)
+        choices = {}
+        input_data = {}
+
+        if action_type in ('kill_mortal', 'convert_mortal'):
+            if ids:
+                choices['character_id'] = ids[0]
+            elif action.get('allow_create'):
+                choices['create_new'] = True
+            else:
+                continue
+        elif action_type in ('create_mortal', 'create_immortal'):
+            input_data['name'] = f'Figure {rng.randint(1, 9999)}'
+        elif action_type == 'add_skill':
+            choices['skill_name'] = action['skill_name']
+        elif action_type == 'create_skill':
+            input_data['name'] = f'Skill {rng.randint(1, 9999)}'
+        elif action_type == 'check_skills':
+            choices['skill_ids'] = ids[:action.get('count', 1)]
+        elif action_type == 'lose_resources':
+            choices['resource_ids'] = ids[:action.get('count', 1)]
+        elif action_type == 'create_resource':
+            input_data['name'] = f'Resource {rng.randint(1, 9999)}'
+            input_data['is_stationary'] = action.get('is_stationary', False)
+        elif action_type == 'create_mark':
+            input_data['description'] = 'Skin cold as river stone'
+        elif action_type in ('lose_skill', 'remove_mark', 'lose_memory'):
+            if not ids:
+                continue
+            choices[{'lose_skill': 'skill_id', 'remove_mark': 'mark_id', 'lose_memory': 'memory_id'}[action_type]] = ids[0]
+        elif action_type not in ('lose_stationary_resources', 'age_mortals'):
+            # Choice prompts and the like need a player
+            continue
+
+        resolved.append({'type': action_type, 'choices': choices, 'input_data': input_data})
+    return resolved
+
+
+def _configure_worker(db_path):
+    """Point this process at its own SQLite file and migrate it."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+    from django.conf import settings
+    from game.management.databases import use_database
+
+    use_database(db_path)
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+
+
+def _setup_data(index):
+    return {
+        '1': {'mortal_0_name': f'Sibling {index}', 'mortal_0_description': 'Family from before'},
+        '2': {f'{kind}_{i}{suffix}': f'{kind.title()} {i}'
+              for i in range(3) for kind, suffix in (('skill', ''), ('resource', '_name'))},
+        '3': {f'experience_{i}': f'An early memory, {i}' for i in range(3)},
+        '4': {'immortal_name': 'Maker', 'immortal_description': 'The one who turned me',
+              'mark_description': 'Eyes that shine in the dark',
+              'transformation_experience': 'I woke in the grave, hungry.'},
+    }
+
+
+def _stop_reason(page, character):
+    """Describe a play page that neither showed a prompt nor ended the game."""
+    if page.status_code == 302:
+        return f'302 before the game ended, at prompt {character.current_prompt}{character.prompt_entry}'
+    return f'{page.status_code} from the play page'
+
+
+def run_worker(worker_id, vampires, turns, prompts, db_path, seed):
+    """Play `vampires` games of up to `turns` turns each in a fresh database.
+
+    prompts is a list of Prompt field dicts to load. Returns a dict of plain
+    data for the parent process to merge.
+    """
+    _configure_worker(db_path)
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+    from game.instrumentation import get_view_metrics, reset_view_metrics
+    from game.models import VampireCharacter, Prompt
+    from game.prompt_processor import PromptProcessor
+    from game.prompt_table import get_prompt, invalidate_prompt_table
+
+    Prompt.objects.bulk_create([Prompt(**fields) for fields in prompts])
+    invalidate_prompt_table()
+    reset_view_metrics()
+
+    rng = random.Random(seed + worker_id)
+    random.seed(seed + worker_id)  # dice rolls in play_turn
+    counter = QueryCounter()
+    recorder = StageRecorder(counter)
+    played = finished = stopped = 0
+    start = time.perf_counter()
+
+    with connection.execute_wrapper(counter):
+        for index in range(vampires):
+            user = User.objects.create_user(f'player-{worker_id}-{index}')
+            client = Client()
+            client.force_login(user)
+
+            recorder.run('create_character', client.post, reverse('create_character'), {
+                'name': f'Vampire {worker_id}-{index}',
+                'origin_description': 'I was a ferryman on the Danube.',
+            })
+            character = VampireCharacter.objects.filter(user=user).latest('id')
+            setup_url = reverse('setup_character', args=[character.id])
+            for step, data in _setup_data(index).items():
+                recorder.run('setup_step', client.post, f'{setup_url}?step={step}', data)
+
+            play_url = reverse('play_game', args=[character.id])
+            for turn in range(turns):
+                page = recorder.run('play_view', client.get, play_url)
+                if page is None:
+                    stopped += 1  # the error is recorded against play_view
+                    break
+                character.refresh_from_db()
+                if page.status_code != 200:
+                    if page.status_code == 302 and character.game_ended:
+                        finished += 1
+                    else:
+                        stopped += 1
+                        recorder.errors['play_view'][_stop_reason(page, character)] += 1
+                    break
+
+                prompt = get_prompt(character.current_prompt, character.prompt_entry)
+                processor = PromptProcessor(character, prompt.text, prompt_id=prompt.prompt_id)
+                required = recorder.run('analyze', processor.analyze_prompt) or []
+                recorder.run('execute', processor.execute_actions, resolve_actions(required, rng))
+
+                recorder.run('play_turn', client.post, play_url, {
+                    'response': rng.choice(RESPONSES),
+                    'prompt_number': prompt.number,
+                    'prompt_entry': prompt.entry,
+                })
+                played += 1
+
+    return {
+        'worker': worker_id,
+        'elapsed': time.perf_counter() - start,
+        'turns': played,
+        'finished': finished,
+        'stopped': stopped,
+        'latencies': dict(recorder.latencies),
+        'queries': dict(recorder.queries),
+        'errors': {stage: dict(errors) for stage, errors in recorder.errors.items()},
+        'views': get_view_metrics(),
+    }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
@@ -1,3 +1,1100 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import (
+    VampireCharacter, Memory, Experience, Skill, Resource,
+    Character, Mark, GameSession, Prompt, PromptSource, SheetSnapshot
+)
+from .action_batch import execute_actions
+from .chronicle_import import ChronicleImport, ChronicleImportError
+from .consumers import SheetConsumer
+from .database import fcntl, retry_on_lock
+from .events import changes_since, latest_event_id, live_state, record_sheet_change, save_event, state_at
+from .instrumentation import QueryBudgetExceeded, get_view_metrics, reset_view_metrics
+from .live import sheet_group
+from .memory_slots import allocate_memory_slot
+from .prompt_matcher import analyze_legacy, infer_actions
+from .prompt_processor import PromptProcessor, clear_analysis_cache
+from .prompt_table import get_prompt, get_prompt_by_id, invalidate_prompt_table
+from .sheet import PANELS_BY_MODEL, PLAY_PANELS, load_character_sheet
+from .simulator import resolve_actions
+from .timeline import timeline_queryset
+from .turns import StaleTurnError, play_turn
+
+
+def create_vampire(user, name='Naram'):
+    """Create a vampire that has been taken through all four setup steps."""
+    vampire = VampireCharacter.objects.create(
+        user=user, name=name, origin_description='I am a temple scribe.'
+    )
+    rows = [vampire]
+    for order in range(1, 6):
+        memory = Memory.objects.create(character=vampire, order=order)
+        rows += [memory, Experience.objects.create(memory=memory, text=f'Experience in memory {order}', order=1)]
+    for i in range(3):
+        rows.append(Skill.objects.create(character=vampire, name=f'Skill {i}'))
+        rows.append(Resource.objects.create(character=vampire, name=f'Resource {i}'))
+        rows.append(Character.objects.create(
+            vampire=vampire, name=f'Mortal {i}', description='A mortal', character_type='mortal'
+        ))
+    rows.append(Character.objects.create(
+        vampire=vampire, name='Maker', description='An immortal', character_type='immortal'
+    ))
+    rows.append(Mark.objects.create(character=vampire, description='Eyes blank and white'))
+    record_sheet_change(vampire, [save_event(row, vampire.pk) for row in rows])
+    return vampire
+
+
+def grow_sheet(vampire):
+    """Pile more entries onto every panel of a vampire's sheet."""
+    rows = []
+    for memory in vampire.memories.all():
+        for order in (2, 3):
+            rows.append(Experience.objects.create(memory=memory, text='Another experience', order=order))
+    for i in range(3, 10):
+        rows.append(Skill.objects.create(character=vampire, name=f'Skill {i}'))
+        rows.append(Resource.objects.create(character=vampire, name=f'Resource {i}'))
+        rows.append(Mark.objects.create(character=vampire, description=f'Mark {i}'))
+    record_sheet_change(vampire, [save_event(row, vampire.pk) for row in rows])
+
+
+class GameTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user('player', password='secret')
+        self.client.force_login(self.user)
+        self.vampire = create_vampire(self.user)
+        Prompt.objects.create(number=1, entry='a', text='Kill a mortal character.')
+        clear_analysis_cache()
+        # Row ids repeat between tests, so fragments cached by an earlier test could match
+        cache.clear()
+
+
+@override_settings(QUERY_BUDGETS_STRICT=True)
+class GameTestCase(GameTestMixin, TestCase):
+    pass
+
+
+class CharacterSheetTests(GameTestCase):
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def count_uncached_queries(self, url):
+        # A new state version makes every sheet fragment miss the cache
+        VampireCharacter.bump_state_version(pk=self.vampire.pk)
+        return self.count_queries(url)
+
+    def test_sheet_pages_use_fixed_number_of_queries(self):
+        urls = [reverse(name, args=[self.vampire.id]) for name in ('character_detail', 'play_game')]
+        for url in urls:
+            self.client.get(url)  # warm process-wide caches
+        before = [self.count_uncached_queries(url) for url in urls]
+        grow_sheet(self.vampire)
+        self.assertEqual([self.count_uncached_queries(url) for url in urls], before)
+
+    def test_sheet_panels_are_served_from_cache_until_the_sheet_changes(self):
+        url = reverse('character_detail', args=[self.vampire.id])
+        uncached = self.count_uncached_queries(url)
+        cached = self.count_queries(url)
+        self.assertLess(cached, uncached)
+
+        response = self.client.post(reverse('add_skill', args=[self.vampire.id]), {'name': 'Night Vision'})
+        self.assertTrue(response.json()['success'])
+        self.assertContains(self.client.get(url), 'Night Vision')
+        self.assertEqual(self.count_queries(url), cached)
+
+    def test_sheet_filters_lost_entries(self):
+        Skill.objects.filter(character=self.vampire, name='Skill 0').update(is_lost=True)
+        Character.objects.filter(vampire=self.vampire, name='Mortal 0').update(is_dead=True)
+        sheet = load_character_sheet(id=self.vampire.id)
+        with self.assertNumQueries(0):
+            self.assertEqual([s.name for s in sheet.skills], ['Skill 1', 'Skill 2'])
+            self.assertEqual([c.name for c in sheet.mortals], ['Mortal 1', 'Mortal 2'])
+            self.assertEqual(len(sheet.memories[0].experiences.all()), 1)
+
+    def test_processor_reads_from_sheet(self):
+        processor = PromptProcessor(
+            VampireCharacter.objects.get(id=self.vampire.id),
+            'Kill a mortal character. Lose a skill. Lose a memory.'
+        )
+        with self.assertNumQueries(7):
+            actions = processor.analyze_prompt()
+        self.assertEqual([a['type'] for a in actions], ['kill_mortal', 'lose_skill', 'lose_memory'])
+        self.assertEqual(len(actions[0]['choices']), 3)
+
+
+class SetupStateTests(GameTestCase):
+    def test_setup_steps_maintain_flag(self):
+        self.client.post(reverse('create_character'), {
+            'name': 'Wulfric', 'origin_description': 'I am Wulfric, son of Ælf.'
+        })
+        vampire = VampireCharacter.objects.get(name='Wulfric')
+        url = reverse('setup_character', args=[vampire.id])
+        steps = {
+            '1': {'mortal_0_name': 'Edith', 'mortal_0_description': 'My sister'},
+            '2': {f'{kind}_{i}{suffix}': f'{kind} {i}'
+                  for i in range(3) for kind, suffix in (('skill', ''), ('resource', '_name'))},
+            '3': {f'experience_{i}': f'Experience {i}' for i in range(3)},
+            '4': {'immortal_name': 'Maker', 'immortal_description': 'Old',
+                  'mark_description': 'Cold skin', 'transformation_experience': 'I was turned.'},
+        }
+        for step, data in steps.items():
+            vampire.refresh_from_db()
+            self.assertFalse(vampire.setup_complete)
+            self.client.post(f'{url}?step={step}', data)
+        vampire.refresh_from_db()
+        self.assertTrue(vampire.setup_complete)
+
+    @mock.patch('game.views.record_sheet_change', side_effect=RuntimeError('log unavailable'))
+    def test_steps_write_nothing_unless_logged(self, record):
+        with self.assertRaises(RuntimeError):
+            self.client.post(reverse('create_character'), {'name': 'Wulfric', 'origin_description': 'I am Wulfric.'})
+        self.assertFalse(VampireCharacter.objects.filter(name='Wulfric').exists())
+
+        VampireCharacter.objects.filter(id=self.vampire.id).update(setup_complete=False)
+        url = reverse('setup_character', args=[self.vampire.id])
+        with self.assertRaises(RuntimeError):
+            self.client.post(f'{url}?step=1', {'mortal_0_name': 'Edith', 'mortal_0_description': 'My sister'})
+        self.assertFalse(self.vampire.characters.filter(name='Edith').exists())
+
+    def test_ajax_add_completes_setup(self):
+        self.vampire.marks.all().delete()
+        self.vampire.refresh_setup_complete()
+        self.assertFalse(self.vampire.setup_complete)
+        self.client.post(reverse('add_mark', args=[self.vampire.id]), {'description': 'Pale'})
+        self.vampire.refresh_from_db()
+        self.assertTrue(self.vampire.setup_complete)
+
+    def test_play_gate_reads_flag(self):
+        VampireCharacter.objects.filter(id=self.vampire.id).update(setup_complete=False)
+        response = self.client.get(reverse('play_game', args=[self.vampire.id]))
+        self.assertRedirects(response, reverse('setup_character', args=[self.vampire.id]))
+
+
+class TurnPipelineTests(GameTestCase):
+    def play(self, d10, d6, **kwargs):
+        with mock.patch('game.turns.random.randint', side_effect=[d10, d6]):
+            return play_turn(self.vampire.id, 'I remember.', **kwargs)
+
+    def test_turn_moves_and_escalates_entry(self):
+        turn = self.play(6, 1)
+        self.assertEqual((turn['next_prompt'], turn['next_entry']), (6, 'a'))
+        self.play(1, 6)
+        self.vampire.refresh_from_db()
+        self.assertEqual((self.vampire.current_prompt, self.vampire.prompt_entry), (1, 'b'))
+        self.assertEqual(self.vampire.sessions.count(), 2)
+
+    def test_entry_selection_uses_visit_counters(self):
+        self.vampire.prompt_visits = {'4': 2}
+        self.vampire.save()
+        with CaptureQueriesContext(connection) as ctx:
+            turn = self.play(4, 1)
+        self.assertEqual(turn['next_entry'], 'c')
+        self.assertFalse([q for q in ctx if q['sql'].startswith('SELECT') and 'game_gamesession' in q['sql']])
+        self.vampire.refresh_from_db()
+        self.assertEqual(self.vampire.prompt_visits, {'1': 1, '4': 2})
+
+    def test_full_memories_recycle_oldest_slot(self):
+        grow_sheet(self.vampire)
+        turn = self.play(3, 1)
+        self.assertEqual(turn['lost_memory'], 'Untitled')
+        memory = self.vampire.memories.get(order=1)
+        self.assertEqual(memory.title, 'Prompt 1a')
+        self.assertEqual(list(memory.experiences.values_list('text', flat=True)), ['I remember.'])
+
+    def test_stale_prompt_writes_nothing(self):
+        with self.assertRaises(StaleTurnError):
+            self.play(3, 1, expected_prompt=(2, 'a'))
+        self.assertFalse(self.vampire.sessions.exists())
+
+    def test_view_rejects_double_submit(self):
+        url = reverse('play_game', args=[self.vampire.id])
+        data = {'response': 'I remember.', 'prompt_number': 1, 'prompt_entry': 'a'}
+        self.client.post(url, data)
+        self.client.post(url, data)
+        self.assertEqual(self.vampire.sessions.count(), 1)
+
+
+class MemorySlotTests(GameTestCase):
+    def test_allocator_uses_one_query(self):
+        with self.assertNumQueries(1):
+            memory, order, recycled = allocate_memory_slot(self.vampire)
+        self.assertEqual((memory.order, order, recycled), (1, 2, False))
+
+        grow_sheet(self.vampire)
+        with self.assertNumQueries(1):
+            memory, order, recycled = allocate_memory_slot(self.vampire)
+        self.assertEqual((memory.order, order, recycled), (1, 1, True))
+
+    def test_add_experience_rejects_full_memory(self):
+        memory = self.vampire.memories.get(order=2)
+        url = reverse('add_experience', args=[self.vampire.id])
+        for expected in (2, 3):
+            data = self.client.post(url, {'memory_id': memory.id, 'text': 'More'}).json()
+            self.assertEqual(data['experience']['order'], expected)
+        data = self.client.post(url, {'memory_id': memory.id, 'text': 'Too much'}).json()
+        self.assertEqual(data, {'success': False, 'error': 'Memory is full (max 3 experiences)'})
+
+
+class PromptTableTests(GameTestCase):
+    def test_lookups_are_served_from_memory(self):
+        invalidate_prompt_table()
+        get_prompt(1, 'a')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_prompt_by_id('1a').text, 'Kill a mortal character.')
+            self.assertIsNone(get_prompt(1, 'b'))
+            self.assertIsNone(get_prompt_by_id('a1'))
+
+    def test_entries_are_immutable(self):
+        Prompt.objects.filter(number=1, entry='a').update(actions=[{'type': 'create_mark', 'description': 'Mark'}])
+        invalidate_prompt_table()
+        prompt = get_prompt(1, 'a')
+        with self.assertRaises(TypeError):
+            prompt.actions[0]['type'] = 'kill_mortal'
+        with self.assertRaises(AttributeError):
+            prompt.text = 'Changed'
+
+    def test_changes_by_other_processes_are_seen_at_the_next_request(self):
+        get_prompt(1, 'a')
+        with mock.patch('game.prompt_table.table_version') as table_version:
+            get_prompt(1, 'a')
+        table_version.assert_not_called()
+
+        Prompt.objects.filter(number=1, entry='a').update(text='Changed elsewhere.')
+        # As load_prompts would from its own process once it has written the prompts
+        subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             'from game.prompt_table import invalidate_prompt_table; invalidate_prompt_table()'],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+        )
+        self.assertEqual(get_prompt(1, 'a').text, 'Kill a mortal character.')
+        self.client.get(reverse('home'))
+        self.assertEqual(get_prompt(1, 'a').text, 'Changed elsewhere.')
+
+    def test_saving_a_prompt_invalidates_table(self):
+        self.assertIsNone(get_prompt(2, 'a'))
+        Prompt.objects.create(number=2, entry='a', text='Create a stationary resource.')
+        self.assertEqual(get_prompt(2, 'a').text, 'Create a stationary resource.')
+
+
+class PromptMatcherTests(GameTestCase):
+    def test_single_pass_agrees_with_the_analysis_it_replaced(self):
+        texts = [
+            'kill a mortal character. create a mortal if none are available.',
+            'destroy someone close to you may remove a mark.',
+            'take the skill bargain and barter. check 2 skills. lose 1 resource.',
+            'create an appropriate skill. gain a stationary resource. strikeout a memory.',
+            'nothing happens here.',
+        ]
+        for text in texts:
+            self.assertEqual(infer_actions(text), analyze_legacy(text, plurals_twice=False), text)
+
+    def test_captures_do_not_restart_inside_an_earlier_capture(self):
+        for text in ['take the skill take the skill night vision.', 'gain the skill gain the skill x. create a skill.']:
+            self.assertEqual(infer_actions(text), analyze_legacy(text), text)
+        actions = infer_actions('take the skill take the skill night vision.')
+        self.assertEqual([a['skill_name'] for a in actions], ['Take The Skill Night Vision'])
+
+    def test_unnamed_skill_rules_out_a_generic_one(self):
+        self.assertEqual(infer_actions('create a skill. take the skill.'), [])
+
+    def test_processor_fallback_uses_triggers(self):
+        actions = PromptProcessor(self.vampire, 'Take the skill Bargain and Barter. Check 2 skills.').analyze_prompt()
+        self.assertEqual([a['type'] for a in actions], ['add_skill', 'check_skills'])
+        self.assertEqual(actions[0]['skill_name'], 'Bargain and Barter')
+        self.assertEqual(actions[1]['count'], 2)
+
+    def test_actions_are_inferred_when_prompt_is_saved(self):
+        prompt = Prompt.objects.get(number=1, entry='a')
+        self.assertEqual(prompt.inferred_actions, [{'type': 'kill_mortal', 'description': 'Kill a mortal character'}])
+        prompt.text = 'You may remove a mark.'
+        prompt.save(update_fields=['text'])
+        prompt.refresh_from_db()
+        self.assertEqual([a['optional'] for a in prompt.inferred_actions], [True])
+
+    def test_command_fills_prompts_not_yet_analyzed(self):
+        Prompt.objects.filter(number=1, entry='a').update(inferred_actions=None)
+        out = io.StringIO()
+        call_command('infer_prompt_actions', missing_only=True, stdout=out)
+        self.assertIn('Inferred actions for 1 prompts', out.getvalue())
+        self.assertEqual(Prompt.objects.get(number=1, entry='a').inferred_actions[0]['type'], 'kill_mortal')
+
+    def test_processor_binds_stored_templates(self):
+        invalidate_prompt_table()
+        with mock.patch('game.prompt_processor.infer_actions') as infer:
+            actions = PromptProcessor(self.vampire, 'Kill a mortal character.', prompt_id='1a').analyze_prompt()
+        infer.assert_not_called()
+        self.assertEqual(actions[0]['type'], 'kill_mortal')
+        self.assertEqual([c['name'] for c in actions[0]['choices']], ['Mortal 0', 'Mortal 1', 'Mortal 2'])
+        self.assertFalse(actions[0]['allow_create'])
+
+
+class AnalysisCacheTests(GameTestCase):
+    def analyze(self):
+        vampire = VampireCharacter.objects.get(id=self.vampire.id)
+        return PromptProcessor(vampire, 'Kill a mortal character. Lose a memory.', prompt_id='1a').analyze_prompt()
+
+    def test_reload_is_served_from_cache(self):
+        first = self.analyze()
+        with self.assertNumQueries(2):  # the character and its state version
+            self.assertEqual(self.analyze(), first)
+        first[0]['choices'].clear()
+        self.assertEqual(len(self.analyze()[0]['choices']), 3)
+
+    def test_sheet_changes_bump_version(self):
+        versions = [self.vampire.current_state_version()]
+        mortal_id = self.client.post(
+            reverse('add_character', args=[self.vampire.id]), {'name': 'Mortal 3', 'character_type': 'mortal'}
+        ).json()['character']['id']
+        versions.append(self.vampire.current_state_version())
+        self.assertEqual(len(self.analyze()[0]['choices']), 4)
+        self.client.post(
+            reverse('add_experience', args=[self.vampire.id]),
+            {'memory_id': self.vampire.memories.get(order=1).id, 'text': 'Again'},
+        )
+        versions.append(self.vampire.current_state_version())
+        PromptProcessor(self.vampire, '').execute_action('kill_mortal', {'character_id': mortal_id})
+        versions.append(self.vampire.current_state_version())
+        self.assertEqual(len(self.analyze()[0]['choices']), 3)
+        self.assertEqual(versions, sorted(set(versions)))
+        self.assertEqual(self.vampire.current_state_version(), versions[-1])
+
+
+class VampireSaveTests(GameTestCase):
+    def test_force_insert_saves_a_copy(self):
+        copy = VampireCharacter.objects.get(id=self.vampire.id)
+        copy.pk = None
+        copy.save(force_insert=True)
+        self.assertEqual(VampireCharacter.objects.filter(name=self.vampire.name).count(), 2)
+
+    def test_saving_a_deleted_vampire_inserts_it_again(self):
+        vampire = VampireCharacter.objects.get(id=self.vampire.id)
+        VampireCharacter.objects.filter(id=vampire.id).delete()
+        vampire.save()
+        self.assertTrue(VampireCharacter.objects.filter(id=vampire.id).exists())
+
+
+class ActionBatchTests(GameTestCase):
+    def prompt_1c_actions(self, vampire):
+        return [
+            {'type': 'create_immortal', 'input_data': {'name': 'Master'}},
+            {'type': 'check_skills', 'choices': {'skill_ids': list(vampire.skills.values_list('id', flat=True))}},
+            {'type': 'add_skill', 'choices': {'skill_name': 'Humans are Cattle'}},
+            {'type': 'create_mortal', 'input_data': {'name': 'Servant'}},
+            {'type': 'age_mortals'},
+            {'type': 'create_resource', 'input_data': {'name': 'Ledger'}},
+            {'type': 'lose_resources', 'choices': {'resource_ids': list(vampire.resources.values_list('id', flat=True))}},
+        ]
+
+    def count_queries(self, vampire):
+        actions = self.prompt_1c_actions(vampire)
+        with CaptureQueriesContext(connection) as ctx:
+            PromptProcessor(vampire, '').execute_actions(actions)
+        return len(ctx)
+
+    def test_batch_uses_fixed_number_of_queries(self):
+        large = create_vampire(User.objects.create_user('elder'), name='Elder')
+        grow_sheet(large)
+        for i in range(3, 10):
+            Character.objects.create(vampire=large, name=f'Mortal {i}', character_type='mortal')
+        self.assertEqual(self.count_queries(large), self.count_queries(self.vampire))
+
+    def test_batch_applies_actions_in_order(self):
+        taken = PromptProcessor(self.vampire, '').execute_actions(self.prompt_1c_actions(self.vampire))
+        self.assertIn('Mortal character Servant died of old age', taken)
+        self.assertFalse(self.vampire.characters.filter(character_type='mortal', is_dead=False).exists())
+        self.assertEqual(self.vampire.skills.filter(is_checked=True).count(), 3)
+        self.assertTrue(self.vampire.skills.filter(name='Humans are Cattle').exists())
+        self.assertEqual(self.vampire.resources.filter(is_lost=True).count(), 3)
+
+    def test_foreign_row_rolls_back_batch(self):
+        other = create_vampire(User.objects.create_user('rival'), name='Rival')
+        with self.assertRaises(Mark.DoesNotExist):
+            PromptProcessor(self.vampire, '').execute_actions([
+                {'type': 'create_mark', 'input_data': {'description': 'Fangs'}},
+                {'type': 'remove_mark', 'choices': {'mark_id': other.marks.get().id}},
+            ])
+        self.assertEqual(self.vampire.marks.count(), 1)
+        self.assertFalse(other.marks.get().is_removed)
+
+
+class LoadPromptsTests(TestCase):
+    PROMPTS = '________________\n\n\nPrompts\n\n1a\nKill a mortal Character.\n2a\nCreate a Skill.\n'
+
+    def load(self, content):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        self.output = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('load_prompts', file=self.path, stdout=self.output)
+        return queries
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.txt')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_unchanged_file_is_skipped(self):
+        self.load(self.PROMPTS)
+        self.assertEqual(Prompt.objects.count(), 2)
+        self.assertEqual(PromptSource.objects.get().prompt_count, 2)
+        self.assertEqual(Prompt.objects.get(number=1).inferred_actions[0]['type'], 'kill_mortal')
+
+        queries = self.load(self.PROMPTS)
+        # The source lookup and the prompt count, nothing written
+        self.assertEqual(len(queries), 2)
+        self.assertIn('is unchanged since the last load; nothing to do', self.output.getvalue())
+
+    def test_unchanged_file_fills_prompts_not_yet_analyzed(self):
+        self.load(self.PROMPTS)
+        # As left by migration 0006 for prompts loaded before it
+        Prompt.objects.update(inferred_actions=None)
+
+        self.load(self.PROMPTS)
+        self.assertIn('Inferred actions for 2 prompts', self.output.getvalue())
+        self.assertEqual(Prompt.objects.get(number=1).inferred_actions[0]['type'], 'kill_mortal')
+
+        self.load(self.PROMPTS)
+        self.assertIn('nothing to do', self.output.getvalue())
+
+    def test_changed_file_fills_unchanged_prompts_not_yet_analyzed(self):
+        self.load(self.PROMPTS)
+        Prompt.objects.filter(number=1).update(inferred_actions=None)
+
+        self.load(self.PROMPTS + '3a\nLose a Mark.\n')
+        self.assertEqual(Prompt.objects.get(number=1).inferred_actions[0]['type'], 'kill_mortal')
+
+    def test_changed_file_is_applied_in_bulk(self):
+        self.load(self.PROMPTS)
+        changed = self.PROMPTS.replace('Create a Skill.', 'Create a Resource.') + '3a\nLose a Mark.\n'
+        queries = self.load(changed)
+
+        self.assertIn('1 created, 1 updated', self.output.getvalue())
+        self.assertEqual(Prompt.objects.count(), 3)
+        self.assertEqual(Prompt.objects.get(number=2).inferred_actions[0]['type'], 'create_resource')
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        # One insert for the new prompt, one update for the changed one, one for the source row
+        self.assertEqual(len(writes), 3)
+
+
+class SheetIndexTests(GameTestCase):
+    def test_hot_filters_use_their_indexes(self):
+        plans = {
+            'game_skill_live_idx': self.vampire.skills.filter(is_checked=False, is_lost=False),
+            'game_character_live_mortal_idx': self.vampire.characters.filter(character_type='mortal', is_dead=False),
+            'game_mark_live_idx': self.vampire.marks.filter(is_removed=False),
+            'game_session_timeline_idx': self.vampire.sessions.all()[:5],
+        }
+        for index, queryset in plans.items():
+            self.assertIn(index, queryset.explain())
+        self.assertNotIn('TEMP B-TREE', GameSession.objects.filter(character=self.vampire)[:5].explain())
+
+
+class EventLogTests(GameTestCase):
+    def test_replayed_log_matches_the_sheet(self):
+        grow_sheet(self.vampire)  # full memories, so turns recycle slots
+        skill = self.vampire.skills.first()
+        self.client.post(reverse('toggle_skill', args=[self.vampire.id, skill.id]))
+        self.client.post(reverse('add_skill', args=[self.vampire.id]), {'name': 'Night Vision'})
+        for turn in range(3):
+            play_turn(self.vampire.id, f'Night {turn}')
+        mortal = self.vampire.characters.filter(character_type='mortal').first()
+        execute_actions(self.vampire, [
+            {'type': 'kill_mortal', 'choices': {'character_id': mortal.id}},
+            {'type': 'convert_mortal', 'choices': {'character_id': mortal.id}},
+            {'type': 'create_resource', 'input_data': {'name': 'Crypt', 'is_stationary': True}},
+            {'type': 'lose_stationary_resources'},
+        ])
+
+        vampire = VampireCharacter.objects.get(pk=self.vampire.pk)
+        self.assertEqual(state_at(vampire.pk), live_state(vampire))
+
+    def test_a_turn_is_logged_in_one_batch(self):
+        grow_sheet(self.vampire)  # the turn recycles a full memory
+        with CaptureQueriesContext(connection) as ctx:
+            play_turn(self.vampire.id, 'Night')
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len([sql for sql in writes if 'game_sheetevent' in sql]), 1)
+        self.assertEqual(len([sql for sql in writes if 'state_version' in sql]), 1)
+        # The forgotten experiences are deleted with one query, not loaded one by one
+        self.assertEqual(len([sql for sql in writes if sql.startswith('DELETE')]), 1)
+        vampire = VampireCharacter.objects.get(pk=self.vampire.pk)
+        self.assertEqual(state_at(vampire.pk), live_state(vampire))
+
+    def test_admin_edits_are_logged(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        memory = self.vampire.memories.get(order=1)
+        self.client.post(reverse('admin:game_memory_delete', args=[memory.id]), {'post': 'yes'})
+        self.assertFalse(Experience.objects.filter(memory_id=memory.id).exists())
+        vampire = VampireCharacter.objects.get(pk=self.vampire.pk)
+        self.assertEqual(state_at(vampire.pk), live_state(vampire))
+
+    @override_settings(SHEET_SNAPSHOT_INTERVAL=3)
+    def test_state_at_any_turn_from_nearest_snapshot(self):
+        states = {}
+        for turn in range(1, 8):
+            play_turn(self.vampire.id, f'Night {turn}')
+            states[turn] = live_state(VampireCharacter.objects.get(pk=self.vampire.pk))
+            # Changes between turns belong to the next turn
+            self.client.post(reverse('add_skill', args=[self.vampire.id]), {'name': f'Skill of night {turn}'})
+
+        self.assertEqual(list(SheetSnapshot.objects.values_list('turn', flat=True)), [6, 3])
+        for turn, state in states.items():
+            # The turn's event, the nearest snapshot and the events after it
+            with self.assertNumQueries(3):
+                self.assertEqual(state_at(self.vampire.pk, turn), state)
+
+
+class BenchmarkReplayTests(TransactionTestCase):
+    def test_replay_matches_the_tables(self):
+        test_db = connection.settings_dict['NAME']
+        out = io.StringIO()
+        call_command('benchmark_replay', turns=60, interval=10, samples=5, stdout=out)
+        self.assertNotIn('does not match', out.getvalue())
+        self.assertIn('Snapshots make a rebuild', out.getvalue())
+        # The scratch database is gone and the test database is back in use
+        self.assertEqual(connection.settings_dict['NAME'], test_db)
+        self.assertFalse(VampireCharacter.objects.exists())
+
+
+class SheetChangesTests(GameTestCase):
+    def test_full_sheet_then_not_modified(self):
+        url = reverse('sheet_changes', args=[self.vampire.id])
+        response = self.client.get(url)
+        data = response.json()
+        self.assertTrue(data['full'])
+        self.assertEqual(response['ETag'], f'"{data["version"]}"')
+        self.assertEqual(data['changes']['vampirecharacter'][str(self.vampire.id)]['name'], self.vampire.name)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_since_version(self):
+        url = reverse('sheet_changes', args=[self.vampire.id])
+        version = self.client.get(url).json()['version']
+        skill_id = self.client.post(
+            reverse('add_skill', args=[self.vampire.id]), {'name': 'Night Vision'}
+        ).json()['skill']['id']
+
+        data = self.client.get(url, {'since': version}).json()
+        self.assertFalse(data['full'])
+        self.assertEqual(list(data['changes']), ['skill'])
+        self.assertEqual(data['changes']['skill'][str(skill_id)]['name'], 'Night Vision')
+
+        self.client.post(reverse('toggle_skill', args=[self.vampire.id, skill_id]))
+        data = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{data["version"]}"').json()
+        self.assertEqual(list(data['changes']), ['skill'])
+        self.assertTrue(data['changes']['skill'][str(skill_id)]['is_checked'])
+
+    def test_other_players_sheet_is_not_found(self):
+        other = User.objects.create_user('other', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('sheet_changes', args=[self.vampire.id])).status_code, 404)
+
+
+class SheetPanelsTests(GameTestCase):
+    def test_only_the_named_panels_are_rendered(self):
+        self.client.post(reverse('add_skill', args=[self.vampire.id]), {'name': 'Night Vision'})
+        url = reverse('sheet_panels', args=[self.vampire.id])
+        panels = self.client.get(url, {'panel': ['skills', 'status']}).json()['panels']
+        self.assertEqual(sorted(panels), ['skills', 'status'])
+        self.assertIn('data-sheet-panel="skills"', panels['skills'])
+        self.assertIn('Night Vision', panels['skills'])
+
+    def test_changed_models_map_to_panels_that_exist(self):
+        for panels in PANELS_BY_MODEL.values():
+            self.assertLessEqual(set(panels), set(PLAY_PANELS))
+
+    def test_unknown_panel_is_rejected(self):
+        url = reverse('sheet_panels', args=[self.vampire.id])
+        self.assertEqual(self.client.get(url, {'panel': ['skills', 'diary']}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_other_players_panels_are_not_found(self):
+        self.client.force_login(User.objects.create_user('other', password='pw'))
+        url = reverse('sheet_panels', args=[self.vampire.id])
+        self.assertEqual(self.client.get(url, {'panel': 'skills'}).status_code, 404)
+
+
+class SheetEditTests(GameTestCase):
+    def edit(self, *operations):
+        return self.client.post(
+            reverse('edit_sheet', args=[self.vampire.id]),
+            json.dumps({'operations': [{'op': op, 'data': data} for op, data in operations]}),
+            content_type='application/json',
+        )
+
+    def test_batch_applies_every_operation(self):
+        memory = self.vampire.memories.first()
+        skill = self.vampire.skills.first()
+        response = self.edit(
+            ('add_experience', {'memory_id': memory.id, 'text': 'I learned to read the stars.'}),
+            ('add_experience', {'memory_id': memory.id, 'text': 'I forgot my mother.'}),
+            ('add_skill', {'name': 'Astronomy'}),
+            ('toggle_skill', {'skill_id': skill.id}),
+            ('add_resource', {'name': 'Observatory', 'is_stationary': True}),
+            ('add_character', {'name': 'Ptolemy', 'description': 'A stargazer', 'character_type': 'mortal', 'relationship': 'friend'}),
+            ('add_mark', {'description': 'Starlight burns me'}),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()['results']
+        self.assertEqual([r['experience']['order'] for r in results[:2]], [2, 3])
+        self.assertEqual(Skill.objects.get(id=results[2]['skill']['id']).name, 'Astronomy')
+        self.assertTrue(Skill.objects.get(id=skill.id).is_checked)
+        self.assertTrue(Resource.objects.get(id=results[4]['resource']['id']).is_stationary)
+        self.assertEqual(changes_since(self.vampire.id, 0)[0]['skill'][str(skill.id)]['is_checked'], True)
+
+    def test_one_failure_writes_nothing(self):
+        memory = self.vampire.memories.first()
+        version = self.vampire.current_state_version()
+        response = self.edit(
+            ('add_skill', {'name': 'Astronomy'}),
+            ('add_experience', {'memory_id': memory.id, 'text': 'Two'}),
+            ('add_experience', {'memory_id': memory.id, 'text': 'Three'}),
+            ('add_experience', {'memory_id': memory.id, 'text': 'Four'}),
+            ('add_character', {'name': 'Ptolemy', 'character_type': 'ghost'}),
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.json()['results']
+        self.assertEqual(results[3]['error'], 'Memory is full (max 3 experiences)')
+        self.assertIn('character_type', results[4]['errors'])
+        self.assertFalse(any(result['success'] for result in results))
+        self.assertFalse(Skill.objects.filter(name='Astronomy').exists())
+        self.assertEqual(memory.experiences.count(), 1)
+        self.assertEqual(self.vampire.current_state_version(), version)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def count(size):
+            with CaptureQueriesContext(connection) as ctx:
+                self.edit(*[('add_skill', {'name': f'Skill {size}.{i}'}) for i in range(size)])
+            return len(ctx)
+        self.assertEqual(count(1), count(20))
+
+class ExportTests(GameTestCase):
+    def export(self, export_format):
+        response = self.client.get(reverse('export_chronicle', args=[self.vampire.id]), {'format': export_format})
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_jsonl_holds_every_row(self):
+        Skill.objects.filter(character=self.vampire, name='Skill 0').update(is_lost=True)
+        for turn in range(3):
+            play_turn(self.vampire.id, f'Night {turn}')
+        records = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        types = [record['type'] for record in records]
+        self.assertEqual(types[:2], ['chronicle', 'vampire'])
+        self.assertEqual(types.count('experience'), Experience.objects.filter(memory__character=self.vampire).count())
+        self.assertEqual([r['response'] for r in records if r['type'] == 'gamesession'], ['Night 0', 'Night 1', 'Night 2'])
+        self.assertIn({'name': 'Skill 0', 'is_lost': True}.items(), [
+            {key: r[key] for key in ('name', 'is_lost')}.items() for r in records if r['type'] == 'skill'
+        ])
+
+    def test_markdown_reads_as_a_chronicle(self):
+        play_turn(self.vampire.id, 'I drank from the river.')
+        text = self.export('markdown')
+        self.assertTrue(text.startswith('# Naram\n'))
+        self.assertIn('### Memory 1', text)
+        self.assertIn('**Maker**, immortal neutral', text)
+        self.assertIn('I drank from the river.', text)
+
+    def test_query_count_does_not_grow_with_the_chronicle(self):
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                self.export('jsonl')
+            return len(ctx)
+        before = count()
+        GameSession.objects.bulk_create([
+            GameSession(character=self.vampire, prompt_number=1, prompt_entry='a', response=f'Night {turn}')
+            for turn in range(30)
+        ])
+        with mock.patch('game.export.EXPORT_CHUNK_SIZE', 5):
+            self.assertEqual(count(), before)
+
+
+class ImportTests(GameTestCase):
+    def export_file(self):
+        response = self.client.get(reverse('export_chronicle', args=[self.vampire.id]), {'format': 'jsonl'})
+        return b''.join(response.streaming_content)
+
+    def test_command_round_trips_an_export(self):
+        grow_sheet(self.vampire)
+        for turn in range(3):
+            play_turn(self.vampire.id, f'Night {turn}')
+        Skill.objects.filter(character=self.vampire, name='Skill 0').update(is_lost=True)
+        User.objects.create_user('heir')
+        with tempfile.NamedTemporaryFile('wb', suffix='.jsonl', delete=False) as file:
+            file.write(self.export_file())
+        self.addCleanup(os.remove, file.name)
+
+        out = io.StringIO()
+        call_command('import_chronicle', file.name, user='heir', name='Naram Restored', stdout=out)
+        self.assertIn('Imported Naram Restored', out.getvalue())
+
+        original = VampireCharacter.objects.get(pk=self.vampire.pk)
+        copy = VampireCharacter.objects.get(name='Naram Restored')
+        self.assertEqual(copy.user.username, 'heir')
+        self.assertEqual(copy.created_at, original.created_at)
+        self.assertEqual(copy.prompt_visits, original.prompt_visits)
+        for related in ('memories', 'skills', 'resources', 'characters', 'marks', 'sessions'):
+            self.assertEqual(getattr(copy, related).count(), getattr(original, related).count())
+        self.assertEqual(
+            list(Experience.objects.filter(memory__character=copy).values_list('memory__order', 'order', 'text')),
+            list(Experience.objects.filter(memory__character=original).values_list('memory__order', 'order', 'text')),
+        )
+        self.assertEqual(
+            list(copy.sessions.values_list('response', 'created_at')),
+            list(original.sessions.values_list('response', 'created_at')),
+        )
+        self.assertTrue(copy.skills.get(name='Skill 0').is_lost)
+        # Rows written in bulk are still in the event log
+        self.assertEqual(state_at(copy.pk), live_state(copy))
+
+    def test_upload_creates_a_character(self):
+        upload = SimpleUploadedFile('naram.jsonl', self.export_file())
+        response = self.client.post(reverse('import_chronicle'), {'chronicle': upload})
+        copy = VampireCharacter.objects.exclude(pk=self.vampire.pk).get()
+        self.assertRedirects(response, reverse('character_detail', args=[copy.id]))
+        self.assertEqual(copy.user, self.user)
+        self.assertEqual(copy.memories.count(), 5)
+
+    def test_broken_file_imports_nothing(self):
+        lines = self.export_file().splitlines(keepends=True)
+        broken = b''.join(lines[:-1]) + b'{"type": "gamesession", "prompt_number": "soon"}\n'
+        response = self.client.post(
+            reverse('import_chronicle'), {'chronicle': SimpleUploadedFile('broken.jsonl', broken)}, follow=True
+        )
+        self.assertContains(response, 'Could not import the chronicle')
+        self.assertEqual(VampireCharacter.objects.count(), 1)
+        self.assertEqual(Memory.objects.count(), 5)
+
+    def test_file_that_is_not_utf8_is_rejected(self):
+        lines = self.export_file().splitlines(keepends=True)
+        lines.append('{"type": "skill", "name": "Caf\u00e9"}\n'.encode('latin-1'))
+        with self.assertRaisesMessage(ChronicleImportError, f'Line {len(lines)}:'):
+            ChronicleImport(self.user).run(lines)
+        self.assertEqual(VampireCharacter.objects.count(), 1)
+
+    def test_command_reports_a_file_that_is_not_utf8(self):
+        User.objects.create_user('heir')
+        with tempfile.NamedTemporaryFile('wb', suffix='.jsonl', delete=False) as file:
+            file.write(self.export_file() + '{"type": "skill", "name": "Caf\u00e9"}\n'.encode('latin-1'))
+        self.addCleanup(os.remove, file.name)
+
+        out = io.StringIO()
+        call_command('import_chronicle', file.name, user='heir', stdout=out)
+        self.assertIn('Nothing imported: Line', out.getvalue())
+        self.assertEqual(VampireCharacter.objects.count(), 1)
+
+    def test_memory_ids_must_be_integers(self):
+        lines = self.export_file().splitlines(keepends=True)
+        number, experience = next(
+            (number, json.loads(line)) for number, line in enumerate(lines, 1) if b'"experience"' in line
+        )
+        for memory_id in ([1], {'id': 1}, '1', True):
+            experience['memory_id'] = memory_id
+            broken = [*lines[:number - 1], json.dumps(experience).encode(), *lines[number:]]
+            with self.subTest(memory_id=memory_id):
+                with self.assertRaisesMessage(ChronicleImportError, f'Line {number}: memory_id must be an integer'):
+                    ChronicleImport(self.user).run(broken)
+        self.assertEqual(VampireCharacter.objects.count(), 1)
+
+
+class TimelineTests(GameTestCase):
+    def add_sessions(self, count):
+        GameSession.objects.bulk_create([
+            GameSession(character=self.vampire, prompt_number=1, prompt_entry='a', response=f'Night {n}')
+            for n in range(count)
+        ])
+
+    def page(self, **params):
+        response = self.client.get(reverse('session_timeline_page', args=[self.vampire.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_cover_every_session_once_newest_first(self):
+        self.add_sessions(12)
+        # Sessions written in the same instant are ordered by id
+        sessions = list(GameSession.objects.filter(character=self.vampire).order_by('id'))
+        GameSession.objects.filter(pk__in=[s.pk for s in sessions[3:9]]).update(created_at=sessions[3].created_at)
+        expected = list(
+            GameSession.objects.filter(character=self.vampire).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+        seen, data = [], self.page(limit=5)
+        while True:
+            seen += [session['id'] for session in data['sessions']]
+            if not data['next']:
+                break
+            data = self.page(after=data['next'], limit=5)
+        self.assertEqual(seen, expected)
+
+    def test_page_shows_first_sessions_and_cursor(self):
+        self.add_sessions(3)
+        with self.settings(TIMELINE_PAGE_SIZE=2):
+            response = self.client.get(reverse('session_timeline', args=[self.vampire.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['sessions']), 2)
+        self.assertTrue(response.context['next_cursor'])
+
+    def test_bad_cursor_and_other_players_are_refused(self):
+        url = reverse('session_timeline_page', args=[self.vampire.id])
+        self.assertEqual(self.client.get(url, {'after': 'yesterday'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('rival'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_deep_pages_seek_the_index(self):
+        self.add_sessions(30)
+        after = self.page(limit=25)['next']
+        plan = timeline_queryset(self.vampire.id, after).explain()
+        self.assertIn('game_session_timeline_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FakeChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+class LiveSheetTests(GameTestCase):
+    def test_sheet_changes_are_pushed_after_commit(self):
+        layer = FakeChannelLayer()
+        with mock.patch('game.live.get_channel_layer', return_value=layer):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('add_skill', args=[self.vampire.id]), {'name': 'Night Vision'})
+                self.assertEqual(layer.sent, [])
+        version = latest_event_id(self.vampire.id)
+        self.assertEqual(layer.sent, [(f'sheet_{self.vampire.id}', {'type': 'sheet.changed', 'version': version})])
+
+    @override_settings(CHANNEL_LAYERS={})
+    def test_nothing_is_pushed_without_a_channel_layer(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('add_skill', args=[self.vampire.id]), {'name': 'Night Vision'})
+        self.assertEqual(callbacks, [])
+
+
+class SheetConsumerTests(TransactionTestCase):
+    def test_owner_receives_sheet_changes(self):
+        user = User.objects.create_user('player')
+        vampire = VampireCharacter.objects.create(user=user, name='Listener', origin_description='')
+
+        async def listen():
+            communicator = WebsocketCommunicator(
+                SheetConsumer.as_asgi(), f'/ws/characters/{vampire.id}/sheet/'
+            )
+            communicator.scope.update({'user': user, 'url_route': {'kwargs': {'character_id': vampire.id}}})
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await get_channel_layer().group_send(sheet_group(vampire.id), {'type': 'sheet.changed', 'version': 7})
+            self.assertEqual(await communicator.receive_json_from(), {'version': 7})
+            await communicator.disconnect()
+
+        async_to_sync(listen)()
+
+class SimulatorTests(GameTestCase):
+    def test_resolved_choices_execute(self):
+        processor = PromptProcessor(self.vampire, 'Kill a mortal character. Check 2 skills. Lose a memory. Gain a mark.')
+        resolved = resolve_actions(processor.analyze_prompt(), random.Random(1))
+        self.assertEqual([a['type'] for a in resolved], ['kill_mortal', 'check_skills', 'create_mark', 'lose_memory'])
+        self.assertEqual(len(resolved[1]['choices']['skill_ids']), 2)
+        self.assertEqual(len(processor.execute_actions(resolved)), 5)
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipUnless(numpy, 'NumPy is not installed')
+class PromptWalkTests(GameTestCase):
+    def test_walk_matches_closed_form(self):
+        from .prompt_walk import analyze_prompt_walk
+        # Only prompt 1 exists, so the walk continues while it rolls 0 or less
+        stay = 21 / 60
+        stats = analyze_prompt_walk({(1, 'a'): 'First.', (1, 'b'): 'Second.', (1, 'c'): 'Third.'})
+        self.assertAlmostEqual(stats['expected_turns'], 1 / (1 - stay))
+        self.assertAlmostEqual(stats['stuck_probability'], 1)
+        entries = stats['prompts'][0]['entries']
+        self.assertAlmostEqual(entries['b'], stay)
+        self.assertAlmostEqual(entries['c'], stay ** 2)
+        self.assertAlmostEqual(stats['expected_c_entries'], stay ** 2 / (1 - stay))
+
+    def test_revisits_that_end_the_game_are_tracked(self):
+        from .prompt_walk import analyze_prompt_walk
+        stay = 21 / 60
+        stats = analyze_prompt_walk({
+            (1, 'a'): 'First.',
+            (1, 'b'): 'On a 1 or 2, the game is over.',
+            (1, 'c'): 'Third.',
+        })
+        self.assertEqual(stats['watched_prompts'], [1])
+        self.assertAlmostEqual(stats['game_over_probability'], stay * 0.2)
+        self.assertAlmostEqual(stats['prompts'][0]['entries']['c'], stay * 0.8 * stay)
+
+    def test_stats_page(self):
+        response = self.client.get(reverse('prompt_stats'))
+        self.assertContains(response, 'Prompt Odds')
+        self.assertEqual(response.context['rows'][0]['number'], 1)
+
+
+class InstrumentationTests(GameTestCase):
+    def test_metrics_are_recorded_per_view(self):
+        reset_view_metrics()
+        self.client.get(reverse('character_detail', args=[self.vampire.id]))
+        self.client.get(reverse('character_detail', args=[self.vampire.id]))
+        url = reverse('view_metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)  # staff only
+        self.user.is_staff = True
+        self.user.save()
+        metrics = self.client.get(url).json()['views']['character_detail']
+        self.assertEqual(metrics['requests'], 2)
+        self.assertEqual(sum(metrics['queries'].values()), 2)
+        self.assertLessEqual(metrics['max_queries'], metrics['budget'])
+
+    def test_character_list_has_fixed_cost(self):
+        self.client.get(reverse('character_list'))
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse('character_list'))
+        create_vampire(self.user, name='Second')
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(reverse('character_list'))
+        self.assertEqual(len(after), len(before))
+        self.assertContains(response, '5/5', count=2)
+
+    @override_settings(QUERY_BUDGETS={'character_detail': 1})
+    def test_budget_fails_when_strict(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('character_detail', args=[self.vampire.id]))
+
+    @override_settings(QUERY_BUDGETS={'character_detail': 1}, QUERY_BUDGETS_STRICT=False)
+    def test_budget_warns_by_default(self):
+        reset_view_metrics()
+        with self.assertLogs('game.instrumentation', 'WARNING') as logs:
+            response = self.client.get(reverse('character_detail', args=[self.vampire.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('over its budget of 1', logs.output[0])
+        self.assertEqual(get_view_metrics()['character_detail']['over_budget'], 1)
+
+    async def test_async_views_are_measured_under_asgi(self):
+        await sync_to_async(reset_view_metrics)()
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        for name, args in (('character_list', []), ('character_detail', [self.vampire.id]), ('dice_roller', [])):
+            response = await client.get(reverse(name, args=args))
+            self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dice')
+        metrics = await sync_to_async(get_view_metrics)()
+        self.assertGreater(metrics['character_detail']['max_queries'], 1)
+
+
+@override_settings(QUERY_BUDGETS_STRICT=True)
+class TurnConcurrencyTests(GameTestMixin, TransactionTestCase):
+    def submit_in_parallel(self, count, **kwargs):
+        barrier = threading.Barrier(count)
+        outcomes = []
+
+        def submit():
+            barrier.wait()
+            try:
+                play_turn(self.vampire.id, 'I remember.', **kwargs)
+                outcomes.append('played')
+            except StaleTurnError:
+                outcomes.append('stale')
+            except Exception as exc:
+                outcomes.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=submit) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_double_submit_plays_one_turn(self):
+        outcomes = self.submit_in_parallel(4, expected_prompt=(1, 'a'))
+        self.assertCountEqual(outcomes, ['played', 'stale', 'stale', 'stale'])
+        self.assertEqual(self.vampire.sessions.count(), 1)
+
+    def test_parallel_turns_keep_slots_consistent(self):
+        outcomes = self.submit_in_parallel(6)
+        self.assertEqual(outcomes, ['played'] * 6)
+        self.assertEqual(self.vampire.sessions.count(), 6)
+        for memory in self.vampire.memories.all():
+            orders = list(memory.experiences.values_list('order', flat=True))
+            self.assertEqual(orders, list(range(1, len(orders) + 1)))
+
+
+class SqliteTuningTests(TransactionTestCase):
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    @mock.patch('game.database.time.sleep')
+    def test_locked_writes_are_retried(self, sleep):
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(connection.in_atomic_block)
+            User.objects.create_user(f'writer-{len(calls)}')
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'written'
+
+        self.assertEqual(write(), 'written')
+        self.assertEqual(calls, [True, True, True])
+        self.assertEqual(sleep.call_count, 2)
+        # Only the last attempt was committed
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['writer-3'])
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    def test_writers_queue_on_the_lock_file(self):
+        @retry_on_lock
+        def write():
+            # Another writer cannot take its turn until this transaction is over
+            with open(f"{connection.settings_dict['NAME']}-write.lock") as lock_file:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return 'written'
+
+        self.assertEqual(write(), 'written')
+
+    def test_other_errors_are_not_retried(self):
+        @retry_on_lock
+        def write():
+            raise OperationalError('no such table: game_nothing')
+
+        with self.assertRaises(OperationalError):
+            write()
@@ -0,0 +1,61 @@
+"""
+Session timeline for Thousand Year Old Vampire
+This module pages through a vampire's sessions newest first by keyset on (created_at, id): each
+page starts right after the last session of the one before, so it is found with one seek into
+game_session_timeline_idx however deep it is, where OFFSET would read and skip every row before it.
+"""
+
+import datetime
+from django.conf import settings
+from .models import GameSession
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Fields of each session sent to the timeline
+TIMELINE_FIELDS = (
+    'id', 'prompt_number', 'prompt_entry', 'response', 'dice_roll_d10', 'dice_roll_d6', 'next_prompt', 'created_at'
+)
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that encode_cursor() did not produce."""
+
+
+def page_size():
+    return getattr(settings, 'TIMELINE_PAGE_SIZE', 20)
+
+
+def encode_cursor(session):
+    """Return the opaque cursor for the position just after a session: '<microseconds>_<id>'."""
+    return f"{(session['created_at'] - EPOCH) // ONE_MICROSECOND}_{session['id']}"
+
+
+def decode_cursor(cursor):
+    try:
+        microseconds, session_id = cursor.split('_')
+        return EPOCH + int(microseconds) * ONE_MICROSECOND, int(session_id)
+    except (ValueError, OverflowError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def timeline_queryset(character_id, cursor=None, limit=None):
+    """Return the sessions of a timeline page, plus one more to tell whether another page follows."""
+    sessions = GameSession.objects.filter(character_id=character_id)
+    if cursor:
+        created_at, session_id = decode_cursor(cursor)
+        # (created_at, id) < (cursor): a range on the index, less the ties already shown
+        sessions = sessions.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=session_id)
+    return sessions.order_by('-created_at', '-id').values(*TIMELINE_FIELDS)[:(limit or page_size()) + 1]
+
+
+def timeline_page(rows, limit=None):
+    """Split the fetched rows of timeline_queryset() into (sessions, cursor of the next page or None)."""
+    limit = limit or page_size()
+    sessions = rows[:limit]
+    for session in sessions:
+        rolled = session['dice_roll_d10'] is not None and session['dice_roll_d6'] is not None
+        session['movement'] = session['dice_roll_d10'] - session['dice_roll_d6'] if rolled else None
+    return sessions, encode_cursor(sessions[-1]) if len(rows) > limit else None
+
@@ -0,0 +1,112 @@
+"""
+Turn pipeline for Thousand Year Old Vampire
+This module applies a prompt response as a single atomic, lock-guarded unit of work.
+"""
+
+import random
+from django.db import connection, transaction
+from django.utils import timezone
+from .database import retry_on_lock
+from .events import delete_event, record_turn, save_event
+from .models import VampireCharacter, Memory, Experience, GameSession
+from .memory_slots import allocate_memory_slot
+
+
+# The entry read on a prompt is chosen by how often it has been answered before
+PROMPT_ENTRIES = ('a', 'b', 'c')
+
+
+def entry_for_visits(visits):
+    """Return the entry (a, b or c) to read on a prompt already answered `visits` times."""
+    return PROMPT_ENTRIES[min(visits, len(PROMPT_ENTRIES) - 1)]
+
+
+def next_prompt_number(current_prompt, movement):
+    """Return the prompt reached by moving `movement` prompts on; there is nothing below prompt 1."""
+    return max(1, current_prompt + movement)
+
+
+class StaleTurnError(Exception):
+    """Raised when a response is submitted for a prompt the vampire has already left."""
+
+
+def lock_character(character_id):
+    """Lock a vampire's row for the rest of the current transaction and return it.
+
+    SQLite has no row locks and ignores select_for_update(), so there the row
+    is touched first instead: the UPDATE takes the database write lock, making
+    concurrent turns queue up rather than read the same state and interleave.
+    With transaction_mode IMMEDIATE the transaction took that lock when it began.
+    """
+    immediate = connection.settings_dict['OPTIONS'].get('transaction_mode') == 'IMMEDIATE'
+    if not connection.features.has_select_for_update and not immediate:
+        VampireCharacter.objects.filter(pk=character_id).update(updated_at=timezone.now())
+    return VampireCharacter.objects.select_for_update().get(pk=character_id)
+
+
+@retry_on_lock
+def play_turn(character_id, response, expected_prompt=None):
+    """Record a response to the current prompt, roll the dice and move the vampire on.
+
+    expected_prompt is the (number, entry) pair the player was shown. When it
+    is given and the vampire has moved since, StaleTurnError is raised and
+    nothing is written, so a double-submitted form only plays one turn.
+
+    Returns a dict describing the turn for the caller to report.
+    """
+    with transaction.atomic():
+        character = lock_character(character_id)
+        if expected_prompt is not None and expected_prompt != (character.current_prompt, character.prompt_entry):
+            raise StaleTurnError(f"Prompt {expected_prompt[0]}{expected_prompt[1]} has already been answered")
+
+        # Find an available memory slot or recycle the oldest one
+        events = []
+        lost_memory = None
+        available_memory, experience_order, recycled = allocate_memory_slot(character)
+        if recycled:
+            # Every slot is full: the oldest memory is lost and its slot reused
+            lost_memory = available_memory.title or 'Untitled'
+            available_memory.title = f"Prompt {character.current_prompt}{character.prompt_entry}"
+            Memory.objects.filter(pk=available_memory.pk).update(title=available_memory.title)
+            events.append(save_event(available_memory, character.pk, ['title']))
+            forgotten = Experience.objects.filter(memory=available_memory)
+            events.extend(delete_event(experience, character.pk) for experience in forgotten.only('pk'))
+            forgotten.delete()
+
+        experience = Experience.objects.create(memory=available_memory, text=response, order=experience_order)
+        events.append(save_event(experience, character.pk))
+
+        # Roll dice for next prompt
+        d10 = random.randint(1, 10)
+        d6 = random.randint(1, 6)
+        movement = d10 - d6
+        next_prompt_num = next_prompt_number(character.current_prompt, movement)
+
+        session = GameSession.objects.create(
+            character=character,
+            prompt_number=character.current_prompt,
+            prompt_entry=character.prompt_entry,
+            response=response,
+            dice_roll_d10=d10,
+            dice_roll_d6=d6,
+            next_prompt=next_prompt_num
+        )
+
+        # Revisiting a prompt moves on to its b, then c entry
+        character.record_visit(character.current_prompt)
+        next_entry = entry_for_visits(character.visits_to(next_prompt_num))
+
+        character.current_prompt = next_prompt_num
+        character.prompt_entry = next_entry
+        character.save(update_fields=['current_prompt', 'prompt_entry', 'prompt_visits', 'updated_at'])
+        events.append(save_event(character, character.pk, ['current_prompt', 'prompt_entry', 'prompt_visits']))
+        record_turn(character, session, events)
+
+    return {
+        'd10': d10,
+        'd6': d6,
+        'movement': movement,
+        'next_prompt': next_prompt_num,
+        'next_entry': next_entry,
+        'lost_memory': lost_memory,
+    }
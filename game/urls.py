@@ -6,8 +6,12 @@ urlpatterns = [
     path('register/', views.register, name='register'),
     path('characters/', views.character_list, name='character_list'),
     path('characters/create/', views.create_character, name='create_character'),
+    path('characters/import/', views.import_chronicle_upload, name='import_chronicle'),
     path('characters/<int:character_id>/setup/', views.setup_character, name='setup_character'),
     path('characters/<int:character_id>/', views.character_detail, name='character_detail'),
+    path('characters/<int:character_id>/export/', views.export_chronicle, name='export_chronicle'),
+    path('characters/<int:character_id>/timeline/', views.session_timeline, name='session_timeline'),
+    path('characters/<int:character_id>/timeline/page/', views.session_timeline_page, name='session_timeline_page'),
     path('characters/<int:character_id>/play/', views.play_game, name='play_game'),
     path('characters/<int:character_id>/add-experience/', views.add_experience, name='add_experience'),
     path('characters/<int:character_id>/add-skill/', views.add_skill, name='add_skill'),
@@ -15,5 +19,10 @@ urlpatterns = [
     path('characters/<int:character_id>/add-resource/', views.add_resource, name='add_resource'),
     path('characters/<int:character_id>/add-character/', views.add_character, name='add_character'),
     path('characters/<int:character_id>/add-mark/', views.add_mark, name='add_mark'),
+    path('characters/<int:character_id>/edit-sheet/', views.edit_sheet, name='edit_sheet'),
+    path('characters/<int:character_id>/sheet/', views.sheet_changes, name='sheet_changes'),
+    path('characters/<int:character_id>/sheet/panels/', views.sheet_panels, name='sheet_panels'),
     path('dice/', views.dice_roller, name='dice_roller'),
+    path('stats/', views.prompt_stats, name='prompt_stats'),
+    path('metrics/', views.view_metrics, name='view_metrics'),
 ]
@@ -1,9 +1,16 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import Count
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.text import slugify
 from django.views.decorators.http import require_http_methods
 from django.urls import reverse
 import random
@@ -11,12 +18,23 @@ import json
 
 from .models import (
     VampireCharacter, Memory, Experience, Skill, Resource, 
-    Character, Mark, Diary, GameSession, Prompt
+    Character, Mark, Diary
 )
+from .chronicle_import import ChronicleImportError, import_chronicle
+from .database import retry_on_lock
+from .events import changes_since, latest_event_id, rebuild, record_sheet_change, save_event
+from .export import EXPORT_FORMATS, aiterate, export_chunks
 from .forms import (
     VampireCreationForm, ExperienceForm, SkillForm, ResourceForm,
-    CharacterForm, MarkForm, DiaryForm
+    CharacterForm, MarkForm, DiaryForm, ChronicleImportForm
 )
+from .instrumentation import get_view_metrics, reset_view_metrics
+from .memory_slots import MemoryFullError, next_experience_order
+from .prompt_table import get_prompt
+from .sheet import PANELS_BY_MODEL, PLAY_PANELS, CharacterSheet
+from .sheet_edits import MAX_OPERATIONS, apply_sheet_edits
+from .timeline import InvalidCursor, timeline_page, timeline_queryset
+from .turns import StaleTurnError, play_turn
 
 
 def home(request):
@@ -38,11 +56,25 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
+# Renders in a thread, as templates may touch the database: request.user in
+# the base layout, and sheet panels that are only loaded on a cache miss
+arender = sync_to_async(render)
+
+
 @login_required
-def character_list(request):
+async def character_list(request):
     """List all characters for the current user."""
-    characters = VampireCharacter.objects.filter(user=request.user)
-    return render(request, 'game/character_list.html', {'characters': characters})
+    user = await request.auser()
+    characters = [
+        character async for character in VampireCharacter.objects.filter(user=user).annotate(
+            memory_count=Count('memories', distinct=True),
+            skill_count=Count('skills', distinct=True),
+        )
+    ]
+    return await arender(request, 'game/character_list.html', {
+        'characters': characters,
+        'import_form': ChronicleImportForm(),
+    })
 
 
 @login_required
@@ -53,19 +85,21 @@ def create_character(request):
         if form.is_valid():
             character = form.save(commit=False)
             character.user = request.user
-            character.save()
-            
-            # Create initial 5 memory slots
-            for i in range(1, 6):
-                Memory.objects.create(character=character, order=i)
-            
-            # Create the first experience in Memory 1 from the origin description
-            memory_1 = Memory.objects.get(character=character, order=1)
-            Experience.objects.create(
-                memory=memory_1,
-                text=character.origin_description,
-                order=1
-            )
+            with transaction.atomic():
+                character.save()
+                
+                # Create initial 5 memory slots
+                memories = Memory.objects.bulk_create([Memory(character=character, order=i) for i in range(1, 6)])
+                
+                # Create the first experience in Memory 1 from the origin description
+                experience = Experience.objects.create(
+                    memory=memories[0],
+                    text=character.origin_description,
+                    order=1
+                )
+                record_sheet_change(character, [
+                    save_event(row, character.pk) for row in (character, *memories, experience)
+                ])
             
             messages.success(request, f'Created vampire character: {character.name}')
             return redirect('setup_character', character_id=character.id)
@@ -76,42 +110,106 @@ def create_character(request):
 
 
 @login_required
-def character_detail(request, character_id):
+async def character_detail(request, character_id):
     """Show character sheet and current state."""
+    # The sheet panels come from the fragment cache, so the sheet is only loaded on a miss
+    character = await aget_object_or_404(
+        VampireCharacter.objects.select_related('diary'), id=character_id, user=await request.auser()
+    )
+    
+    context = CharacterSheet(character).context()
+    context['recent_sessions'] = [session async for session in character.sessions.all()[:5]]
+    
+    return await arender(request, 'game/character_detail.html', context)
+
+
+@login_required
+@require_http_methods(["POST"])
+def import_chronicle_upload(request):
+    """Import an uploaded JSON Lines chronicle as a new character."""
+    form = ChronicleImportForm(request.POST, request.FILES)
+    if not form.is_valid():
+        messages.error(request, 'Choose a chronicle file to import.')
+        return redirect('character_list')
+    
+    try:
+        character, counts = import_chronicle(form.cleaned_data['chronicle'], request.user)
+    except ChronicleImportError as e:
+        messages.error(request, f'Could not import the chronicle: {e}')
+        return redirect('character_list')
+    
+    messages.success(
+        request,
+        f"Imported {character.name} with {counts.get('gamesession', 0)} sessions."
+    )
+    return redirect('character_detail', character_id=character.id)
+
+
+@login_required
+@require_http_methods(["GET"])
+def export_chronicle(request, character_id):
+    """Download a character's whole chronicle as Markdown or JSON Lines, streamed as it is read."""
     character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
+    export_format = request.GET.get('format', 'markdown')
+    if export_format not in EXPORT_FORMATS:
+        raise Http404('Unknown export format')
     
-    context = {
+    chunks = export_chunks(character, export_format)
+    if isinstance(request, ASGIRequest):
+        chunks = aiterate(chunks)
+    _, content_type, extension = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{slugify(character.name) or "chronicle"}.{extension}"'
+    return response
+
+
+# Most sessions one timeline page may ask for
+MAX_TIMELINE_PAGE = 100
+
+
+@login_required
+async def session_timeline(request, character_id):
+    """Browse every session of a character, newest first, loading older ones while scrolling."""
+    character = await aget_object_or_404(VampireCharacter, id=character_id, user=await request.auser())
+    sessions, next_cursor = timeline_page([row async for row in timeline_queryset(character.id)])
+    return await arender(request, 'game/session_timeline.html', {
         'character': character,
-        'memories': character.memories.all(),
-        'skills': character.skills.filter(is_lost=False),
-        'resources': character.resources.filter(is_lost=False),
-        'characters': character.characters.filter(is_dead=False),
-        'marks': character.marks.filter(is_removed=False),
-        'diary': getattr(character, 'diary', None),
-        'recent_sessions': character.sessions.all()[:5],
-    }
+        'sessions': sessions,
+        'next_cursor': next_cursor,
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+async def session_timeline_page(request, character_id):
+    """One page of a character's session timeline as JSON.
+    
+    Pass the 'next' cursor of the previous page as ?after= to get the page
+    following it, and ?limit= for its size.
+    """
+    character = await aget_object_or_404(
+        VampireCharacter.objects.only('id'), id=character_id, user=await request.auser()
+    )
+    limit = request.GET.get('limit', '')
+    limit = min(int(limit), MAX_TIMELINE_PAGE) if limit.isdigit() and int(limit) > 0 else None
+    try:
+        rows = [row async for row in timeline_queryset(character.id, request.GET.get('after'), limit)]
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    return render(request, 'game/character_detail.html', context)
+    sessions, next_cursor = timeline_page(rows, limit)
+    return JsonResponse({'sessions': sessions, 'next': next_cursor})
 
 
 @login_required
 def play_game(request, character_id):
     """Main game interface for playing through prompts."""
-    character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
+    character = get_object_or_404(
+        VampireCharacter.objects.select_related('diary'), id=character_id, user=request.user
+    )
     
     # Check if character setup is complete
-    try:
-        setup_complete = (
-            character.skills.count() >= 3 and 
-            character.resources.count() >= 3 and
-            character.characters.filter(character_type='immortal').exists() and
-            character.marks.exists() and
-            character.memories.get(order=5).experiences.exists()
-        )
-    except Memory.DoesNotExist:
-        setup_complete = False
-    
-    if not setup_complete:
+    if not character.setup_complete:
         messages.warning(request, 'Please complete character setup before beginning the game.')
         return redirect('setup_character', character_id=character.id)
     
@@ -120,12 +218,8 @@ def play_game(request, character_id):
         return redirect('character_detail', character_id=character.id)
     
     # Get current prompt
-    try:
-        current_prompt = Prompt.objects.get(
-            number=character.current_prompt,
-            entry=character.prompt_entry
-        )
-    except Prompt.DoesNotExist:
+    current_prompt = get_prompt(character.current_prompt, character.prompt_entry)
+    if current_prompt is None:
         messages.error(request, 'Prompt not found. The game may not be fully loaded.')
         return redirect('character_detail', character_id=character.id)
     
@@ -144,134 +238,81 @@ def play_game(request, character_id):
         response = ''
     
     if response.strip():
+        # The form carries the prompt it was rendered for, so a double submit is not played twice
+        expected_prompt = None
+        if request.method == 'POST' and request.POST.get('prompt_number', '').isdigit():
+            expected_prompt = (int(request.POST['prompt_number']), request.POST.get('prompt_entry', ''))
         
-        # Create an experience for this prompt response
-        # Find an available memory slot or create new memory if needed
-        available_memory = None
-        for memory in character.memories.filter(is_lost=False).order_by('order'):
-            if memory.experiences.count() < 3:
-                available_memory = memory
-                break
-        
-        if not available_memory:
-            # Need to create a new memory, which means losing an old one
-            oldest_memory = character.memories.filter(is_lost=False).order_by('order').first()
-            if oldest_memory:
-                oldest_memory.is_lost = True
-                oldest_memory.save()
-                messages.info(request, f"Lost memory: {oldest_memory.title or 'Untitled'}")
-            
-            # Reuse the memory slot
-            available_memory = oldest_memory
-            available_memory.is_lost = False
-            available_memory.title = f"Prompt {character.current_prompt}{character.prompt_entry}"
-            available_memory.save()
-            
-            # Clear old experiences
-            available_memory.experiences.all().delete()
-        
-        # Add the new experience
-        experience_order = available_memory.experiences.count() + 1
-        Experience.objects.create(
-            memory=available_memory,
-            text=response,
-            order=experience_order
-        )
-        
-        # Roll dice for next prompt
-        d10 = random.randint(1, 10)
-        d6 = random.randint(1, 6)
-        movement = d10 - d6
-        
-        next_prompt_num = character.current_prompt + movement
-        next_prompt_num = max(1, next_prompt_num)  # Can't go below prompt 1
-        
-        # Save session
-        session = GameSession.objects.create(
-            character=character,
-            prompt_number=character.current_prompt,
-            prompt_entry=character.prompt_entry,
-            response=response,
-            dice_roll_d10=d10,
-            dice_roll_d6=d6,
-            next_prompt=next_prompt_num
-        )
-        
-        # Update character's current prompt
-        character.current_prompt = next_prompt_num
-        character.prompt_entry = 'a'  # Always start with 'a' when moving to new prompt
-        
-        # Check if we've been to this prompt before
-        previous_sessions = GameSession.objects.filter(
-            character=character,
-            prompt_number=next_prompt_num
-        ).count()
+        try:
+            turn = play_turn(character.id, response, expected_prompt=expected_prompt)
+        except StaleTurnError:
+            messages.warning(request, 'That prompt has already been answered.')
+            return redirect('play_game', character_id=character.id)
         
-        if previous_sessions == 1:
-            character.prompt_entry = 'b'
-        elif previous_sessions >= 2:
-            character.prompt_entry = 'c'
-            
-        character.save()
+        if turn['lost_memory'] is not None:
+            messages.info(request, f"Lost memory: {turn['lost_memory']}")
         
         # Create success message
-        messages.success(request, f'Rolled {d10} - {d6} = {movement}. Moving to prompt {next_prompt_num}.')
+        messages.success(
+            request,
+            f"Rolled {turn['d10']} - {turn['d6']} = {turn['movement']}. Moving to prompt {turn['next_prompt']}."
+        )
         return redirect('play_game', character_id=character.id)
     
-    context = {
-        'character': character,
-        'prompt': current_prompt,
-        'memories': character.memories.all(),
-        'skills': character.skills.filter(is_lost=False),
-        'resources': character.resources.filter(is_lost=False),
-        'characters': character.characters.filter(is_dead=False),
-        'marks': character.marks.filter(is_removed=False),
-    }
+    # The sheet is only fetched when rendering, so POSTs never pay for it
+    context = CharacterSheet(character).context()
+    context['prompt'] = current_prompt
+    context['sheet_version'] = latest_event_id(character.id)  # polled against sheet_changes
+    context['panels_by_model'] = PANELS_BY_MODEL
     
     return render(request, 'game/play.html', context)
 
 
 @login_required
 @require_http_methods(["POST"])
+@retry_on_lock
 def add_experience(request, character_id):
     """Add a new experience to a memory via AJAX."""
-    character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
-    
     memory_id = request.POST.get('memory_id')
     text = request.POST.get('text', '').strip()
     
+    # The memory is read together with its vampire, so an accepted experience reads neither on its own
+    memories = Memory.objects.select_related('character').filter(character_id=character_id, character__user=request.user)
+    error = None
     if not text:
-        return JsonResponse({'success': False, 'error': 'Experience text is required'})
+        error = 'Experience text is required'
+    else:
+        try:
+            memory, experience_order = next_experience_order(memories, memory_id)
+        except Memory.DoesNotExist:
+            error = 'Memory not found'
+        except MemoryFullError as e:
+            error = str(e)
+    if error:
+        get_object_or_404(VampireCharacter, id=character_id, user=request.user)
+        return JsonResponse({'success': False, 'error': error})
+    character = memory.character
+    
+    experience = Experience.objects.create(
+        memory=memory,
+        text=text,
+        order=experience_order
+    )
+    record_sheet_change(character, [save_event(experience, character.pk)])
     
-    try:
-        memory = Memory.objects.get(id=memory_id, character=character)
-        
-        # Check if memory has space (max 3 experiences)
-        experience_count = memory.experiences.count()
-        if experience_count >= 3:
-            return JsonResponse({'success': False, 'error': 'Memory is full (max 3 experiences)'})
-        
-        experience = Experience.objects.create(
-            memory=memory,
-            text=text,
-            order=experience_count + 1
-        )
-        
-        return JsonResponse({
-            'success': True,
-            'experience': {
-                'id': experience.id,
-                'text': experience.text,
-                'order': experience.order
-            }
-        })
-        
-    except Memory.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Memory not found'})
+    return JsonResponse({
+        'success': True,
+        'experience': {
+            'id': experience.id,
+            'text': experience.text,
+            'order': experience.order
+        }
+    })
 
 
 @login_required
 @require_http_methods(["POST"])
+@retry_on_lock
 def add_skill(request, character_id):
     """Add a new skill via AJAX."""
     character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
@@ -283,6 +324,7 @@ def add_skill(request, character_id):
         return JsonResponse({'success': False, 'error': 'Skill name is required'})
     
     skill = Skill.objects.create(character=character, name=name, description=description)
+    record_sheet_change(character, [save_event(skill, character.pk)])
     
     return JsonResponse({
         'success': True,
@@ -297,14 +339,18 @@ def add_skill(request, character_id):
 
 @login_required
 @require_http_methods(["POST"])
+@retry_on_lock
 def toggle_skill(request, character_id, skill_id):
     """Toggle a skill's checked status."""
-    character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
-    skill = get_object_or_404(Skill, id=skill_id, character=character)
+    skill = get_object_or_404(
+        Skill.objects.select_related('character'), id=skill_id, character_id=character_id, character__user=request.user
+    )
+    character = skill.character
     
     if not skill.is_checked:  # Can only check once
         skill.is_checked = True
-        skill.save()
+        skill.save(update_fields=['is_checked'])
+        record_sheet_change(character, [save_event(skill, character.pk, ['is_checked'])])
         return JsonResponse({'success': True, 'checked': True})
     
     return JsonResponse({'success': False, 'error': 'Skill already checked'})
@@ -312,6 +358,7 @@ def toggle_skill(request, character_id, skill_id):
 
 @login_required
 @require_http_methods(["POST"])
+@retry_on_lock
 def add_resource(request, character_id):
     """Add a new resource via AJAX."""
     character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
@@ -329,6 +376,7 @@ def add_resource(request, character_id):
         description=description,
         is_stationary=is_stationary
     )
+    record_sheet_change(character, [save_event(resource, character.pk)])
     
     return JsonResponse({
         'success': True,
@@ -343,6 +391,7 @@ def add_resource(request, character_id):
 
 @login_required
 @require_http_methods(["POST"])
+@retry_on_lock
 def add_character(request, character_id):
     """Add a new character via AJAX."""
     vampire = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
@@ -362,6 +411,7 @@ def add_character(request, character_id):
         character_type=character_type,
         relationship=relationship
     )
+    record_sheet_change(vampire, [save_event(character, vampire.pk)])
     
     return JsonResponse({
         'success': True,
@@ -377,6 +427,7 @@ def add_character(request, character_id):
 
 @login_required
 @require_http_methods(["POST"])
+@retry_on_lock
 def add_mark(request, character_id):
     """Add a new mark via AJAX."""
     character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
@@ -392,6 +443,7 @@ def add_mark(request, character_id):
         description=description,
         how_concealed=how_concealed
     )
+    record_sheet_change(character, [save_event(mark, character.pk)])
     
     return JsonResponse({
         'success': True,
@@ -404,7 +456,87 @@ def add_mark(request, character_id):
 
 
 @login_required
-def dice_roller(request):
+@require_http_methods(["POST"])
+@retry_on_lock
+def edit_sheet(request, character_id):
+    """Apply a batch of sheet edits via AJAX, all or nothing.
+    
+    The JSON body is {"operations": [{"op": ..., "data": {...}}, ...]}, where
+    each op is the name of a single-edit view (add_skill, toggle_skill, ...)
+    and data is what that view takes as POST data.
+    """
+    character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
+    
+    try:
+        operations = json.loads(request.body).get('operations')
+    except (ValueError, AttributeError):
+        operations = None
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'success': False, 'error': 'Expected a JSON list of operations'}, status=400)
+    if len(operations) > MAX_OPERATIONS:
+        return JsonResponse({'success': False, 'error': f'At most {MAX_OPERATIONS} operations per batch'}, status=400)
+    
+    success, results = apply_sheet_edits(character, operations)
+    return JsonResponse({'success': success, 'results': results}, status=200 if success else 400)
+
+
+@login_required
+@require_http_methods(["GET"])
+def sheet_changes(request, character_id):
+    """Return the sheet rows changed since the client's version, as JSON.
+    
+    The version is the id of the character's latest sheet event and is sent
+    as the ETag. A client passes the version it holds as ?since= or
+    If-None-Match and gets 304 Not Modified if nothing changed since, or the
+    changed rows otherwise. Without a version the whole sheet is returned.
+    """
+    character = get_object_or_404(VampireCharacter.objects.only('id'), id=character_id, user=request.user)
+    version = latest_event_id(character.id)
+    etag = f'"{version}"'
+    
+    since = request.GET.get('since') or request.headers.get('If-None-Match', '').strip('W/"')
+    if since == str(version):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    if since.isdigit() and int(since) < version:
+        changes, turn, version = changes_since(character.id, int(since))
+        full = False
+    else:
+        state, version = rebuild(character.id)
+        turn = state.pop('turn')
+        changes = state
+        full = True
+    
+    response = JsonResponse({'version': version, 'full': full, 'turn': turn, 'changes': changes})
+    response['ETag'] = f'"{version}"'
+    return response
+
+
+@login_required
+@require_http_methods(["GET"])
+def sheet_panels(request, character_id):
+    """Render the play page panels named by ?panel=, as JSON of {name: html}.
+    
+    The play page fetches the panels a sheet change touched and swaps them in,
+    rather than reloading the page. Like the page, the panels come from the
+    fragment cache, and the sheet is only loaded for those missing from it.
+    """
+    names = request.GET.getlist('panel')
+    unknown = [name for name in names if name not in PLAY_PANELS]
+    if not names or unknown:
+        return JsonResponse({'error': f'Unknown panels: {", ".join(unknown)}' if unknown else 'No panels named'}, status=400)
+    
+    character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
+    context = CharacterSheet(character).context()
+    return JsonResponse({'panels': {
+        name: render_to_string(PLAY_PANELS[name], context, request).strip() for name in dict.fromkeys(names)
+    }})
+
+
+@login_required
+async def dice_roller(request):
     """Simple dice roller for the game."""
     if request.method == 'POST':
         d10 = random.randint(1, 10)
@@ -417,7 +549,46 @@ def dice_roller(request):
             'result': result
         })
     
-    return render(request, 'game/dice_roller.html')
+    return await arender(request, 'game/dice_roller.html')
+
+
+@staff_member_required
+@require_http_methods(["GET", "POST"])
+def view_metrics(request):
+    """Query counts and latencies per view since the process started, for staff."""
+    if request.method == 'POST':
+        reset_view_metrics()
+    return JsonResponse({'views': get_view_metrics()})
+
+
+@login_required
+def prompt_stats(request):
+    """Exact odds of the prompt walk: game length, entries reached and c-entries read."""
+    try:
+        from .prompt_walk import get_walk_stats
+    except ImportError:
+        messages.error(request, 'Prompt statistics need NumPy, which is not installed.')
+        return redirect('home')
+    
+    stats = get_walk_stats()
+    rows = [
+        {
+            'number': prompt['number'],
+            'entries': [
+                None if chance is None else chance * 100
+                for chance in prompt['entries'].values()
+            ],
+            'expected_visits': prompt['expected_visits'],
+            'expected_c_entries': prompt['expected_c_entries'],
+        }
+        for prompt in stats['prompts']
+    ]
+    return render(request, 'game/prompt_stats.html', {
+        'stats': stats,
+        'rows': rows,
+        'game_over_percent': stats['game_over_probability'] * 100,
+        'stuck_percent': stats['stuck_probability'] * 100,
+    })
 
 
 @login_required
@@ -426,18 +597,7 @@ def setup_character(request, character_id):
     character = get_object_or_404(VampireCharacter, id=character_id, user=request.user)
     
     # Check if character is already set up
-    try:
-        setup_complete = (
-            character.skills.count() >= 3 and 
-            character.resources.count() >= 3 and
-            character.characters.filter(character_type='immortal').exists() and
-            character.marks.exists() and
-            character.memories.get(order=5).experiences.exists()
-        )
-    except Memory.DoesNotExist:
-        setup_complete = False
-    
-    if setup_complete:
+    if character.setup_complete:
         messages.info(request, 'Character setup is already complete.')
         return redirect('character_detail', character_id=character.id)
     
@@ -467,37 +627,45 @@ def setup_character(request, character_id):
     return render(request, 'game/setup_character.html', context)
 
 
+@transaction.atomic
 def handle_setup_step_1(request, character):
     """Handle creation of 3 mortal characters."""
+    rows = []
     for i in range(3):
         name = request.POST.get(f'mortal_{i}_name', '').strip()
         description = request.POST.get(f'mortal_{i}_description', '').strip()
         relationship = request.POST.get(f'mortal_{i}_relationship', 'neutral')
         
         if name and description:
-            Character.objects.create(
+            rows.append(Character(
                 vampire=character,
                 name=name,
                 description=description,
                 character_type='mortal',
                 relationship=relationship
-            )
+            ))
+    
+    rows = Character.objects.bulk_create(rows)
+    record_sheet_change(character, [save_event(row, character.pk) for row in rows])
     
     return redirect(f"{reverse('setup_character', args=[character.id])}?step=2")
 
 
+@transaction.atomic
 def handle_setup_step_2(request, character):
     """Handle creation of 3 skills and 3 resources."""
+    skills = []
+    resources = []
     # Create skills
     for i in range(3):
         skill_name = request.POST.get(f'skill_{i}', '').strip()
         skill_description = request.POST.get(f'skill_{i}_description', '').strip()
         if skill_name:
-            Skill.objects.create(
+            skills.append(Skill(
                 character=character, 
                 name=skill_name,
                 description=skill_description
-            )
+            ))
     
     # Create resources
     for i in range(3):
@@ -506,68 +674,80 @@ def handle_setup_step_2(request, character):
         is_stationary = request.POST.get(f'resource_{i}_stationary') == 'on'
         
         if resource_name:
-            Resource.objects.create(
+            resources.append(Resource(
                 character=character,
                 name=resource_name,
                 description=resource_desc,
                 is_stationary=is_stationary
-            )
+            ))
+    
+    rows = [*Skill.objects.bulk_create(skills), *Resource.objects.bulk_create(resources)]
+    record_sheet_change(character, [save_event(row, character.pk) for row in rows])
     
     return redirect(f"{reverse('setup_character', args=[character.id])}?step=3")
 
 
+@transaction.atomic
 def handle_setup_step_3(request, character):
     """Handle creation of 3 additional experiences combining traits."""
+    memories = {memory.order: memory for memory in Memory.objects.filter(character=character, order__in=(2, 3, 4))}
+    rows = []
     for i in range(3):
         memory_order = i + 2  # Memories 2, 3, 4
         experience_text = request.POST.get(f'experience_{i}', '').strip()
         
         if experience_text:
-            memory = Memory.objects.get(character=character, order=memory_order)
-            Experience.objects.create(
-                memory=memory,
+            rows.append(Experience(
+                memory=memories[memory_order],
                 text=experience_text,
                 order=1
-            )
+            ))
+    
+    rows = Experience.objects.bulk_create(rows)
+    record_sheet_change(character, [save_event(row, character.pk) for row in rows])
     
     return redirect(f"{reverse('setup_character', args=[character.id])}?step=4")
 
 
+@transaction.atomic
 def handle_setup_step_4(request, character):
     """Handle creation of immortal, mark, and transformation experience."""
+    rows = []
     # Create immortal
     immortal_name = request.POST.get('immortal_name', '').strip()
     immortal_desc = request.POST.get('immortal_description', '').strip()
     
     if immortal_name and immortal_desc:
-        Character.objects.create(
+        rows.append(Character.objects.create(
             vampire=character,
             name=immortal_name,
             description=immortal_desc,
             character_type='immortal',
             relationship='master'
-        )
+        ))
     
     # Create mark
     mark_desc = request.POST.get('mark_description', '').strip()
     mark_concealed = request.POST.get('mark_concealed', '').strip()
     
     if mark_desc:
-        Mark.objects.create(
+        rows.append(Mark.objects.create(
             character=character,
             description=mark_desc,
             how_concealed=mark_concealed
-        )
+        ))
     
     # Create transformation experience in Memory 5
     transformation_exp = request.POST.get('transformation_experience', '').strip()
     if transformation_exp:
         memory_5 = Memory.objects.get(character=character, order=5)
-        Experience.objects.create(
+        rows.append(Experience.objects.create(
             memory=memory_5,
             text=transformation_exp,
             order=1
-        )
+        ))
+    
+    record_sheet_change(character, [save_event(row, character.pk) for row in rows])
     
     messages.success(request, 'Character setup complete! Your vampire is ready to begin their dark chronicle.')
     return redirect('character_detail', character_id=character.id)
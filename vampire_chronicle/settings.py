@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,17 +32,20 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # runserver serves the ASGI application, WebSockets included
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'channels',
     'game',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'game.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -69,6 +73,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'vampire_chronicle.wsgi.application'
+ASGI_APPLICATION = 'vampire_chronicle.asgi.application'
 
 
 # Database
@@ -78,9 +83,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so that busy_timeout
+            # applies; a deferred transaction that later writes fails at once
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            # File-backed so the turn concurrency tests can share it across threads;
+            # in-memory SQLite fails concurrent writers instead of making them wait
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# PRAGMAs set on every new SQLite connection (see game/database.py); None keeps SQLite's default
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 128 * 1024 * 1024,
+}
+
+# Retries for write transactions that still find the database locked after busy_timeout.
+# With queue on, the writers of every process line up on a lock file next to the database.
+SQLITE_WRITE_RETRY = {
+    'attempts': 5,
+    'base_delay': 0.05,
+    'max_delay': 1.0,
+    'queue': True,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,3 +162,83 @@ LOGOUT_REDIRECT_URL = '/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Query budgets per view name, checked by game.instrumentation.QueryInstrumentationMiddleware.
+# Going over a budget logs a warning, or fails the request when QUERY_BUDGETS_STRICT is on (the
+# test suite turns it on). create_character, setup_character and play_game are the most queries
+# any request made in `manage.py simulate_games`, which prints them next to these budgets; the
+# snapshot every SHEET_SNAPSHOT_INTERVAL turns is what takes play_game to 19. create_character
+# and setup_character get one more for the test suite, where their transaction ends with a
+# RELEASE SAVEPOINT statement rather than a COMMIT, which the counter does not see.
+# A streaming response is only counted up to the point it is returned, so export_chronicle's
+# budget leaves out the queries run while its body streams; ExportTests holds those to a
+# count that does not grow with the chronicle.
+QUERY_BUDGETS = {
+    'home': 4,
+    'register': 4,
+    'character_list': 4,
+    'create_character': 10,
+    'import_chronicle': 60,
+    'setup_character': 13,
+    'character_detail': 12,
+    'play_game': 19,
+    'export_chronicle': 4,
+    'session_timeline': 6,
+    'session_timeline_page': 4,
+    'add_experience': 8,
+    'add_skill': 12,
+    'toggle_skill': 8,
+    'add_resource': 12,
+    'add_character': 12,
+    'add_mark': 14,
+    'edit_sheet': 20,
+    'sheet_changes': 6,
+    'sheet_panels': 12,
+    'dice_roller': 4,
+    'prompt_stats': 4,
+    'view_metrics': 4,
+}
+QUERY_BUDGETS_STRICT = False
+
+# The default cache is private to each process. The prompt table's version is kept where every
+# process on the host can read it, so that load_prompts and the other prompt commands reach a
+# running server (see game/prompt_table.py); point it at Redis or Memcached across hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'prompt_table': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'prompt_table',
+    },
+}
+
+# Seconds a rendered character sheet panel stays cached; entries are keyed on the
+# character's state_version, so a change to the sheet never serves a stale panel
+SHEET_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Turns between snapshots of a vampire's sheet event log (see game/events.py)
+SHEET_SNAPSHOT_INTERVAL = 50
+
+# Sessions per page of the session timeline (see game/timeline.py)
+TIMELINE_PAGE_SIZE = 20
+
+# Channel layer pushing live sheet changes to open pages (see game/live.py). Set
+# CHANNEL_REDIS_URL to share one Redis layer between every worker process, as any
+# deployment running more than one ASGI worker must. Without it the in-memory layer
+# is used, which only reaches pages served by the same process: fine for runserver
+# and a single worker, but pages on other workers then only see changes when they poll.
+if os.environ.get('CHANNEL_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['CHANNEL_REDIS_URL']]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }